@@ -1,5 +1,5 @@
 # link_validator.py
-import requests
+import argparse
 import json
 from db_config import get_db_connection
 from api_config import gemini_model # Import Gemini model
@@ -9,51 +9,370 @@ import os
 import portalocker
 import traceback
 import re # Import regex
+import sys
+import queue
+import threading
+import atexit
+import socket
+import hashlib
+import concurrent.futures
+from functools import lru_cache
+from urllib.parse import urlparse
+from array import array
+from utils import link_checker, url_health, http_client
 
 # --- Configuration ---
-CHECK_TIMEOUT = 10
-USER_AGENT = "AI Career Guider Link Checker/1.0"
 LOG_FILE = "link_validation_log.txt"
 LOCK_FILE = "link_validator.lock"
 # --- NEW: AI Config ---
 AI_REPLACEMENT_ENABLED = True # Set to False to disable AI replacement attempts
 AI_RETRY_DELAY_SECONDS = 2 # Small delay between AI calls
+AI_BATCH_SIZE = 15 # Max unique broken links per batched replacement prompt
+# --- Concurrent Checking Config ---
+CHECK_MAX_WORKERS = 16 # URL checks run in a thread pool; per-host limits live in utils/link_checker.py
+# --- Incremental Run Config ---
+WATERMARK_KEY = "roadmaps_watermark" # link_validator_state key holding the last successful scan time
+SCAN_BATCH_SIZE = 100 # Roadmap rows fetched per round trip while streaming
+# --- Run Tracking Config ---
+CHECKPOINT_EVERY = 25 # Processed links between checkpoints in link_validation_runs
+LOG_FLUSH_INTERVAL = 1.0 # Seconds the background log writer waits before flushing a batch
+# --- Sharding Config ---
+SHARD_LEASE_SECONDS = 30 * 60 # A shard lease lapses if its worker stops heartbeating for this long
+LEASE_RENEW_INTERVAL = 60 # Seconds between lease renewals while scanning and checking URLs
+
+# --- Buffered Logging ---
+class BufferedLogWriter:
+    """Appends log lines to LOG_FILE from a background thread in batches,
+       instead of opening the file for every message."""
+
+    _STOP = object()
+
+    def __init__(self, path, flush_interval=LOG_FLUSH_INTERVAL):
+        self.path = path
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue()
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def write(self, line):
+        if self._thread is None or self._pid != os.getpid():
+            with self._lock:
+                if self._thread is None or self._pid != os.getpid():
+                    # Shard worker processes inherit the parent's writer state, but not its thread
+                    self._queue = queue.Queue()
+                    self._pid = os.getpid()
+                    self._thread = threading.Thread(target=self._run, name="LinkValidatorLogWriter", daemon=True)
+                    self._thread.start()
+        self._queue.put(line)
+
+    def _run(self):
+        try:
+            log_file = open(self.path, "a", encoding="utf-8")
+        except Exception as e:
+            print(f"    ERROR: Could not open log file: {e}")
+            log_file = None
+        stopping = False
+        while not stopping:
+            try:
+                lines = [self._queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                continue
+            while True: # Drain whatever else is queued into the same write
+                try: lines.append(self._queue.get_nowait())
+                except queue.Empty: break
+            if self._STOP in lines:
+                stopping = True
+                lines = [l for l in lines if l is not self._STOP]
+            if log_file:
+                try:
+                    log_file.writelines(lines)
+                    log_file.flush()
+                except Exception as e:
+                    print(f"    ERROR: Could not write to log file: {e}")
+        if log_file: log_file.close()
+
+    def close(self):
+        """Flushes pending lines and stops the writer thread."""
+        if self._thread is not None and self._pid == os.getpid():
+            self._queue.put(self._STOP)
+            self._thread.join(timeout=10)
+            self._thread = None
+
+
+_log_writer = BufferedLogWriter(LOG_FILE)
+atexit.register(_log_writer.close)
+
+# --- Run Metrics (for the JSON run report) ---
+RUN_METRICS = {"ai_calls": 0}
+LOG_PREFIX = "" # Set per shard worker so interleaved log lines stay attributable
 
 # --- Helper Functions ---
 def log_message(message):
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    full_message = f"[{timestamp}] {message}\n"
+    full_message = f"[{timestamp}] {LOG_PREFIX}{message}\n"
     print(full_message.strip())
-    try:
-        with open(LOG_FILE, "a", encoding="utf-8") as f:
-            f.write(full_message)
-    except Exception as e:
-        print(f"    ERROR: Could not write to log file: {e}")
+    _log_writer.write(full_message)
 
 def check_url(url):
     """Checks URL validity. Returns (is_valid: bool, status_code_or_error: str)"""
-    # ... (Keep existing check_url function - no changes needed) ...
+    return link_checker.check_url(url, log=log_message)
+
+
+class LinkLocationIndex:
+    """
+    Compact {url: occurrences} store. Each URL maps to a flat int array of
+    (roadmap_id, stage_idx, step_idx) triples and each roadmap has one interned
+    domain string; step titles/descriptions are loaded later, only for broken links.
+    """
+
+    def __init__(self):
+        self._positions = {}
+        self._domains = {}
+
+    def add(self, url, roadmap_id, domain, stage_idx, step_idx):
+        if url not in self._positions:
+            self._positions[url] = array('i')
+        self._positions[url].extend((roadmap_id, stage_idx, step_idx))
+        if roadmap_id not in self._domains:
+            self._domains[roadmap_id] = sys.intern(domain or 'N/A')
+
+    def occurrences(self, url):
+        """Yields (roadmap_id, domain, stage_idx, step_idx) for every occurrence of url."""
+        positions = self._positions.get(url, ())
+        for i in range(0, len(positions), 3):
+            roadmap_id = positions[i]
+            yield roadmap_id, self._domains[roadmap_id], positions[i + 1], positions[i + 2]
+
+    def urls(self):
+        return self._positions.keys()
+
+    def __contains__(self, url):
+        return url in self._positions
+
+    def __len__(self):
+        return len(self._positions)
+
+
+def _iter_roadmap_rows(watermark=None):
+    """Streams roadmap rows through an unbuffered cursor on a dedicated connection,
+       so only SCAN_BATCH_SIZE roadmap documents are held in memory at a time."""
+    scan_conn = get_db_connection()
+    if not scan_conn:
+        raise ConnectionError("Database connection failed for roadmap scan.")
+    scan_cur = scan_conn.cursor(dictionary=True, buffered=False)
     try:
-        headers = {'User-Agent': USER_AGENT}
-        response = requests.head(url, timeout=CHECK_TIMEOUT, headers=headers, allow_redirects=True)
-        status = str(response.status_code) # Ensure status is string
-        if 200 <= response.status_code < 400:
-            return True, status
+        if watermark:
+            scan_cur.execute("SELECT id, domain, roadmap FROM roadmaps WHERE updated_at >= %s", (watermark,))
         else:
-            log_message(f"    INVALID Status: {status} for URL: {url}")
-            return False, status
-    except requests.exceptions.Timeout:
-        log_message(f"    TIMEOUT Error for URL: {url}")
-        return False, "Timeout"
-    except requests.exceptions.RequestException as e:
-        # Try to get more specific error
-        error_str = f"Request Error ({type(e).__name__})"
-        log_message(f"    {error_str} for URL: {url} - {e}")
-        return False, error_str
-    except Exception as e:
-        error_str = f"Other Error ({type(e).__name__})"
-        log_message(f"    UNEXPECTED Error checking URL {url}: {e}")
-        return False, error_str
+            scan_cur.execute("SELECT id, domain, roadmap FROM roadmaps")
+        while True:
+            rows = scan_cur.fetchmany(SCAN_BATCH_SIZE)
+            if not rows:
+                break
+            yield from rows
+    finally:
+        scan_cur.close()
+        scan_conn.close()
+
+
+def _iter_study_links(roadmap_rows):
+    """Parses roadmap rows one at a time and yields (roadmap_id, domain, stage_idx, step_idx, link)."""
+    for r_data in roadmap_rows:
+        roadmap_id = r_data['id']
+        domain = r_data['domain']
+        try:
+            roadmap_json = json.loads(r_data['roadmap'])
+            if isinstance(roadmap_json, dict) and 'roadmap' in roadmap_json:
+                 for stage_idx, stage in enumerate(roadmap_json.get('roadmap', [])):
+                     for step_idx, step in enumerate(stage.get('steps', [])):
+                         link = step.get('study_link')
+                         if link and isinstance(link, str) and link.startswith('http'):
+                             yield roadmap_id, domain, stage_idx, step_idx, link
+        except (json.JSONDecodeError, TypeError) as e:
+            log_message(f"    WARNING: Could not parse roadmap JSON for ID {roadmap_id}, Domain {domain}: {e}")
+
+
+def _find_link_locations(cur, url, link_locations):
+    """Adds the occurrences of one URL in roadmaps that were not scanned this run."""
+    escaped = url.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    cur.execute("SELECT id, domain, roadmap FROM roadmaps WHERE roadmap LIKE %s", (f"%{escaped}%",))
+    for roadmap_id, domain, stage_idx, step_idx, link in _iter_study_links(cur.fetchall()):
+        if link == url:
+            link_locations.add(link, roadmap_id, domain, stage_idx, step_idx)
+
+
+def _load_step_text(cur, roadmap_id, stage_idx, step_idx):
+    """Fetches just one step's title and description (used only for broken links)."""
+    step_path = f"$.roadmap[{int(stage_idx)}].steps[{int(step_idx)}]"
+    cur.execute("""
+        SELECT JSON_UNQUOTE(JSON_EXTRACT(roadmap, %s)) AS title,
+               JSON_UNQUOTE(JSON_EXTRACT(roadmap, %s)) AS description
+        FROM roadmaps WHERE id = %s
+    """, (f"{step_path}.title", f"{step_path}.description", roadmap_id))
+    row = cur.fetchone()
+    if not row:
+        return 'N/A', 'N/A'
+    return row.get('title') or 'N/A', row.get('description') or 'N/A'
+
+
+# --- Incremental Run State ---
+def _ensure_incremental_schema(cur):
+    """Creates the state table. The roadmaps.updated_at watermark column comes from migrations/003."""
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS link_validator_state (
+            state_key VARCHAR(64) NOT NULL PRIMARY KEY,
+            state_value VARCHAR(255),
+            updated_at DATETIME NOT NULL
+        )
+    """)
+
+
+def _get_state(cur, key):
+    cur.execute("SELECT state_value FROM link_validator_state WHERE state_key = %s", (key,))
+    row = cur.fetchone()
+    return row['state_value'] if row else None
+
+
+def _set_state(cur, key, value):
+    cur.execute("""
+        INSERT INTO link_validator_state (state_key, state_value, updated_at) VALUES (%s, %s, %s)
+        ON DUPLICATE KEY UPDATE state_value = VALUES(state_value), updated_at = VALUES(updated_at)
+    """, (key, value, datetime.now()))
+
+
+def _has_column(cur, table, column):
+    cur.execute("""
+        SELECT COUNT(*) AS col_count FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s
+    """, (table, column))
+    return bool(cur.fetchone()['col_count'])
+
+
+# --- Run Tracking (checkpoints + reports) ---
+def _ensure_runs_table(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS link_validation_runs (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            status VARCHAR(20) NOT NULL,
+            options VARCHAR(255),
+            started_at DATETIME NOT NULL,
+            heartbeat_at DATETIME NOT NULL,
+            finished_at DATETIME,
+            checkpoint_url TEXT,
+            links_processed INT NOT NULL DEFAULT 0,
+            report LONGTEXT,
+            shard_key VARCHAR(32),
+            INDEX idx_link_validation_runs_started (started_at)
+        )
+    """)
+
+
+def _start_or_resume_run(cur, conn, options, shard_key=None):
+    """
+    Resumes the latest run (of the same shard) if it never completed (process died or errored),
+    otherwise starts a new one. Returns (run_id, checkpoint_url, run_started_at, resumed).
+    """
+    cur.execute("""
+        SELECT id, status, checkpoint_url, started_at FROM link_validation_runs
+        WHERE shard_key <=> %s ORDER BY id DESC LIMIT 1
+    """, (shard_key,))
+    last_run = cur.fetchone()
+    now = datetime.now()
+    if last_run and last_run['status'] != 'completed':
+        cur.execute("UPDATE link_validation_runs SET status = 'running', heartbeat_at = %s WHERE id = %s", (now, last_run['id']))
+        conn.commit()
+        return last_run['id'], last_run['checkpoint_url'], last_run['started_at'], True
+    cur.execute("""
+        INSERT INTO link_validation_runs (status, options, started_at, heartbeat_at, shard_key)
+        VALUES ('running', %s, %s, %s, %s)
+    """, (options, now, now, shard_key))
+    conn.commit()
+    return cur.lastrowid, None, now, False
+
+
+def _checkpoint_run(cur, conn, run_id, checkpoint_url, links_processed):
+    cur.execute("""
+        UPDATE link_validation_runs SET checkpoint_url = %s, links_processed = %s, heartbeat_at = %s
+        WHERE id = %s
+    """, (checkpoint_url, links_processed, datetime.now(), run_id))
+    conn.commit()
+
+
+def _finish_run(cur, conn, run_id, status, report):
+    cur.execute("""
+        UPDATE link_validation_runs SET status = %s, finished_at = %s, heartbeat_at = %s, report = %s
+        WHERE id = %s
+    """, (status, datetime.now(), datetime.now(), json.dumps(report, default=str), run_id))
+    conn.commit()
+
+
+def _requeue_unfinished_replacements(cur, run_started_at):
+    """Broken-link instances logged by an interrupted run but never sent to the AI."""
+    cur.execute("""
+        SELECT isl.id, isl.roadmap_id, r.domain, isl.stage_index, isl.step_index, isl.original_url
+        FROM invalid_study_links isl JOIN roadmaps r ON isl.roadmap_id = r.id
+        WHERE isl.checked_at >= %s AND isl.resolved_at IS NULL AND isl.ai_prompt IS NULL
+    """, (run_started_at,))
+    return [(row['id'], row['roadmap_id'], row['domain'], row['stage_index'], row['step_index'], row['original_url'])
+            for row in cur.fetchall()]
+
+
+# --- Sharding (consistent hash + DB leases) ---
+@lru_cache(maxsize=4096)
+def _shard_for_host(host, shards):
+    """Jump consistent hash: changing the shard count only moves ~1/N of the hosts."""
+    key = int.from_bytes(hashlib.sha256(host.encode('utf-8')).digest()[:8], 'big')
+    bucket, j = -1, 0
+    while j < shards:
+        bucket = j
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        j = int((bucket + 1) * (float(1 << 31) / float((key >> 33) + 1)))
+    return bucket
+
+
+def _shard_for_url(url, shards):
+    # Shard by host so each host is only ever throttled by one worker
+    return _shard_for_host(urlparse(url).netloc.lower(), shards)
+
+
+def _ensure_lease_table(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS link_validator_leases (
+            lease_key VARCHAR(64) NOT NULL PRIMARY KEY,
+            owner VARCHAR(128) NOT NULL,
+            expires_at DATETIME NOT NULL
+        )
+    """)
+
+
+def _acquire_lease(cur, conn, lease_key, owner):
+    """Takes the lease if it is free, expired, or already ours. Returns True on success."""
+    # Assignments run left to right, so expires_at only moves if owner is (now) ours
+    cur.execute("""
+        INSERT INTO link_validator_leases (lease_key, owner, expires_at)
+        VALUES (%s, %s, NOW() + INTERVAL %s SECOND)
+        ON DUPLICATE KEY UPDATE
+            owner = IF(expires_at < NOW() OR owner = VALUES(owner), VALUES(owner), owner),
+            expires_at = IF(owner = VALUES(owner), VALUES(expires_at), expires_at)
+    """, (lease_key, owner, SHARD_LEASE_SECONDS))
+    cur.execute("SELECT owner FROM link_validator_leases WHERE lease_key = %s", (lease_key,))
+    row = cur.fetchone()
+    conn.commit()
+    return bool(row) and row['owner'] == owner
+
+
+def _renew_lease(cur, conn, lease_key, owner):
+    cur.execute("""
+        UPDATE link_validator_leases SET expires_at = NOW() + INTERVAL %s SECOND
+        WHERE lease_key = %s AND owner = %s
+    """, (SHARD_LEASE_SECONDS, lease_key, owner))
+    conn.commit()
+
+
+def _release_lease(cur, conn, lease_key, owner):
+    cur.execute("DELETE FROM link_validator_leases WHERE lease_key = %s AND owner = %s", (lease_key, owner))
+    conn.commit()
 
 
 # --- NEW: AI Link Replacement Function ---
@@ -92,6 +411,7 @@ def find_replacement_link(original_url, step_title, step_description, domain):
 
     try:
         log_message(f"    AI_REPLACE: Asking AI for replacement for: {original_url} (Step: {step_title})")
+        RUN_METRICS["ai_calls"] += 1
         response = gemini_model.generate_content(prompt)
         ai_response_text = response.text.strip()
         # Clean potential markdown, quotes, etc.
@@ -114,105 +434,434 @@ def find_replacement_link(original_url, step_title, step_description, domain):
         return None, prompt, f"Error: {e}" # Return None on error, but include prompt/error
 
 
+def _step_link_path(stage_idx, step_idx):
+    return f"$.roadmap[{int(stage_idx)}].steps[{int(step_idx)}].study_link"
+
+
+def _apply_replacements_for_roadmap(cur, conn, roadmap_id, fixes):
+    """
+    Writes all link fixes for one roadmap with a single in-place JSON_SET statement, guarded by
+    JSON_EXTRACT equality checks so a step that changed since the check is never overwritten.
+    fixes: list of (invalid_link_db_id, stage_idx, step_idx, original_url, new_url).
+    Returns the number of fixes applied.
+    """
+    def _run_update(selected):
+        set_args, guards, params = [], [], []
+        for _, stage_idx, step_idx, _, new_url in selected:
+            set_args.append("%s, %s")
+            params.extend([_step_link_path(stage_idx, step_idx), new_url])
+        params.append(roadmap_id)
+        for _, stage_idx, step_idx, original_url, _ in selected:
+            guards.append("JSON_UNQUOTE(JSON_EXTRACT(roadmap, %s)) = %s")
+            params.extend([_step_link_path(stage_idx, step_idx), original_url])
+        cur.execute(f"""
+            UPDATE roadmaps SET roadmap = JSON_SET(roadmap, {", ".join(set_args)})
+            WHERE id = %s AND {" AND ".join(guards)}
+        """, tuple(params))
+        return cur.rowcount == 1
+
+    try:
+        log_message(f"      Updating {len(fixes)} link(s) in Roadmap ID {roadmap_id} with JSON_SET...")
+        applied = fixes
+        if not _run_update(fixes):
+            # Some step changed (or the roadmap is gone): keep only the fixes whose link still matches
+            paths = [_step_link_path(stage_idx, step_idx) for _, stage_idx, step_idx, _, _ in fixes]
+            columns = ", ".join(f"JSON_UNQUOTE(JSON_EXTRACT(roadmap, %s)) AS link_{i}" for i in range(len(paths)))
+            cur.execute(f"SELECT {columns} FROM roadmaps WHERE id = %s", tuple(paths) + (roadmap_id,))
+            current = cur.fetchone()
+            applied = [fix for i, fix in enumerate(fixes) if current and current.get(f"link_{i}") == fix[3]]
+            for fix in fixes:
+                if fix not in applied:
+                    log_message(f"        SKIPPED UPDATE: Roadmap structure changed or original link mismatch for Roadmap ID {roadmap_id}, Stage {fix[1]}, Step {fix[2]}.")
+            if not applied or not _run_update(applied):
+                conn.rollback()
+                return 0
+
+        # Mark as resolved in invalid_links table, in the same transaction
+        resolved_at = datetime.now()
+        cur.executemany("""
+            UPDATE invalid_study_links SET new_url = %s, resolved_at = %s
+            WHERE id = %s
+        """, [(new_url, resolved_at, invalid_link_db_id) for invalid_link_db_id, _, _, _, new_url in applied])
+        conn.commit() # One commit for the roadmap and all its invalid link records
+        for _, stage_idx, step_idx, _, _ in applied:
+            log_message(f"        SUCCESS: Replaced link in Roadmap ID {roadmap_id}, Stage {stage_idx}, Step {step_idx}.")
+        return len(applied)
+    except Exception as db_err:
+        log_message(f"        ERROR updating links for Roadmap ID {roadmap_id}: {db_err}")
+        conn.rollback()
+        return 0
+
+
+def _apply_replacement(cur, conn, invalid_link_db_id, roadmap_id, stage_idx, step_idx, link, new_url):
+    """Writes new_url into one roadmap step (if it still holds link) and resolves the invalid link record."""
+    return _apply_replacements_for_roadmap(cur, conn, roadmap_id, [(invalid_link_db_id, stage_idx, step_idx, link, new_url)]) == 1
+
+
+# --- Batched AI Link Replacement ---
+def find_replacement_links_batch(domain, items):
+    """
+    Asks Gemini for replacements for many broken links of one domain in a single structured prompt.
+    items: list of {"id", "url", "title", "description"}.
+    Returns ({id: suggested_url}, prompt, raw_response_text).
+    """
+    if not gemini_model:
+        log_message("    AI_REPLACE: Gemini model not available. Skipping replacement.")
+        return {}, None, None
+
+    broken_links_json = json.dumps([
+        {"id": item["id"], "step_title": item["title"], "step_description": item["description"], "broken_url": item["url"]}
+        for item in items
+    ], indent=2)
+    prompt = f"""
+    You are an expert curriculum designer tasked with fixing broken learning resource links.
+
+    Target Career Path (Domain): {domain}
+
+    Broken links (JSON list):
+    {broken_links_json}
+
+    Task:
+    For EACH item, find a SINGLE, high-quality, publicly accessible, and currently valid URL that is the best replacement for the broken link, matching the learning step's title and description for the target domain.
+
+    Prioritize official documentation (e.g., python.org, react.dev, developer.mozilla.org), reputable educational
+    platforms (e.g., freeCodeCamp.org, GeeksforGeeks, W3Schools, Khan Academy) and well-known tutorial sites
+    (e.g., DigitalOcean, Real Python). Do NOT suggest generic search engine results or paid course pages.
+
+    Output Format:
+    Return ONLY a valid JSON object of the form {{"replacements": [{{"id": <id>, "url": "<replacement url or NO_REPLACEMENT_FOUND>"}}, ...]}}
+    with one entry per input id. Do NOT include ```json markdown.
+    """
+
+    try:
+        log_message(f"    AI_REPLACE: Asking AI for {len(items)} replacement(s) for domain '{domain}' in one prompt")
+        RUN_METRICS["ai_calls"] += 1
+        response = gemini_model.generate_content(prompt)
+        ai_response_text = response.text.strip()
+        cleaned = re.sub(r'^```(json)?\s*|\s*```$', '', ai_response_text, flags=re.MULTILINE | re.DOTALL).strip()
+        parsed = json.loads(cleaned)
+    except Exception as e:
+        log_message(f"    AI_REPLACE: Error during batched Gemini API call for domain '{domain}': {e}")
+        traceback.print_exc()
+        return {}, prompt, f"Error: {e}"
+
+    suggestions = {}
+    for entry in parsed.get('replacements', []) if isinstance(parsed, dict) else []:
+        if not isinstance(entry, dict): continue
+        try: entry_id = int(entry.get('id'))
+        except (TypeError, ValueError): continue
+        potential_url = re.sub(r'[`\'"]', '', str(entry.get('url', ''))).strip()
+        if (not potential_url or "NO_REPLACEMENT_FOUND" in potential_url.upper() or ' ' in potential_url or
+                not (potential_url.startswith('http://') or potential_url.startswith('https://'))):
+            continue
+        suggestions[entry_id] = potential_url
+    log_message(f"    AI_REPLACE: AI suggested {len(suggestions)} of {len(items)} replacement(s) for domain '{domain}'.")
+    return suggestions, prompt, ai_response_text
+
+
+def _replace_links_batched(cur, conn, pending, max_workers, heartbeat=None):
+    """
+    Resolves queued broken-link instances with as few AI calls as possible:
+    dedupe by (url, step title), one prompt per domain (chunked by AI_BATCH_SIZE),
+    then validate every suggested URL concurrently before writing anything back.
+    pending: list of (invalid_link_db_id, roadmap_id, domain, stage_idx, step_idx, link).
+    heartbeat: called between AI calls and writes (renews the shard lease during a long phase).
+    Returns (replaced_count, ai_failed_count).
+    """
+    heartbeat = heartbeat or (lambda: None)
+    # 1. Deduplicate by (url, step title) and group by domain
+    groups = {} # (link, title) -> {"id", "url", "title", "description", "domain", "instances": [...]}
+    for invalid_link_db_id, roadmap_id, domain, stage_idx, step_idx, link in pending:
+        title, desc = _load_step_text(cur, roadmap_id, stage_idx, step_idx)
+        key = (link, title)
+        if key not in groups:
+            groups[key] = {"id": len(groups) + 1, "url": link, "title": title, "description": desc,
+                           "domain": domain, "instances": []}
+        groups[key]["instances"].append((invalid_link_db_id, roadmap_id, stage_idx, step_idx))
+    by_domain = {}
+    for group in groups.values():
+        by_domain.setdefault(group["domain"], []).append(group)
+    log_message(f"Batched AI replacement: {len(pending)} instance(s) -> {len(groups)} unique (url, step) pair(s) across {len(by_domain)} domain(s).")
+
+    # 2. One structured prompt per domain chunk
+    suggestions = {} # group id -> suggested url
+    for domain, domain_groups in by_domain.items():
+        for i in range(0, len(domain_groups), AI_BATCH_SIZE):
+            chunk = domain_groups[i:i + AI_BATCH_SIZE]
+            chunk_suggestions, ai_prompt, ai_response = find_replacement_links_batch(domain, chunk)
+            suggestions.update(chunk_suggestions)
+            for group in chunk:
+                for invalid_link_db_id, _, _, _ in group["instances"]:
+                    cur.execute("UPDATE invalid_study_links SET ai_prompt = %s, ai_response = %s WHERE id = %s",
+                                (ai_prompt, ai_response, invalid_link_db_id))
+            conn.commit()
+            heartbeat()
+            time.sleep(AI_RETRY_DELAY_SECONDS) # Space out AI calls
+
+    # 3. Validate suggested URLs concurrently; never write back a link we know is dead
+    suggested_urls = sorted(set(suggestions.values()))
+    log_message(f"Validating {len(suggested_urls)} AI-suggested URL(s)...")
+    suggestion_results = link_checker.check_urls(suggested_urls, max_workers=max_workers, log=log_message,
+                                                 progress=heartbeat)
+    heartbeat()
+
+    # 4. Write back, one statement and transaction per roadmap
+    replaced_count = ai_failed_count = 0
+    fixes_by_roadmap = {}
+    for group in groups.values():
+        new_url = suggestions.get(group["id"])
+        if new_url and not suggestion_results.get(new_url, (False,))[0]:
+            log_message(f"    AI_REPLACE: Discarding suggestion {new_url} for {group['url']} (failed validation).")
+            new_url = None
+        for invalid_link_db_id, roadmap_id, stage_idx, step_idx in group["instances"]:
+            if new_url:
+                fixes_by_roadmap.setdefault(roadmap_id, []).append((invalid_link_db_id, stage_idx, step_idx, group["url"], new_url))
+            else:
+                ai_failed_count += 1
+                log_message(f"      AI failed to find replacement for instance (ID: {invalid_link_db_id}).")
+    for roadmap_id, fixes in fixes_by_roadmap.items():
+        replaced_count += _apply_replacements_for_roadmap(cur, conn, roadmap_id, fixes)
+        heartbeat()
+    return replaced_count, ai_failed_count
+
+
+def _build_run_report(run_id, resumed, options, run_started, durations, counts, host_stats):
+    """Machine-readable summary stored in link_validation_runs.report for trend analysis."""
+    return {
+        "run_id": run_id,
+        "resumed": resumed,
+        "options": options,
+        "finished_at": datetime.now().isoformat(timespec="seconds"),
+        "duration_seconds": {name: round(value, 2) for name, value in
+                             {**durations, "total": time.monotonic() - run_started}.items()},
+        "counts": counts,
+        "ai_calls": RUN_METRICS["ai_calls"],
+        "host_latency": host_stats.summary(),
+        "upstreams": http_client.metrics(),
+    }
+
+
 # --- Main Validation Logic (Modified) ---
-def validate_roadmap_links():
+def validate_roadmap_links(sequential=False, max_workers=CHECK_MAX_WORKERS, ignore_cache=False, full=False,
+                           batch_ai=True, shard=None, shards=1):
     """Fetches unique study_links, checks validity, logs invalid ones,
-       and attempts AI replacement and DB update."""
+       and attempts AI replacement and DB update.
+       URLs are checked concurrently (or one by one with sequential=True); results are
+       then processed in the same sorted order either way.
+       Only URLs that are due according to the url_health table are requested
+       (ignore_cache=True rechecks everything).
+       Runs are incremental: only roadmaps changed since the last successful run are
+       parsed, unless full=True.
+       With batch_ai=True broken links are replaced with one AI prompt per domain
+       after all checks, instead of one call per occurrence.
+       With shards > 1 only URLs whose host hashes to `shard` are handled, and the run is
+       coordinated through a DB lease instead of the local lock file.
+       Returns the run report, or None if the run was skipped or failed."""
 
+    global LOG_PREFIX
+    shard_mode = shards > 1
+    shard_key = f"shard-{shard}-of-{shards}" if shard_mode else None
+    lease_owner = f"{socket.gethostname()}:{os.getpid()}"
+    lease_held = False
     lock_file_path = os.path.join(os.path.dirname(__file__), LOCK_FILE)
     lock_handle = None
 
-    try:
-        lock_handle = open(lock_file_path, 'a+')
-        portalocker.lock(lock_handle, portalocker.LOCK_EX | portalocker.LOCK_NB)
-        log_message("--- Starting Roadmap Link Validation (Lock Acquired) ---")
-    except (portalocker.LockException, IOError, OSError) as e:
-        log_message(f"--- Link Validation already in progress or lock error ({e}). Skipping this run. ---")
-        if lock_handle: 
-            try: lock_handle.close()
-            except Exception: pass
-        return
+    if shard_mode:
+        LOG_PREFIX = f"[{shard_key}] "
+    else:
+        try:
+            lock_handle = open(lock_file_path, 'a+')
+            portalocker.lock(lock_handle, portalocker.LOCK_EX | portalocker.LOCK_NB)
+            log_message("--- Starting Roadmap Link Validation (Lock Acquired) ---")
+        except (portalocker.LockException, IOError, OSError) as e:
+            log_message(f"--- Link Validation already in progress or lock error ({e}). Skipping this run. ---")
+            if lock_handle:
+                try: lock_handle.close()
+                except Exception: pass
+            return None
 
     conn = None
     cur = None
-    # --- Store link locations: {url: [(roadmap_id, domain, stage_idx, step_idx, title, desc), ...]} ---
-    link_locations = {}
+    run_id = None
+    run_started = time.monotonic()
+    durations = {}
+    counts = {}
+    host_stats = link_checker.HostLatencyStats()
+    RUN_METRICS["ai_calls"] = 0
+    report = None
+    # --- Store link locations compactly: url -> (roadmap_id, stage_idx, step_idx) triples ---
+    link_locations = LinkLocationIndex()
 
     try:
         conn = get_db_connection()
         if not conn: log_message("❌ Database connection failed. Aborting."); return
         cur = conn.cursor(dictionary=True) # Use dictionary cursor
 
-        log_message("Fetching roadmaps from database...")
-        cur.execute("SELECT id, domain, roadmap FROM roadmaps")
-        roadmaps = cur.fetchall()
-        log_message(f"Found {len(roadmaps)} roadmaps.")
+        _ensure_incremental_schema(cur)
+        url_health.ensure_url_health_table(cur)
+        _ensure_runs_table(cur)
+        _ensure_lease_table(cur)
+        conn.commit()
+        if not _has_column(cur, 'link_validation_runs', 'shard_key'):
+            log_message("❌ link_validation_runs has no shard_key column; apply migrations/004 first. Aborting.")
+            return None
 
-        # Extract unique links and their locations
-        for r_data in roadmaps:
-            roadmap_id = r_data['id']
-            domain = r_data['domain']
-            try:
-                roadmap_json = json.loads(r_data['roadmap'])
-                if isinstance(roadmap_json, dict) and 'roadmap' in roadmap_json:
-                     for stage_idx, stage in enumerate(roadmap_json.get('roadmap', [])):
-                         for step_idx, step in enumerate(stage.get('steps', [])):
-                             link = step.get('study_link')
-                             title = step.get('title', 'N/A')
-                             desc = step.get('description', 'N/A')
-                             if link and isinstance(link, str) and link.startswith('http'):
-                                 if link not in link_locations:
-                                     link_locations[link] = []
-                                 link_locations[link].append((roadmap_id, domain, stage_idx, step_idx, title, desc))
-            except (json.JSONDecodeError, TypeError) as e:
-                log_message(f"    WARNING: Could not parse roadmap JSON for ID {roadmap_id}, Domain {domain}: {e}")
-
-        unique_links = set(link_locations.keys())
+        if shard_mode:
+            if not _has_column(cur, 'invalid_study_links', 'unresolved_key'):
+                log_message("⚠️ WARNING: invalid_study_links has no unresolved_key; apply migrations/001 so concurrent shards cannot log a broken link twice.")
+            if not _acquire_lease(cur, conn, shard_key, lease_owner):
+                log_message("--- Shard is leased by another worker. Skipping this run. ---")
+                return None
+            lease_held = True
+            log_message(f"--- Starting Roadmap Link Validation (Shard Lease Acquired by {lease_owner}) ---")
+
+        def in_shard(url):
+            return not shard_mode or _shard_for_url(url, shards) == shard
+
+        last_renewed = time.monotonic()
+        def heartbeat():
+            """
+            Renews the shard lease at most every LEASE_RENEW_INTERVAL. Called from the roadmap scan,
+            after every checked URL, at checkpoints and throughout the AI phases, always between
+            transactions (renewing commits).
+            """
+            nonlocal last_renewed
+            if lease_held and time.monotonic() - last_renewed >= LEASE_RENEW_INTERVAL:
+                _renew_lease(cur, conn, shard_key, lease_owner)
+                last_renewed = time.monotonic()
+
+        watermark_key = f"{WATERMARK_KEY}:{shard_key}" if shard_mode else WATERMARK_KEY
+        options = f"sequential={sequential} workers={max_workers} ignore_cache={ignore_cache} full={full} batch_ai={batch_ai}"
+        run_id, resume_after, run_started_at, resumed = _start_or_resume_run(cur, conn, options, shard_key)
+        if resumed:
+            log_message(f"Resuming interrupted run #{run_id} after checkpoint: {resume_after or '(start)'}")
+        else:
+            log_message(f"Started run #{run_id}.")
+        phase_started = time.monotonic()
+
+        # Everything changed at or after this moment is picked up by the next run
+        cur.execute("SELECT NOW() AS scan_started_at")
+        scan_started_at = cur.fetchone()['scan_started_at']
+        incremental = not full and _has_column(cur, 'roadmaps', 'updated_at')
+        if not full and not incremental:
+            log_message("⚠️ WARNING: roadmaps.updated_at is missing; apply migrations/003 to enable incremental runs. Running a full scan.")
+        watermark = _get_state(cur, watermark_key) if incremental else None
+
+        if watermark:
+            log_message(f"Streaming roadmaps changed since {watermark} (incremental run)...")
+        else:
+            log_message("Streaming all roadmaps from database (full run)...")
+
+        # Extract unique links and their locations, one roadmap at a time
+        for roadmap_id, domain, stage_idx, step_idx, link in _iter_study_links(_iter_roadmap_rows(watermark)):
+            if in_shard(link):
+                link_locations.add(link, roadmap_id, domain, stage_idx, step_idx)
+            heartbeat() # The scan streams on its own connection, so this cursor is free
+
+        unique_links = set(link_locations.urls())
         log_message(f"Extracted {len(unique_links)} unique study links.")
 
+        if watermark:
+            # Unchanged roadmaps are not re-parsed, but their URLs still get rechecked when due
+            cur.execute("SELECT url FROM url_health WHERE next_check_at <= %s", (datetime.now(),))
+            due_known = {row['url'] for row in cur.fetchall() if in_shard(row['url'])} - unique_links
+            unique_links |= due_known
+            log_message(f"Added {len(due_known)} due URLs from unchanged roadmaps.")
+        durations["scan"] = time.monotonic() - phase_started
+
         invalid_links_count = 0
         valid_links_count = 0
         replaced_count = 0
         ai_failed_count = 0
+        cached_count = 0
 
         if not unique_links:
             log_message("No links found to validate.")
         else:
-            log_message("Starting URL checks...")
-            link_list = list(unique_links)
-            for i, link in enumerate(link_list):
-                log_message(f"  Checking link {i+1}/{len(link_list)}: {link}")
-                is_valid, status = check_url(link)
+            link_list = sorted(unique_links)
+
+            # --- URL health cache: only request URLs whose recheck TTL has expired ---
+            health = url_health.load_url_health(cur, link_list)
+            now = datetime.now()
+            due_links = [l for l in link_list if ignore_cache or url_health.is_due(health.get(l), now)]
+            log_message(f"{len(due_links)} of {len(link_list)} links are due for a recheck.")
+
+            log_message(f"Starting URL checks ({'sequential' if sequential else f'concurrent, {max_workers} workers'})...")
+            phase_started = time.monotonic()
+            validators = {l: (health[l]['etag'], health[l]['last_modified']) for l in due_links if l in health}
+            check_results = link_checker.check_urls(due_links, max_workers=max_workers, sequential=sequential,
+                                                    log=log_message, validators=validators, stats=host_stats,
+                                                    progress=heartbeat)
+            url_health.record_results(cur, check_results, health)
+            conn.commit()
+            heartbeat()
+            durations["check"] = time.monotonic() - phase_started
+            counts.update({"unique_links": len(link_list), "due_links": len(due_links), "checked": len(check_results)})
+
+            phase_started = time.monotonic()
+            pending_replacements = [] # Broken-link instances queued for batched AI replacement
+            if resumed and batch_ai and AI_REPLACEMENT_ENABLED:
+                pending_replacements = [item for item in _requeue_unfinished_replacements(cur, run_started_at)
+                                        if in_shard(item[5])]
+                log_message(f"Re-queued {len(pending_replacements)} replacement(s) left over from the interrupted run.")
+            links_processed = 0
+            last_link = None
+            for link in link_list:
+                if resume_after and link <= resume_after:
+                    continue # Already processed before the interruption
+                if last_link and links_processed % CHECKPOINT_EVERY == 0:
+                    _checkpoint_run(cur, conn, run_id, last_link, links_processed)
+                    heartbeat()
+                links_processed += 1
+                last_link = link
+
+                if link in check_results:
+                    is_valid, status = check_results[link][:2]
+                else:
+                    # Not due: reuse the cached verdict without touching the network
+                    cached_count += 1
+                    if health[link]['is_valid']:
+                        continue # Healthy and recently checked, nothing to do
+                    is_valid, status = False, health[link]['last_status']
 
                 if not is_valid:
                     invalid_links_count += 1
+                    if link not in link_locations:
+                        # URL came from an unchanged roadmap; load its occurrences only now that it's broken
+                        _find_link_locations(cur, link, link_locations)
                     # Process each occurrence of the invalid link
                     if link in link_locations:
-                        for roadmap_id, domain, stage_idx, step_idx, title, desc in link_locations[link]:
+                        for roadmap_id, domain, stage_idx, step_idx in link_locations.occurrences(link):
                             try:
-                                # Check if this exact instance is already logged and UNRESOLVED
+                                # Log the instance only if it isn't already logged and UNRESOLVED. NOT EXISTS
+                                # alone can race between shards; the unique unresolved_key
+                                # (migrations/001) turns a concurrent duplicate into an ignored row
                                 cur.execute("""
-                                    SELECT id FROM invalid_study_links
-                                    WHERE roadmap_id = %s AND stage_index = %s AND step_index = %s
-                                    AND original_url = %s AND resolved_at IS NULL
-                                """, (roadmap_id, stage_idx, step_idx, link))
-                                existing_invalid = cur.fetchone()
+                                    INSERT IGNORE INTO invalid_study_links
+                                    (roadmap_id, stage_index, step_index, original_url, status_code, checked_at)
+                                    SELECT %s, %s, %s, %s, %s, %s FROM DUAL
+                                    WHERE NOT EXISTS (
+                                        SELECT 1 FROM invalid_study_links
+                                        WHERE roadmap_id = %s AND stage_index = %s AND step_index = %s
+                                        AND original_url = %s AND resolved_at IS NULL
+                                    )
+                                """, (roadmap_id, stage_idx, step_idx, link, status, datetime.now(),
+                                      roadmap_id, stage_idx, step_idx, link))
+                                inserted = cur.rowcount > 0
+                                invalid_link_db_id = cur.lastrowid if inserted else None
+                                conn.commit()
 
-                                if not existing_invalid:
+                                if inserted:
                                     log_message(f"    INVALID link found: {link} in Roadmap ID {roadmap_id}, Stage {stage_idx}, Step {step_idx}")
-                                    # Log the newly found invalid link instance
-                                    cur.execute("""
-                                        INSERT INTO invalid_study_links
-                                        (roadmap_id, stage_index, step_index, original_url, status_code, checked_at)
-                                        VALUES (%s, %s, %s, %s, %s, %s)
-                                    """, (roadmap_id, stage_idx, step_idx, link, status, datetime.now()))
-                                    invalid_link_db_id = cur.lastrowid # Get the ID of the new record
-                                    conn.commit()
                                     log_message(f"      Logged invalid link instance (ID: {invalid_link_db_id}).")
 
                                     # --- Attempt AI Replacement ---
-                                    if AI_REPLACEMENT_ENABLED:
+                                    if AI_REPLACEMENT_ENABLED and batch_ai:
+                                        pending_replacements.append((invalid_link_db_id, roadmap_id, domain, stage_idx, step_idx, link))
+                                        log_message("      Queued for batched AI replacement.")
+                                    elif AI_REPLACEMENT_ENABLED:
                                         time.sleep(AI_RETRY_DELAY_SECONDS) # Wait before calling AI
+                                        title, desc = _load_step_text(cur, roadmap_id, stage_idx, step_idx)
                                         new_url, ai_prompt, ai_response = find_replacement_link(link, title, desc, domain)
 
                                         # Update log with AI details regardless of success
@@ -221,54 +870,12 @@ def validate_roadmap_links():
                                             WHERE id = %s
                                             """, (ai_prompt, ai_response, invalid_link_db_id))
                                         conn.commit()
+                                        heartbeat()
 
 
                                         if new_url:
-                                            # --- Update Roadmap JSON ---
-                                            log_message(f"      Attempting to update roadmap JSON for ID {roadmap_id} with new URL: {new_url}")
-                                            # Use FOR UPDATE to lock the row during read/modify/write
-                                            cur.execute("SELECT roadmap FROM roadmaps WHERE id = %s FOR UPDATE", (roadmap_id,))
-                                            current_roadmap_record = cur.fetchone()
-                                            if current_roadmap_record:
-                                                try:
-                                                    current_roadmap_json = json.loads(current_roadmap_record['roadmap'])
-                                                    # Navigate and update (with checks)
-                                                    if (isinstance(current_roadmap_json, dict) and
-                                                        'roadmap' in current_roadmap_json and
-                                                        isinstance(current_roadmap_json['roadmap'], list) and
-                                                        stage_idx < len(current_roadmap_json['roadmap']) and
-                                                        isinstance(current_roadmap_json['roadmap'][stage_idx], dict) and
-                                                        'steps' in current_roadmap_json['roadmap'][stage_idx] and
-                                                        isinstance(current_roadmap_json['roadmap'][stage_idx]['steps'], list) and
-                                                        step_idx < len(current_roadmap_json['roadmap'][stage_idx]['steps']) and
-                                                        isinstance(current_roadmap_json['roadmap'][stage_idx]['steps'][step_idx], dict) and
-                                                        current_roadmap_json['roadmap'][stage_idx]['steps'][step_idx].get('study_link') == link): # Verify original link still matches
-
-                                                        current_roadmap_json['roadmap'][stage_idx]['steps'][step_idx]['study_link'] = new_url
-                                                        updated_roadmap_str = json.dumps(current_roadmap_json) # Convert back to string
-
-                                                        # Update the database
-                                                        cur.execute("UPDATE roadmaps SET roadmap = %s WHERE id = %s", (updated_roadmap_str, roadmap_id))
-                                                        # Mark as resolved in invalid_links table
-                                                        cur.execute("""
-                                                            UPDATE invalid_study_links SET new_url = %s, resolved_at = %s
-                                                            WHERE id = %s
-                                                        """, (new_url, datetime.now(), invalid_link_db_id))
-
-                                                        conn.commit() # Commit both updates together
-                                                        replaced_count += 1
-                                                        log_message(f"        SUCCESS: Replaced link in Roadmap ID {roadmap_id}, Stage {stage_idx}, Step {step_idx}.")
-
-                                                    else:
-                                                         log_message(f"        SKIPPED UPDATE: Roadmap structure changed or original link mismatch for Roadmap ID {roadmap_id}, Stage {stage_idx}, Step {step_idx}.")
-                                                         conn.rollback() # Rollback if structure changed or link mismatch
-
-                                                except (json.JSONDecodeError, TypeError, IndexError) as json_e:
-                                                    log_message(f"        ERROR updating JSON for Roadmap ID {roadmap_id}: {json_e}")
-                                                    conn.rollback() # Rollback on JSON processing error
-                                            else:
-                                                 log_message(f"        ERROR: Could not re-fetch roadmap ID {roadmap_id} for update.")
-                                                 conn.rollback() # Rollback if roadmap disappeared
+                                            if _apply_replacement(cur, conn, invalid_link_db_id, roadmap_id, stage_idx, step_idx, link, new_url):
+                                                replaced_count += 1
                                         else:
                                             ai_failed_count += 1
                                             log_message(f"      AI failed to find replacement for instance (ID: {invalid_link_db_id}).")
@@ -287,7 +894,7 @@ def validate_roadmap_links():
                     valid_links_count += 1
                     # --- OPTIONAL: Mark previously invalid links as resolved if they are now valid ---
                     if link in link_locations:
-                         for roadmap_id, domain, stage_idx, step_idx, title, desc in link_locations[link]:
+                         for roadmap_id, domain, stage_idx, step_idx in link_locations.occurrences(link):
                              cur.execute("""
                                 UPDATE invalid_study_links
                                 SET resolved_at = %s, status_code = %s, new_url = 'NOW_VALID'
@@ -297,18 +904,59 @@ def validate_roadmap_links():
                          if cur.rowcount > 0:
                               log_message(f"    Marked previously invalid link as NOW_VALID: {link} in Roadmap ID {roadmap_id}, Stage {stage_idx}, Step {step_idx}")
                               conn.commit() # Commit the resolution
+                    else:
+                         # URL came from an unchanged roadmap; resolve any open instances by URL
+                         cur.execute("""
+                            UPDATE invalid_study_links
+                            SET resolved_at = %s, status_code = %s, new_url = 'NOW_VALID'
+                            WHERE original_url = %s AND resolved_at IS NULL
+                         """, (datetime.now(), status, link))
+                         if cur.rowcount > 0:
+                              log_message(f"    Marked {cur.rowcount} previously invalid instance(s) as NOW_VALID: {link}")
+                              conn.commit()
                     # ---------------------------------------------------------------------------------
 
-                time.sleep(0.5) # Be polite between URL checks
+            if last_link:
+                _checkpoint_run(cur, conn, run_id, last_link, links_processed)
+            durations["process"] = time.monotonic() - phase_started
+
+            if pending_replacements:
+                phase_started = time.monotonic()
+                batch_replaced, batch_failed = _replace_links_batched(cur, conn, pending_replacements, max_workers, heartbeat)
+                replaced_count += batch_replaced
+                ai_failed_count += batch_failed
+                durations["ai_replacement"] = time.monotonic() - phase_started
+
+            log_message(f"Finished URL checks. Valid: {valid_links_count}, Invalid: {invalid_links_count}, Cached (not due): {cached_count}, AI Replaced: {replaced_count}, AI Failed: {ai_failed_count}")
 
-            log_message(f"Finished URL checks. Valid: {valid_links_count}, Invalid: {invalid_links_count}, AI Replaced: {replaced_count}, AI Failed: {ai_failed_count}")
+        # --- Only a run that got this far advances the watermark ---
+        _set_state(cur, watermark_key, scan_started_at.strftime("%Y-%m-%d %H:%M:%S"))
+        conn.commit()
+        log_message(f"Saved watermark {scan_started_at} for the next incremental run.")
+
+        counts.update({"valid": valid_links_count, "invalid": invalid_links_count, "cached": cached_count,
+                       "replaced": replaced_count, "ai_failed": ai_failed_count})
+        report = _build_run_report(run_id, resumed, options, run_started, durations, counts, host_stats)
+        _finish_run(cur, conn, run_id, 'completed', report)
+        log_message(f"Run report: {json.dumps(report, default=str)}")
 
     except Exception as e:
         log_message(f"❌ An unexpected error occurred during validation process: {e}")
         traceback.print_exc()
         if conn: conn.rollback() # Rollback any partial transaction
+        if conn and run_id:
+            try:
+                # Left resumable: the next run picks up from the last checkpoint
+                counts["error"] = str(e)
+                _finish_run(cur, conn, run_id, 'failed',
+                            _build_run_report(run_id, resumed, options, run_started, durations, counts, host_stats))
+            except Exception as report_err:
+                log_message(f"    WARNING: Could not store failed run report: {report_err}")
     finally:
         # Cleanup DB
+        if lease_held:
+            try: _release_lease(cur, conn, shard_key, lease_owner)
+            except Exception as e: log_message(f"    WARNING: Could not release shard lease: {e}")
         if cur: cur.close()
         if conn: conn.close()
         log_message("--- Roadmap Link Validation Finished ---")
@@ -321,7 +969,57 @@ def validate_roadmap_links():
                 log_message("    Lock released and file removed.")
             except (OSError, portalocker.LockException, FileNotFoundError) as e:
                 log_message(f"    WARNING: Could not release lock or remove lock file: {e}")
+        _log_writer.close() # Flush buffered log lines
+    return report
+
+
+def run_sharded(shards, processes=None, **options):
+    """
+    Runs every shard in a pool of local worker processes (one shard per process at a time).
+    Shards are claimed through DB leases, so the same command on several machines splits the
+    shards between them; shards leased elsewhere are skipped here.
+    """
+    processes = max(1, min(processes or os.cpu_count() or 1, shards))
+    log_message(f"--- Starting sharded link validation: {shards} shards, {processes} processes ---")
+    reports = []
+    with concurrent.futures.ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = {executor.submit(validate_roadmap_links, shard=i, shards=shards, **options): i for i in range(shards)}
+        for future in concurrent.futures.as_completed(futures):
+            shard = futures[future]
+            try:
+                report = future.result()
+            except Exception as e:
+                log_message(f"❌ Shard {shard} worker crashed: {e}")
+                continue
+            if report: reports.append(report)
+            else: log_message(f"Shard {shard} was skipped or failed.")
+
+    totals = {}
+    for report in reports:
+        for key, value in report.get("counts", {}).items():
+            if isinstance(value, (int, float)): totals[key] = totals.get(key, 0) + value
+    log_message(f"--- Sharded link validation finished: {len(reports)}/{shards} shards completed. Totals: {json.dumps(totals)} ---")
+    _log_writer.close()
+    return reports
 
 # --- Run the validation ---
 if __name__ == "__main__":
-    validate_roadmap_links()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Validate roadmap study links.")
+    parser.add_argument("--sequential", action="store_true", help="Check URLs one at a time instead of concurrently.")
+    parser.add_argument("--workers", type=int, default=CHECK_MAX_WORKERS, help="Number of concurrent URL checks.")
+    parser.add_argument("--ignore-cache", action="store_true", help="Recheck every URL, even if it is not due.")
+    parser.add_argument("--full", action="store_true", help="Scan every roadmap instead of only those changed since the last run.")
+    parser.add_argument("--per-link-ai", action="store_true", help="Ask the AI once per broken link occurrence instead of in batches.")
+    parser.add_argument("--shards", type=int, default=1, help="Split URLs into this many shards by consistent hash of their host.")
+    parser.add_argument("--shard", type=int, help="Run only this shard (0-based); e.g. one shard per machine.")
+    parser.add_argument("--processes", type=int, help="Local worker processes for sharded runs (default: CPU count).")
+    args = parser.parse_args()
+    options = dict(sequential=args.sequential, max_workers=args.workers, ignore_cache=args.ignore_cache,
+                   full=args.full, batch_ai=not args.per_link_ai)
+    if args.shards > 1 and args.shard is not None:
+        if not 0 <= args.shard < args.shards: parser.error("--shard must be between 0 and --shards - 1")
+        validate_roadmap_links(shard=args.shard, shards=args.shards, **options)
+    elif args.shards > 1:
+        run_sharded(args.shards, processes=args.processes, **options)
+    else:
+        validate_roadmap_links(**options)
\ No newline at end of file
@@ -0,0 +1,21 @@
+-- At most one UNRESOLVED invalid_study_links row per (roadmap, stage, step, url), so
+-- link_validator shards running concurrently cannot log the same broken occurrence twice.
+-- Resolved rows get a NULL key and are not constrained.
+-- Apply once, before running link_validator with --shards > 1:
+--   mysql <database> < migrations/001_invalid_study_links_unresolved_key.sql
+
+-- 1. Close existing duplicates, keeping the oldest unresolved row of each occurrence
+UPDATE invalid_study_links dup
+JOIN invalid_study_links keep
+  ON keep.roadmap_id = dup.roadmap_id AND keep.stage_index = dup.stage_index
+ AND keep.step_index = dup.step_index AND keep.original_url = dup.original_url
+ AND keep.resolved_at IS NULL AND keep.id < dup.id
+SET dup.resolved_at = NOW(), dup.new_url = 'DUPLICATE'
+WHERE dup.resolved_at IS NULL;
+
+-- 2. Unique key over unresolved occurrences only
+ALTER TABLE invalid_study_links
+  ADD COLUMN unresolved_key CHAR(64) AS (
+    IF(resolved_at IS NULL, SHA2(CONCAT_WS('|', roadmap_id, stage_index, step_index, original_url), 256), NULL)
+  ) STORED,
+  ADD UNIQUE KEY uq_invalid_study_links_unresolved (unresolved_key);
@@ -0,0 +1,17 @@
+-- Normalized job recommendation history (utils/job_history.py): each search row stores its
+-- job_count and references `jobs` through job_recommendation_history_jobs, so new rows leave
+-- the legacy `recommendations` blob NULL.
+-- Apply once, before deploying the normalized history code:
+--   mysql <database> < migrations/002_job_recommendation_history_job_count.sql
+
+ALTER TABLE job_recommendation_history ADD COLUMN job_count INT;
+
+-- Make the blob nullable while keeping its existing column type
+SET @blob_type = (
+  SELECT COLUMN_TYPE FROM information_schema.COLUMNS
+  WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'job_recommendation_history' AND COLUMN_NAME = 'recommendations'
+);
+SET @modify_blob = CONCAT('ALTER TABLE job_recommendation_history MODIFY recommendations ', @blob_type, ' NULL');
+PREPARE modify_blob FROM @modify_blob;
+EXECUTE modify_blob;
+DEALLOCATE PREPARE modify_blob;
@@ -0,0 +1,9 @@
+-- roadmaps.updated_at is the watermark column for incremental link validation: link_validator
+-- only re-parses roadmaps changed since its last successful run. Until this is applied every
+-- link_validator run is a full scan.
+-- Apply once (rebuilds the roadmaps table, so run it off-peak):
+--   mysql <database> < migrations/003_roadmaps_updated_at.sql
+
+ALTER TABLE roadmaps
+  ADD COLUMN updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+  ADD INDEX idx_roadmaps_updated_at (updated_at);
@@ -0,0 +1,6 @@
+-- link_validation_runs.shard_key lets each link_validator shard resume its own interrupted run.
+-- Only needed for a link_validation_runs table created before sharding; new tables already have it.
+-- Apply once, before running this version of link_validator:
+--   mysql <database> < migrations/004_link_validation_runs_shard_key.sql
+
+ALTER TABLE link_validation_runs ADD COLUMN shard_key VARCHAR(32);
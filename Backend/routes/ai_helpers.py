@@ -4,6 +4,7 @@ import json
 import re
 import traceback
 from db_config import get_db_connection
+from utils import profile_snapshot
 from config import SECRET_KEY
 # --- 1. Import the Gemini model ---
 from api_config import gemini_model 
@@ -53,18 +54,8 @@ def generate_cover_letter():
         user_degree = user_details.get('degree', 'their education') if user_details else 'their education'
         user_stream = user_details.get('stream', '') if user_details else ''
 
-        # Get Skills List (from extract_skills)
-        cur.execute("SELECT skills FROM extract_skills WHERE user_id = %s", (user_id,))
-        skills_row = cur.fetchone()
-        user_skills_list = []
-        if skills_row and skills_row.get('skills'):
-            try:
-                skill_data = skills_row['skills']
-                if isinstance(skill_data, (bytes, bytearray)): skill_data = skill_data.decode('utf-8')
-                if isinstance(skill_data, str): user_skills_list = json.loads(skill_data)
-                elif isinstance(skill_data, list): user_skills_list = skill_data
-            except (json.JSONDecodeError, TypeError):
-                pass # Keep list empty
+        # Get Skills List (manual + extracted, from the profile snapshot)
+        user_skills_list = profile_snapshot.get_snapshot(cur, user_id, conn)['skills']
 
         # Get Full Resume Text for context
         cur.execute("SELECT extracted_text FROM extracted_resume_text WHERE user_id = %s", (user_id,))
@@ -3,6 +3,7 @@ import jwt
 import json
 from db_config import get_db_connection
 from config import SECRET_KEY
+from utils import job_history
 
 # A single blueprint for all dashboard preview data
 dashboard_previews_bp = Blueprint('dashboard_previews', __name__)
@@ -243,10 +244,12 @@ def get_latest_job_search():
     
     cur = conn.cursor(dictionary=True)
     try:
-        # Query the job recommendation history table
+        job_history.ensure_history_tables(cur)
+        # Query the job recommendation history table (the blob is only read for legacy rows)
         cur.execute(
             """
-            SELECT base_queries, locations, recommendations
+            SELECT base_queries, locations, job_count,
+                   IF(job_count IS NULL, recommendations, NULL) AS recommendations
             FROM job_recommendation_history 
             WHERE user_id = %s 
             ORDER BY created_at DESC 
@@ -265,15 +268,17 @@ def get_latest_job_search():
         except (json.JSONDecodeError, TypeError):
             locations_list = []
             
-        try:
-            recommendations_list = json.loads(latest_search['recommendations'])
-        except (json.JSONDecodeError, TypeError):
-            recommendations_list = []
+        job_count = latest_search.get('job_count')
+        if job_count is None:
+            try:
+                job_count = len(json.loads(latest_search['recommendations']))
+            except (json.JSONDecodeError, TypeError):
+                job_count = 0
 
         summary = {
             "base_queries": latest_search.get('base_queries', 'N/A'),
             "locations": locations_list,
-            "job_count": len(recommendations_list)
+            "job_count": job_count
         }
         
         return jsonify({"latest_search": summary}), 200
@@ -4,6 +4,7 @@ import json
 import re
 import jwt
 from db_config import get_db_connection
+from utils import profile_snapshot
 from config import SECRET_KEY
 from api_config import gemini_model  # Import the initialized Gemini model
 
@@ -78,6 +79,7 @@ def extract_and_store_skills():
             return jsonify({"message": "No specific technical skills were identified in the resume."}), 200
 
         # --- Step 5: Store the extracted skills in the new table ---
+        profile_snapshot.ensure_snapshot_table(cur)
         # First, delete any old skills for this user to avoid duplicates
         cur.execute("DELETE FROM extract_skills WHERE user_id = %s", (user_id,))
 
@@ -86,6 +88,7 @@ def extract_and_store_skills():
             "INSERT INTO extract_skills (user_id, skills) VALUES (%s, %s)",
             (user_id, json.dumps(skills_list))
         )
+        profile_snapshot.refresh_snapshot(cur, user_id)
         conn.commit()
 
         return jsonify({
@@ -1,5 +1,5 @@
 # job_recs.py
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response, stream_with_context
 import jwt
 import json
 import re
@@ -9,22 +9,30 @@ from config import SECRET_KEY, RAPIDAPI_KEY
 from api_config import gemini_model
 import traceback
 import concurrent.futures # For concurrent API calls
+from contextlib import closing
 from datetime import datetime # Import datetime for timestamp (if needed)
+from utils import jsearch_cache, job_query_planner, http_client, job_index, job_history, base_query_cache, profile_snapshot
 
 job_recs_bp = Blueprint('job_recs', __name__)
 
 # --- JSearch API Configuration ---
 JSEARCH_API_URL = "https://jsearch.p.rapidapi.com/search"
 JSEARCH_API_HOST = "jsearch.p.rapidapi.com"
+# Filters sent with every query; part of the shared cache key
+JSEARCH_FILTERS = {
+    "page": "1", "num_pages": "1",
+    "employment_types": "FULLTIME,INTERN,CONTRACTOR",
+    "job_requirements": "no_experience"
+}
+JSEARCH_MAX_WORKERS = 5 # Live calls run in waves of this size, so an early stop saves the later waves
 # ---------------------------------
 
 @job_recs_bp.route('/get-profile-for-jobs', methods=['GET'])
 def get_profile_for_jobs():
     """
     Fetches user's skills and completed courses (grouped by domain) to pre-fill the form.
-    Handles case-insensitive skill deduplication and robust JSON parsing.
+    Skills come merged and deduplicated from user_profile_snapshot.
     """
-    # ... (This function remains unchanged) ...
     token = request.cookies.get("token")
     user_id = None
     if not token: return jsonify({"error": "Authentication required."}), 401
@@ -41,40 +49,8 @@ def get_profile_for_jobs():
         if not conn: return jsonify({"error": "Database connection failed."}), 500
 
         cur = conn.cursor(dictionary=True)
-        manual_skills, extracted_skills = [], []
-
-        # Fetch manual skills
-        cur.execute("SELECT skills FROM user_details WHERE user_id = %s", (user_id,))
-        user_details_rows = cur.fetchall()
-        user_details = user_details_rows[0] if user_details_rows else None
-        if user_details and user_details.get('skills'):
-            skills_data = user_details['skills']
-            if isinstance(skills_data, (bytes, bytearray)): skills_data = skills_data.decode('utf-8')
-            if isinstance(skills_data, str):
-                try:
-                    manual_skills = json.loads(skills_data)
-                    if not isinstance(manual_skills, list): manual_skills = []
-                except json.JSONDecodeError: manual_skills = []
-            elif isinstance(skills_data, list): manual_skills = skills_data
-
-        # Fetch extracted skills
-        cur.execute("SELECT skills FROM extract_skills WHERE user_id = %s", (user_id,))
-        extracted_details_rows = cur.fetchall()
-        extracted_details = extracted_details_rows[0] if extracted_details_rows else None
-        if extracted_details and extracted_details.get('skills'):
-            skills_data = extracted_details['skills']
-            if isinstance(skills_data, (bytes, bytearray)): skills_data = skills_data.decode('utf-8')
-            if isinstance(skills_data, str):
-                try:
-                    extracted_skills = json.loads(skills_data)
-                    if not isinstance(extracted_skills, list): extracted_skills = []
-                except json.JSONDecodeError: extracted_skills = []
-            elif isinstance(skills_data, list): extracted_skills = skills_data
-
-        combined_skills_raw = manual_skills + extracted_skills
-        combined_skills_str = [str(skill).strip() for skill in combined_skills_raw if skill and str(skill).strip()]
-        unique_skills_dict = {skill.lower(): skill.title() for skill in combined_skills_str}
-        final_skills = sorted(list(unique_skills_dict.values()))
+        profile = profile_snapshot.get_snapshot(cur, user_id, conn)
+        final_skills = profile['skills']
 
         # Fetch completed courses
         cur.execute("""
@@ -91,7 +67,10 @@ def get_profile_for_jobs():
                 if domain not in completed_courses_by_domain: completed_courses_by_domain[domain] = []
                 completed_courses_by_domain[domain].append(course_title)
 
-        return jsonify({ "skills": final_skills, "completed_courses_by_domain": completed_courses_by_domain }), 200
+        return jsonify({
+            "skills": final_skills, "completed_courses_by_domain": completed_courses_by_domain,
+            "profile_version": profile['profile_version']
+        }), 200
 
     except Exception as e:
         print(f"❌ Error fetching profile for jobs: {e}")
@@ -102,13 +81,47 @@ def get_profile_for_jobs():
         if conn: conn.close()
 
 
+def _cached_base_queries(profile_key):
+    """Base queries already generated for an identical profile, or None (cache errors count as misses)."""
+    conn = get_db_connection()
+    if not conn: return None
+    cur = conn.cursor(dictionary=True)
+    try:
+        base_query_cache.ensure_cache_table(cur)
+        cached_queries = base_query_cache.get(cur, profile_key)
+        conn.commit()
+        return cached_queries
+    except Exception as e:
+        print(f"⚠️ Base query cache lookup failed: {e}")
+        return None
+    finally:
+        cur.close()
+        conn.close()
+
+
+def _store_base_queries(profile_key, base_queries_str):
+    conn = get_db_connection()
+    if not conn: return
+    cur = conn.cursor(dictionary=True)
+    try:
+        base_query_cache.ensure_cache_table(cur)
+        base_query_cache.put(cur, profile_key, base_queries_str)
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        print(f"⚠️ Could not cache generated base queries: {e}")
+    finally:
+        cur.close()
+        conn.close()
+
+
 @job_recs_bp.route('/generate-job-query', methods=['POST'])
 def generate_job_queries():
     """
     Uses AI to generate 2-3 simple BASE search query strings (skill + role, NO location).
-    comma-separated, based on user skills/courses.
+    comma-separated, based on user skills/courses. Answers are shared through
+    job_base_query_cache, keyed by a fingerprint of the skills and completed courses.
     """
-    # ... (This function remains unchanged) ...
     token = request.cookies.get("token")
     if not token: return jsonify({"error": "Authentication required."}), 401
     try:
@@ -122,6 +135,13 @@ def generate_job_queries():
 
     if not skills:
         return jsonify({"error": "Skills are required to generate queries."}), 400
+
+    profile_key = base_query_cache.fingerprint(skills, completed_courses)
+    cached_queries = _cached_base_queries(profile_key)
+    if cached_queries:
+        print(f"Reusing cached BASE search queries: {cached_queries}")
+        return jsonify({"base_queries": cached_queries, "cached": True}), 200
+
     if not gemini_model:
         return jsonify({"error": "AI Model not available."}), 503
 
@@ -160,7 +180,8 @@ def generate_job_queries():
         print(f"Generated BASE search queries: {final_queries_str}")
 
         if not final_queries_str: raise ValueError("AI failed to generate valid base query strings.")
-        return jsonify({"base_queries": final_queries_str}), 200
+        _store_base_queries(profile_key, final_queries_str)
+        return jsonify({"base_queries": final_queries_str, "cached": False}), 200
 
     except Exception as e:
         print(f"❌ Error during AI base query generation: {e}")
@@ -168,33 +189,260 @@ def generate_job_queries():
         return jsonify({"error": "An internal server error occurred generating the base search queries."}), 500
 
 
-def fetch_jobs_from_api(query):
-    """Calls JSearch API for a given query with 'no_experience' filter."""
-    # ... (This function remains unchanged) ...
+def _call_jsearch(query):
+    """Calls JSearch API for a given query with 'no_experience' filter. Returns None if the call failed."""
     if not RAPIDAPI_KEY or RAPIDAPI_KEY == "PASTE_YOUR_API_KEY_HERE":
         print("❌ Error: RAPIDAPI_KEY is not configured for fetch_jobs_from_api.")
-        return []
-    querystring = {
-        "query": query.strip(), "page": "1", "num_pages": "1",
-        "employment_types": "FULLTIME,INTERN,CONTRACTOR",
-        "job_requirements": "no_experience"
-    }
+        return None
+    querystring = {"query": query.strip(), **JSEARCH_FILTERS}
     headers = { "x-rapidapi-key": RAPIDAPI_KEY, "x-rapidapi-host": JSEARCH_API_HOST }
     try:
         print(f"Calling JSearch API with query: {query}")
-        api_response = requests.get(JSEARCH_API_URL, headers=headers, params=querystring, timeout=15)
+        api_response = http_client.get("jsearch", JSEARCH_API_URL, headers=headers, params=querystring)
         api_response.raise_for_status()
         api_data = api_response.json()
         return api_data.get('data', []) if isinstance(api_data.get('data'), list) else []
     except requests.exceptions.Timeout:
         print(f"⚠️ JSearch API call timed out for query: {query}")
-        return []
+        return None
     except requests.exceptions.RequestException as e:
         print(f"❌ Error calling JSearch API for query '{query}': {e}")
-        return []
+        return None
     except Exception as e:
         print(f"❌ Unexpected error fetching jobs for query '{query}': {e}")
+        return None
+
+
+def _iter_job_results(queries):
+    """
+    Yields (query, jobs, from_cache) for every query: shared-cache hits first, then live
+    JSearch calls as each one completes. Successful API responses are cached and added to the
+    local job index when the generator finishes or is closed early (failed calls are not cached,
+    so they are retried next time).
+    """
+    queries = list(dict.fromkeys(queries)) # Dedupe, keep order
+    cached = {}
+    fresh = {}
+    conn = get_db_connection()
+    cur = None
+    try:
+        if conn:
+            cur = conn.cursor(dictionary=True)
+            try:
+                jsearch_cache.ensure_cache_table(cur)
+                cached = jsearch_cache.get_many(cur, queries, JSEARCH_FILTERS)
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                jsearch_cache.stats.add(errors=1)
+                print(f"⚠️ JSearch cache lookup failed, calling the API for every query: {e}")
+        else:
+            print("⚠️ No DB connection for the JSearch cache, calling the API for every query.")
+
+        for query in queries:
+            if query in cached:
+                print(f"⚡ Cache hit for query: {query} ({len(cached[query])} results)")
+                yield query, cached[query], True
+
+        misses = [q for q in queries if q not in cached]
+        if misses:
+            # Not a `with` block: if the consumer stops early, queued calls are cancelled instead of run
+            executor = concurrent.futures.ThreadPoolExecutor(max_workers=min(len(misses), JSEARCH_MAX_WORKERS))
+            try:
+                future_to_query = {executor.submit(_call_jsearch, query): query for query in misses}
+                for future in concurrent.futures.as_completed(future_to_query):
+                    query = future_to_query[future]
+                    try:
+                        jobs = future.result()
+                    except Exception as exc:
+                        print(f'❌ Query {query} generated an exception during processing: {exc}')
+                        jobs = None
+                    if jobs is not None:
+                        fresh[query] = jobs
+                    yield query, jobs or [], False
+            finally:
+                executor.shutdown(wait=False, cancel_futures=True)
+    finally:
+        if fresh and cur:
+            try:
+                jsearch_cache.put_many(cur, fresh, JSEARCH_FILTERS)
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                jsearch_cache.stats.add(errors=1)
+                print(f"⚠️ Could not store JSearch responses in the cache: {e}")
+            try:
+                job_index.ensure_index_tables(cur)
+                indexed = job_index.ingest_jobs(cur, [job for jobs in fresh.values() for job in jobs], _format_job)
+                conn.commit()
+                print(f"🗂️ Indexed {indexed} jobs in the local job index.")
+            except Exception as e:
+                conn.rollback()
+                print(f"⚠️ Could not index JSearch results locally: {e}")
+        if cur: cur.close()
+        if conn: conn.close()
+
+
+def _plan_job_search(base_query_list, location_list):
+    """Runs the query planner against the shared cache (see utils/job_query_planner.py)."""
+    conn = get_db_connection()
+    cur = None
+
+    def lookup(queries):
+        if not cur: return {}
+        try:
+            return jsearch_cache.lookup_meta(cur, queries, JSEARCH_FILTERS)
+        except Exception as e:
+            print(f"⚠️ Query planner could not read the JSearch cache: {e}")
+            return {}
+
+    try:
+        if conn:
+            cur = conn.cursor(dictionary=True)
+            try:
+                jsearch_cache.ensure_cache_table(cur)
+            except Exception as e:
+                print(f"⚠️ JSearch cache table unavailable for planning: {e}")
+                cur.close(); cur = None
+        plan = job_query_planner.plan_queries(base_query_list, location_list, lookup)
+    finally:
+        if cur: cur.close()
+        if conn: conn.close()
+    print(f"🧭 Query plan: {len(plan['queries'])} queries ({plan['cached']} cached, {plan['live_calls']} live calls, "
+          f"{plan['merged']} merged, {len(plan['skipped'])} skipped over budget)")
+    return plan
+
+
+def fetch_jobs_from_api(query):
+    """Jobs for one query, served from the shared cache when possible."""
+    for _, jobs, _ in _iter_job_results([query]):
+        return jobs
+    return []
+
+
+def _search_local_index(base_query_list, location_list):
+    """Formatted jobs for this search from the local job index (empty if unavailable)."""
+    conn = get_db_connection()
+    if not conn: return []
+    cur = conn.cursor(dictionary=True)
+    try:
+        job_index.ensure_index_tables(cur)
+        local_jobs = job_index.search_local(cur, base_query_list, location_list)
+        print(f"🗂️ Local job index matched {len(local_jobs)} jobs.")
+        return local_jobs
+    except Exception as e:
+        print(f"⚠️ Local job index search failed: {e}")
         return []
+    finally:
+        cur.close()
+        conn.close()
+
+
+def _rank_jobs_for_user(user_id, jobs):
+    """
+    Orders jobs by TF-IDF cosine similarity to the user's merged skills and explains each match.
+    Adds "match_score" to each job; returns the jobs unchanged if ranking is unavailable.
+    """
+    if not jobs: return jobs
+    conn = get_db_connection()
+    if not conn: return jobs
+    cur = conn.cursor(dictionary=True)
+    try:
+        skills = profile_snapshot.get_snapshot(cur, user_id, conn)['skills']
+        scores = job_index.rank_jobs(cur, [job['job_id'] for job in jobs], skills)
+    except Exception as e:
+        print(f"⚠️ Could not rank jobs by skill match: {e}")
+        return jobs
+    finally:
+        cur.close()
+        conn.close()
+    if not scores: return jobs
+
+    for job in jobs:
+        score, matched_skills = scores.get(job['job_id'], (0.0, []))
+        job['match_score'] = round(score * 100)
+        if matched_skills:
+            job['recommendation_reason'] = f"Matches your skills: {', '.join(matched_skills[:5])}"
+    return sorted(jobs, key=lambda job: job.get('match_score', 0), reverse=True) # Stable: ties keep API order
+
+
+def _format_job(job):
+    """Turns a raw JSearch job into the shape the frontend renders. Returns None if unusable."""
+    job_id = job.get('job_id')
+    job_url = job.get('job_apply_link') or job.get('job_google_link') or job.get('job_linkedin_link')
+    if not job_id or not job_url: return None
+
+    salary_text = "Not specified"
+    if job.get('job_min_salary') and job.get('job_salary_period'): salary_text = f"{job.get('job_min_salary')} {job.get('job_salary_currency')} / {job.get('job_salary_period').lower()}"
+    elif job.get('job_min_salary'): salary_text = f"{job.get('job_min_salary')} {job.get('job_salary_currency')}"
+
+    city = job.get('job_city'); state = job.get('job_state'); country = job.get('job_country')
+    location_parts = [part for part in [city, state, country] if part]
+    location = ", ".join(location_parts) if location_parts else "N/A"
+    if job.get('job_is_remote'): location = "Remote"
+
+    return {
+        "job_id": job_id,
+        "job_title": job.get('job_title', 'N/A'),
+        "company_name": job.get('employer_name', 'N/A'),
+        "location": location,
+        "job_url": job_url,
+        "source": job.get('job_publisher') or JSEARCH_API_HOST,
+        "estimated_salary_lpa": salary_text,
+        "recommendation_reason": "Matched via multi-query/location search (entry-level focus)"
+    }
+
+
+def _save_job_history(user_id, base_queries_str, location_list, final_job_list):
+    """Saves one search to job_recommendation_history. Returns True if saved."""
+    if not user_id or not final_job_list:
+        print("ℹ️ No jobs found, not saving to history.")
+        return False
+    conn = None
+    cur = None
+    try:
+        conn = get_db_connection()
+        if not conn:
+            print("❌ Could not get DB connection to save job history.")
+            return False
+        cur = conn.cursor(dictionary=True)
+        job_history.ensure_history_tables(cur)
+        # Jobs are stored once in `jobs`; the history row only references their IDs
+        job_history.save_history(cur, user_id, base_queries_str, location_list, final_job_list)
+        conn.commit()
+        print(f"✅ Saved {len(final_job_list)} job recommendations to history for user {user_id}.")
+        return True
+    except Exception as db_e:
+        if conn: conn.rollback()
+        print(f"❌ Error saving job recommendation history: {db_e}")
+        traceback.print_exc() # Log the full DB error
+        return False
+    finally:
+        if cur: cur.close()
+        if conn: conn.close()
+
+
+def _parse_search_request(req_data):
+    """
+    Validates a search request body.
+    Returns (base_queries_str, base_query_list, location_list, error_message).
+    """
+    req_data = req_data or {}
+    base_queries_str = req_data.get('base_queries')
+    locations = req_data.get('locations', []) # This is a Python list from JSON
+
+    if not base_queries_str:
+        return None, None, None, "Base search query strings are required."
+    if not isinstance(locations, list) or not locations:
+        locations = ["India"] # Default if none provided
+
+    base_query_list = [q.strip() for q in base_queries_str.split(',') if q.strip()]
+    location_list = [loc.strip() for loc in locations if isinstance(loc, str) and loc.strip()]
+
+    if not base_query_list: return None, None, None, "Valid base queries are required."
+    if not location_list: return None, None, None, "Valid locations are required."
+
+    return base_queries_str, base_query_list, location_list, None
 
 
 @job_recs_bp.route('/search-jobs', methods=['POST'])
@@ -204,124 +452,42 @@ def search_jobs_multi_query_location():
     merges/deduplicates results, and saves the result to the database.
     """
     token = request.cookies.get("token")
-    user_id = None # <-- *** NEW: Initialize user_id ***
     if not token: return jsonify({"error": "Authentication required."}), 401
     try:
-        # --- *** NEW: Get user_id from token *** ---
-        user_data = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
-        user_id = user_data["user_id"] # <-- *** NEW: Assign user_id ***
+        user_id = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])["user_id"]
     except (jwt.ExpiredSignatureError, jwt.InvalidTokenError):
         return jsonify({"error": "Invalid or expired session."}), 401
 
-    # --- Database connection variables for saving history ---
-    conn = None
-    cur = None
-    
     try:
-        req_data = request.get_json()
-        base_queries_str = req_data.get('base_queries')
-        locations = req_data.get('locations', []) # This is a Python list from JSON
-
-        if not base_queries_str:
-            return jsonify({"error": "Base search query strings are required."}), 400
-        if not isinstance(locations, list) or not locations:
-            locations = ["India"] # Default if none provided
-
-        base_query_list = [q.strip() for q in base_queries_str.split(',') if q.strip()]
-        location_list = [loc.strip() for loc in locations if loc.strip()]
-
-        if not base_query_list: return jsonify({"error": "Valid base queries are required."}), 400
-        if not location_list: return jsonify({"error": "Valid locations are required."}), 400
-
-        combined_search_queries = [f"{bq} {loc}" for bq in base_query_list for loc in location_list]
-        if not combined_search_queries: return jsonify({"error": "Could not generate combined search queries."}), 400
-
-        print(f"Generated {len(combined_search_queries)} combined queries for JSearch.")
-
-        all_job_data = []
-        max_workers = min(len(combined_search_queries), 10)
-        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-            future_to_query = {executor.submit(fetch_jobs_from_api, query): query for query in combined_search_queries}
-            for future in concurrent.futures.as_completed(future_to_query):
-                query = future_to_query[future]
-                try:
-                    results = future.result()
+        base_queries_str, base_query_list, location_list, error = _parse_search_request(request.get_json())
+        if error: return jsonify({"error": error}), 400
+
+        # Repeat searches are answered from the local job index first
+        processed_jobs = {job['job_id']: job for job in _search_local_index(base_query_list, location_list)}
+        if len(processed_jobs) >= job_query_planner.JSEARCH_TARGET_JOBS:
+            print(f"🗂️ Local index has {len(processed_jobs)} matching jobs, skipping the API.")
+        else:
+            plan = _plan_job_search(base_query_list, location_list)
+
+            # Deduplicate and Format Results as each query completes
+            with closing(_iter_job_results(plan['queries'])) as job_results:
+                for query, results, from_cache in job_results:
                     if results:
-                        print(f"✅ Received {len(results)} results for query: {query}")
-                        all_job_data.extend(results)
+                        print(f"✅ Received {len(results)} results for query: {query}{' (cached)' if from_cache else ''}")
                     else:
                         print(f"ℹ️ No results found for query: {query}")
-                except Exception as exc:
-                    print(f'❌ Query {query} generated an exception during processing: {exc}')
-
-        print(f"Total raw results fetched: {len(all_job_data)}")
-
-        # Deduplicate and Format Results
-        processed_jobs = {}
-        for job in all_job_data:
-            job_id = job.get('job_id')
-            if not job_id or job_id in processed_jobs: continue
-
-            job_url = job.get('job_apply_link') or job.get('job_google_link') or job.get('job_linkedin_link')
-            if not job_url: continue
-
-            salary_text = "Not specified"
-            if job.get('job_min_salary') and job.get('job_salary_period'): salary_text = f"{job.get('job_min_salary')} {job.get('job_salary_currency')} / {job.get('job_salary_period').lower()}"
-            elif job.get('job_min_salary'): salary_text = f"{job.get('job_min_salary')} {job.get('job_salary_currency')}"
-
-            city = job.get('job_city'); state = job.get('job_state'); country = job.get('job_country')
-            location_parts = [part for part in [city, state, country] if part]
-            location = ", ".join(location_parts) if location_parts else "N/A"
-            if job.get('job_is_remote'): location = "Remote"
-
-            formatted_job = {
-                "job_id": job_id,
-                "job_title": job.get('job_title', 'N/A'),
-                "company_name": job.get('employer_name', 'N/A'),
-                "location": location,
-                "job_url": job_url,
-                "source": job.get('job_publisher') or JSEARCH_API_HOST,
-                "estimated_salary_lpa": salary_text,
-                "recommendation_reason": "Matched via multi-query/location search (entry-level focus)"
-            }
-            processed_jobs[job_id] = formatted_job
-
-        final_job_list = list(processed_jobs.values())
+                    for job in results:
+                        if job.get('job_id') in processed_jobs: continue
+                        formatted_job = _format_job(job)
+                        if formatted_job: processed_jobs[formatted_job['job_id']] = formatted_job
+                    if len(processed_jobs) >= job_query_planner.JSEARCH_TARGET_JOBS:
+                        print(f"⏹️ Collected {len(processed_jobs)} unique jobs, stopping early.")
+                        break
+
+        final_job_list = _rank_jobs_for_user(user_id, list(processed_jobs.values()))
         print(f"Returning {len(final_job_list)} unique jobs after deduplication.")
 
-        # --- *** NEW: Save to Database *** ---
-        # Only save if we have a valid user and found at least one job
-        if user_id and final_job_list:
-            try:
-                conn = get_db_connection()
-                if conn:
-                    cur = conn.cursor()
-                    cur.execute("""
-                        INSERT INTO job_recommendation_history
-                        (user_id, base_queries, locations, recommendations, created_at)
-                        VALUES (%s, %s, %s, %s, %s)
-                    """, (
-                        user_id,
-                        base_queries_str, # The original comma-separated string
-                        json.dumps(location_list), # The list of locations used
-                        json.dumps(final_job_list), # The final list of jobs
-                        datetime.now()
-                    ))
-                    conn.commit()
-                    print(f"✅ Saved {len(final_job_list)} job recommendations to history for user {user_id}.")
-                else:
-                    print("❌ Could not get DB connection to save job history.")
-            except Exception as db_e:
-                if conn: conn.rollback()
-                print(f"❌ Error saving job recommendation history: {db_e}")
-                traceback.print_exc() # Log the full DB error
-            finally:
-                if cur: cur.close()
-                if conn: conn.close()
-        elif not final_job_list:
-             print("ℹ️ No jobs found, not saving to history.")
-        # --- *** END NEW SECTION *** ---
-        
+        _save_job_history(user_id, base_queries_str, location_list, final_job_list)
         return jsonify({"jobs": final_job_list}), 200
 
     except Exception as e:
@@ -329,10 +495,110 @@ def search_jobs_multi_query_location():
         print(f"❌ Unexpected error in search_jobs_multi_query_location: {e}")
         traceback.print_exc()
         return jsonify({"error": "An internal server error occurred during job search."}), 500
+
+
+@job_recs_bp.route('/search-jobs/stream', methods=['POST'])
+def search_jobs_stream():
+    """
+    Same search as /search-jobs, streamed as NDJSON (one JSON object per line):
+    a "jobs" event with the new, deduplicated jobs as each query finishes (local index
+    matches first), then one "summary" event with the skill-match ranking after the
+    history has been saved.
+    """
+    token = request.cookies.get("token")
+    if not token: return jsonify({"error": "Authentication required."}), 401
+    try:
+        user_id = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])["user_id"]
+    except (jwt.ExpiredSignatureError, jwt.InvalidTokenError):
+        return jsonify({"error": "Invalid or expired session."}), 401
+
+    base_queries_str, base_query_list, location_list, error = _parse_search_request(request.get_json(silent=True))
+    if error: return jsonify({"error": error}), 400
+    local_jobs = _search_local_index(base_query_list, location_list)
+    answered_locally = len(local_jobs) >= job_query_planner.JSEARCH_TARGET_JOBS
+    plan = _plan_job_search(base_query_list, location_list) if not answered_locally else \
+        {"queries": [], "skipped": []}
+    planned_queries = plan['queries']
+
+    def generate():
+        processed_jobs = {job['job_id']: job for job in local_jobs}
+        queries_done = 0
+        cache_hits = 0
+        stopped_early = False
+        try:
+            if local_jobs:
+                yield json.dumps({
+                    "type": "jobs", "query": None, "source": "local_index", "cached": True, "jobs": local_jobs,
+                    "queries_done": 0, "queries_total": len(planned_queries)
+                }) + "\n"
+            with closing(_iter_job_results(planned_queries)) as job_results:
+                for query, results, from_cache in job_results:
+                    queries_done += 1
+                    cache_hits += 1 if from_cache else 0
+                    new_jobs = []
+                    for job in results:
+                        if job.get('job_id') in processed_jobs: continue
+                        formatted_job = _format_job(job)
+                        if formatted_job:
+                            processed_jobs[formatted_job['job_id']] = formatted_job
+                            new_jobs.append(formatted_job)
+                    yield json.dumps({
+                        "type": "jobs", "query": query, "source": "cache" if from_cache else "api", "cached": from_cache,
+                        "jobs": new_jobs, "queries_done": queries_done, "queries_total": len(planned_queries)
+                    }) + "\n"
+                    if len(processed_jobs) >= job_query_planner.JSEARCH_TARGET_JOBS:
+                        stopped_early = queries_done < len(planned_queries)
+                        break
+
+            final_job_list = _rank_jobs_for_user(user_id, list(processed_jobs.values()))
+            saved = _save_job_history(user_id, base_queries_str, location_list, final_job_list)
+            yield json.dumps({
+                "type": "summary", "total_jobs": len(final_job_list), "queries": queries_done,
+                "queries_planned": len(planned_queries), "queries_skipped_over_budget": len(plan['skipped']),
+                "local_index_jobs": len(local_jobs), "answered_locally": answered_locally,
+                "cache_hits": cache_hits, "stopped_early": stopped_early, "saved_to_history": saved,
+                "ranking": [{"job_id": job['job_id'], "match_score": job.get('match_score'),
+                             "recommendation_reason": job['recommendation_reason']} for job in final_job_list]
+            }) + "\n"
+        except Exception as e:
+            print(f"❌ Unexpected error in search_jobs_stream: {e}")
+            traceback.print_exc()
+            yield json.dumps({"type": "error", "error": "An internal server error occurred during job search."}) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson',
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@job_recs_bp.route('/job-search/cache-stats', methods=['GET'])
+def get_job_search_cache_stats():
+    """Hit-rate metrics for the shared JSearch response cache."""
+    token = request.cookies.get("token")
+    if not token: return jsonify({"error": "Authentication required."}), 401
+    try:
+        jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
+    except (jwt.ExpiredSignatureError, jwt.InvalidTokenError):
+        return jsonify({"error": "Invalid or expired session."}), 401
+
+    conn = None
+    cur = None
+    try:
+        conn = get_db_connection()
+        if not conn: return jsonify({"error": "Database connection failed."}), 500
+        cur = conn.cursor(dictionary=True)
+        jsearch_cache.ensure_cache_table(cur)
+        return jsonify({
+            "ttl_seconds": int(jsearch_cache.JSEARCH_CACHE_TTL.total_seconds()),
+            "this_worker": jsearch_cache.stats.snapshot(),
+            "shared": jsearch_cache.shared_stats(cur)
+        }), 200
+    except Exception as e:
+        print(f"❌ Error fetching JSearch cache stats: {e}")
+        traceback.print_exc()
+        return jsonify({"error": "An internal server error occurred."}), 500
     finally:
-        # This finally block is part of the new DB save try/except
-        # It's already handled above
-        pass
+        if cur: cur.close()
+        if conn: conn.close()
+
 
 @job_recs_bp.route('/job-history/latest', methods=['GET'])
 def get_latest_job_history():
@@ -390,7 +656,10 @@ def get_latest_job_history():
 # --- *** NEW ROUTE: Get All Job History *** ---
 @job_recs_bp.route('/job-history', methods=['GET'])
 def get_all_job_history():
-    """Fetches ALL job recommendation searches for the user."""
+    """
+    Fetches ALL job recommendation searches for the user, without their jobs:
+    each item has a job_count, and the jobs are loaded per item from /job-history/<id>/jobs.
+    """
     token = request.cookies.get("token")
     if not token: return jsonify({"error": "Authentication required."}), 401
     try:
@@ -405,9 +674,11 @@ def get_all_job_history():
         conn = get_db_connection()
         if not conn: return jsonify({"error": "Database connection failed."}), 500
         cur = conn.cursor(dictionary=True)
-        
+        job_history.ensure_history_tables(cur)
+
+        # job_count is NULL for legacy rows whose jobs are still in the blob (unknown until hydrated)
         cur.execute("""
-            SELECT id, base_queries, locations, recommendations, created_at
+            SELECT id, base_queries, locations, job_count, created_at
             FROM job_recommendation_history
             WHERE user_id = %s
             ORDER BY created_at DESC
@@ -419,14 +690,11 @@ def get_all_job_history():
         if not history_list:
             return jsonify({"history": []}), 200 # No history found
 
-        # Parse JSON and format dates
+        # Parse locations and format dates
         for item in history_list:
             try:
                 if item.get('locations'): item['locations'] = json.loads(item['locations'])
             except json.JSONDecodeError: item['locations'] = []
-            try:
-                if item.get('recommendations'): item['recommendations'] = json.loads(item['recommendations'])
-            except json.JSONDecodeError: item['recommendations'] = []
             
             if item.get('created_at'):
                 item['created_at'] = item['created_at'].strftime('%d %b %Y, %I:%M %p')
@@ -438,4 +706,50 @@ def get_all_job_history():
         return jsonify({"error": "An internal server error occurred."}), 500
     finally:
         if cur: cur.close()
-        if conn: conn.close()
\ No newline at end of file
+        if conn: conn.close()
+
+
+@job_recs_bp.route('/job-history/<int:history_id>/jobs', methods=['GET'])
+def get_job_history_jobs(history_id):
+    """Hydrates one history item: its jobs from the `jobs` table, in the original ranked order."""
+    token = request.cookies.get("token")
+    if not token: return jsonify({"error": "Authentication required."}), 401
+    try:
+        user_data = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
+        user_id = user_data["user_id"]
+    except (jwt.ExpiredSignatureError, jwt.InvalidTokenError):
+        return jsonify({"error": "Invalid or expired session."}), 401
+
+    conn = None
+    cur = None
+    try:
+        conn = get_db_connection()
+        if not conn: return jsonify({"error": "Database connection failed."}), 500
+        cur = conn.cursor(dictionary=True)
+        job_history.ensure_history_tables(cur)
+
+        cur.execute("""
+            SELECT id, recommendations FROM job_recommendation_history
+            WHERE id = %s AND user_id = %s
+        """, (history_id, user_id))
+        history_row = cur.fetchone()
+        if not history_row:
+            return jsonify({"error": "History item not found."}), 404
+
+        if history_row.get('recommendations') is not None:
+            # Legacy row: migrate its blob once, later reads use the references
+            jobs = job_history.normalize_legacy_row(cur, history_id, history_row['recommendations'])
+            conn.commit()
+            print(f"🗃️ Normalized legacy job history row {history_id} ({len(jobs)} jobs).")
+        else:
+            jobs = job_history.load_history_jobs(cur, history_id)
+
+        return jsonify({"history_id": history_id, "jobs": jobs}), 200
+    except Exception as e:
+        if conn: conn.rollback()
+        print(f"❌ Error hydrating job history {history_id}: {e}")
+        traceback.print_exc()
+        return jsonify({"error": "An internal server error occurred."}), 500
+    finally:
+        if cur: cur.close()
+        if conn: conn.close()
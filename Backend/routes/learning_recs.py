@@ -3,6 +3,7 @@ import jwt
 import json, traceback
 import re
 from db_config import get_db_connection
+from utils import profile_snapshot
 from config import SECRET_KEY
 from api_config import gemini_model
 from google.api_core.exceptions import ResourceExhausted
@@ -20,8 +21,6 @@ def _generate_and_save_recommendations(user_id, cur, conn):
     # Fetch user details to generate new recommendations
     cur.execute("SELECT degree, stream FROM user_details WHERE user_id = %s", (user_id,))
     details_row = cur.fetchone()
-    cur.execute("SELECT skills FROM extract_skills WHERE user_id = %s", (user_id,))
-    skills_row = cur.fetchone()
     
     resume_text = None
     cur.execute("SELECT extracted_text FROM extracted_resume_text WHERE user_id = %s", (user_id,))
@@ -35,25 +34,8 @@ def _generate_and_save_recommendations(user_id, cur, conn):
     known_degree = details_row.get('degree') if details_row else None
     known_stream = details_row.get('stream') if details_row else None
     
-    skills_list = []
-    skills_list = []
-    if skills_row and skills_row.get('skills'):
-        try:
-            skill_data = skills_row['skills']
-            if isinstance(skill_data, (bytes, bytearray)): skill_data = skill_data.decode('utf-8')
-            skills_list = json.loads(skill_data) if isinstance(skill_data, str) else skill_data
-            if not isinstance(skills_list, list): skills_list = []
-        except (json.JSONDecodeError, TypeError): 
-            skills_list = []
-    
-    if not skills_list and details_row and details_row.get('skills'):
-        try:
-            skill_data = details_row['skills']
-            if isinstance(skill_data, (bytes, bytearray)): skill_data = skill_data.decode('utf-8')
-            skills_list = json.loads(skill_data) if isinstance(skill_data, str) else skill_data
-            if not isinstance(skills_list, list): skills_list = []
-        except (json.JSONDecodeError, TypeError):
-            skills_list = []
+    # Manual + resume-extracted skills, merged in the profile snapshot
+    skills_list = profile_snapshot.get_snapshot(cur, user_id, conn)['skills']
 
     # Check if we have *any* data to work with
     if not known_degree and not known_stream and not resume_text:
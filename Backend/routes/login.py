@@ -12,6 +12,11 @@ try:
 except ImportError as e:
     print(f"⚠️ WARNING: Could not import clear_news_cache: {e}. Cache won't be cleared on logout.")
     clear_news_cache = None
+try:
+    from .news_feed import record_news_activity
+except ImportError as e:
+    print(f"⚠️ WARNING: Could not import record_news_activity: {e}. News feeds won't be prewarmed on login.")
+    record_news_activity = None
 
 login_bp = Blueprint("login", __name__)
 
@@ -84,6 +89,8 @@ def login():
         }))
         
         resp.set_cookie("token", token, httponly=True, max_age=7200, path="/", samesite='Lax')
+        if record_news_activity:
+            record_news_activity(user["id"], prewarm=True) # The background refresher warms their dashboard feed
         return resp
 
     except Exception as e:
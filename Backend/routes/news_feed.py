@@ -1,12 +1,15 @@
 # routes/news_feed.py
 from flask import Blueprint, request, jsonify
 import jwt
+import os
 import json
+import threading
 import requests
+import concurrent.futures
+from utils import http_client, profile_snapshot, cache, refresh_scheduler
 from db_config import get_db_connection
 from config import SECRET_KEY, NEWS_API_KEY
 import traceback
-from urllib.parse import quote_plus
 from datetime import datetime, timedelta # Import timedelta
 
 news_feed_bp = Blueprint('news_feed', __name__)
@@ -14,15 +17,235 @@ news_feed_bp = Blueprint('news_feed', __name__)
 # --- NewsAPI Configuration ---
 NEWS_API_ENDPOINT = "https://newsapi.org/v2/everything"
 MAX_ARTICLES = 4
+ARTICLES_PER_TOPIC = 10
+MAX_SKILL_TOPICS = 5
 # --- NEW: Cache Configuration ---
-news_feed_cache = {} # In-memory cache { user_id: {'data': [...], 'timestamp': datetime} }
-CACHE_DURATION = timedelta(hours=1) # Cache news feed for 1 hour
+CACHE_DURATION = timedelta(minutes=15) # A user's merged feed; rebuilding it from topic buckets is cheap
+# Shared by all workers (see utils/cache.py), so invalidation reaches every process: { str(user_id): [...] }
+news_feed_cache = cache.make_cache("news_feed", CACHE_DURATION)
+# One NewsAPI result per canonical topic, shared by every user with that topic: { topic: {"articles", "fetched_at"} }
+# Buckets older than TOPIC_FRESH_FOR are still served but refilled in the background.
+TOPIC_FRESH_FOR = timedelta(hours=1)
+TOPIC_KEEP_FOR = timedelta(hours=12)
+news_topic_cache = cache.make_cache("news_topics", TOPIC_KEEP_FOR)
+TOPIC_FETCH_WORKERS = 4
+FOREGROUND_MAX_FETCHES = 3 # NewsAPI calls one feed request may make; further missing topics are filled in the background
+# --- Background Refresh ---
+REFRESH_LEAD = timedelta(minutes=2) # Rebuild a user's feed this long before it expires
+ACTIVE_WINDOW = timedelta(hours=2) # Same as the login session length
+NEWS_API_DAILY_QUOTA = int(os.getenv("NEWS_API_DAILY_QUOTA", 100))
+BACKGROUND_QUOTA_SHARE = 0.5 # Background work stops once this share of the day's quota is used
+RATE_LIMIT_PAUSE = timedelta(minutes=30) # No background calls for this long after a 429
 # -----------------------------
 
+_refresh_executor = concurrent.futures.ThreadPoolExecutor(max_workers=2, thread_name_prefix="NewsTopicRefresh")
+_refreshing_topics = set()
+_refreshing_lock = threading.Lock()
+_rate_limited_until = None
+
+
+def canonical_topic(topic):
+    """'  Machine   Learning ' -> 'machine learning'"""
+    return " ".join(str(topic or "").split()).casefold()
+
+
+def _user_topics(cur, conn, user_id):
+    """Canonical topics for a user, strongest first: roadmap domains, profile domains, then top skills."""
+    topics = []
+    cur.execute("SELECT domain FROM roadmaps WHERE user_id = %s", (user_id,))
+    topics.extend(row['domain'] for row in cur.fetchall() if row.get('domain'))
+    profile = profile_snapshot.get_snapshot(cur, user_id, conn)
+    topics.extend(profile['domains'])
+    topics.extend(profile['skills'][:MAX_SKILL_TOPICS])
+    return list(dict.fromkeys(t for t in (canonical_topic(t) for t in topics) if t))
+
+
+def _fetch_topic(topic):
+    """
+    Calls NewsAPI for one topic and stores the bucket (empty results too).
+    Returns (articles, None) or (None, (status_code, error_detail)); errors are not cached.
+    """
+    global _rate_limited_until
+    headers = {'X-Api-Key': NEWS_API_KEY}
+    params = {'q': f'"{topic}"' if ' ' in topic else topic, 'language': 'en', 'sortBy': 'relevancy',
+              'pageSize': ARTICLES_PER_TOPIC}
+    refresh_scheduler.record_usage("newsapi")
+    try:
+        response = http_client.get("newsapi", NEWS_API_ENDPOINT, headers=headers, params=params)
+        response.raise_for_status()
+        news_api_data = response.json()
+    except requests.exceptions.Timeout:
+        print(f"❌ News API call timed out for topic '{topic}'")
+        return None, (408, "News feed service timed out.")
+    except requests.exceptions.RequestException as e:
+        print(f"❌ Error calling News API for topic '{topic}': {e}")
+        error_detail = str(e); status_code = 503
+        if e.response is not None:
+            status_code = e.response.status_code
+            try: error_detail = e.response.json().get('message', str(e.response.text))
+            except json.JSONDecodeError: error_detail = str(e.response.text)
+            if status_code == 401: error_detail = "Invalid News API Key."
+            if status_code == 429:
+                error_detail = "News API rate limit exceeded."
+                _rate_limited_until = datetime.now() + RATE_LIMIT_PAUSE
+        return None, (status_code, f"Could not fetch news: {error_detail}")
+
+    articles = []
+    if news_api_data.get('status') == 'ok':
+        for article in news_api_data.get('articles') or []:
+            if not article.get('description') or article.get('title') == '[Removed]': continue
+            articles.append({
+                "title": article.get('title', 'No Title'),
+                "link": article.get('url', '#'),
+                "summary": (article['description'][:150] + '...') if len(article['description']) > 153 else article['description'],
+                "published_at": article.get('publishedAt') or ""
+            })
+    news_topic_cache.set(topic, {"articles": articles, "fetched_at": datetime.now().isoformat()})
+    print(f"📰 Cached {len(articles)} articles for news topic '{topic}'.")
+    return articles, None
+
+
+def _background_budget():
+    """NewsAPI calls background work may still make today (0 while rate limited or if usage is unknown)."""
+    if _rate_limited_until and datetime.now() < _rate_limited_until:
+        return 0
+    used = refresh_scheduler.usage_today("newsapi")
+    if used is None:
+        return 0
+    return max(0, int(NEWS_API_DAILY_QUOTA * BACKGROUND_QUOTA_SHARE) - used)
+
+
+def _refresh_topic_in_background(topic):
+    with _refreshing_lock:
+        if topic in _refreshing_topics: return
+        _refreshing_topics.add(topic)
+
+    def refresh():
+        try:
+            _fetch_topic(topic)
+        except Exception as e:
+            print(f"⚠️ Background refresh of news topic '{topic}' failed: {e}")
+        finally:
+            with _refreshing_lock:
+                _refreshing_topics.discard(topic)
+
+    _refresh_executor.submit(refresh)
+
+
+def _topic_buckets(topics, refresh_stale=False, max_fetches=None):
+    """
+    {topic: articles} for the given topics. Missing buckets are fetched concurrently. Stale ones
+    are served and refilled in the background, or refetched inline when refresh_stale is set
+    (the stale copy stays as a fallback). max_fetches caps NewsAPI calls, missing topics first;
+    missing topics over the cap are queued for a background fetch instead.
+    Returns (buckets, first_error, deferred) where first_error is (status_code, detail) or None
+    and deferred is the number of missing topics left out of this result.
+    """
+    buckets, missing, stale_topics, background_topics = {}, [], [], []
+    now = datetime.now()
+    for topic in topics:
+        entry = news_topic_cache.get(topic)
+        if entry is None:
+            missing.append(topic)
+            continue
+        buckets[topic] = entry.get('articles') or []
+        try:
+            stale = now - datetime.fromisoformat(entry.get('fetched_at')) >= TOPIC_FRESH_FOR
+        except (TypeError, ValueError):
+            stale = True
+        if stale and refresh_stale: stale_topics.append(topic)
+        elif stale: background_topics.append(topic)
+    to_fetch = (missing + stale_topics)[:max_fetches]
+    deferred = [topic for topic in missing if topic not in to_fetch]
+    background_topics = deferred + background_topics
+    if background_topics:
+        budget = max(0, _background_budget() - len(to_fetch)) # This call's own fetches aren't counted yet
+        for topic in background_topics[:budget]: _refresh_topic_in_background(topic)
+
+    first_error = None
+    if to_fetch:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=min(TOPIC_FETCH_WORKERS, len(to_fetch))) as executor:
+            for topic, (articles, error) in zip(to_fetch, executor.map(_fetch_topic, to_fetch)):
+                if error: first_error = first_error or error
+                else: buckets[topic] = articles
+    print(f"📰 News topics: {len(topics) - len(missing)} cached, {len(to_fetch)} fetched, {len(deferred)} deferred.")
+    return buckets, first_error, len(deferred)
+
+
+def _merge_feed(topics, buckets):
+    """
+    Ranks the union of the user's topic buckets: articles matching more of the user's topics
+    first, then those from stronger topics (earlier in the list), then the most recent.
+    """
+    merged = {}
+    for rank, topic in enumerate(topics):
+        for article in buckets.get(topic, []):
+            entry = merged.setdefault(article['link'], {"article": article, "matches": 0, "best_rank": rank})
+            entry['matches'] += 1
+    ordered = sorted(merged.values(), key=lambda e: e['article'].get('published_at', ''), reverse=True)
+    ordered.sort(key=lambda e: (-e['matches'], e['best_rank'])) # Stable: recency breaks ties
+    return [{k: e['article'][k] for k in ("title", "link", "summary")} for e in ordered[:MAX_ARTICLES]]
+
+
+def _build_user_feed(user_id, background=False):
+    """
+    Builds and caches a user's merged feed. Returns (feed, message, error, cached) where error
+    is (status_code, detail) when there is nothing to show; a feed with failed topics isn't cached.
+    """
+    conn = get_db_connection()
+    if not conn:
+        return None, None, (500, "Database connection failed."), False
+    cur = conn.cursor(dictionary=True)
+    try:
+        topics = _user_topics(cur, conn, user_id)
+    finally:
+        cur.close()
+        conn.close() # Don't hold the connection while NewsAPI is called
+
+    if not topics:
+        # Cache the empty result so we don't keep hitting the DB/API
+        news_feed_cache.set(user_id, [])
+        print(f"No relevant topics found for User {user_id}. Caching empty result.")
+        return [], "No relevant topics found in your profile.", None, True
+
+    if background:
+        buckets, first_error, deferred = _topic_buckets(topics, refresh_stale=True, max_fetches=_background_budget())
+    else:
+        buckets, first_error, deferred = _topic_buckets(topics, max_fetches=FOREGROUND_MAX_FETCHES)
+    if not buckets and first_error:
+        # Nothing to show at all: surface the error and don't cache it
+        return None, None, first_error, False
+
+    formatted_feed = _merge_feed(topics, buckets)
+    if first_error or deferred:
+        # Partial feed: serve it, but don't pin it for the whole cache duration
+        return formatted_feed, None, None, False
+    news_feed_cache.set(user_id, formatted_feed)
+    print(f"📰 Cached {len(formatted_feed)} news items for user {user_id}.")
+    return formatted_feed, None if formatted_feed else "No relevant news found at this time.", None, True
+
+
+def _refresh_user_feed(user_id):
+    """Scheduler callback: rebuilds a feed shortly before it expires. Returns the next refresh time."""
+    if not NEWS_API_KEY:
+        return None
+    _, _, _, cached = _build_user_feed(user_id, background=True)
+    if not cached:
+        return None
+    print(f"🔁 Refreshed news feed for user {user_id} in the background.")
+    return datetime.now() + CACHE_DURATION - REFRESH_LEAD
+
+
+# The request that records a new user serves or builds their feed, so the first refresh waits a cache lifetime
+news_refresh_scheduler = refresh_scheduler.RefreshScheduler("news_feed", _refresh_user_feed, ACTIVE_WINDOW,
+                                                            first_refresh_after=CACHE_DURATION - REFRESH_LEAD)
+
+
 @news_feed_bp.route('/news-feed', methods=['GET'])
 def get_news_feed_via_api():
     """
-    Fetches user's news feed, using an in-memory cache with expiry.
+    Fetches user's news feed, merged from per-topic NewsAPI buckets shared across users,
+    with the merged result cached per user and kept warm in the background while they're active.
     """
     token = request.cookies.get("token")
     if not token:
@@ -34,133 +257,29 @@ def get_news_feed_via_api():
     except (jwt.ExpiredSignatureError, jwt.InvalidTokenError):
         return jsonify({"error": "Invalid or expired session."}), 401
 
-    # --- NEW: Check Cache ---
-    now = datetime.now()
-    if user_id in news_feed_cache:
-        cached_entry = news_feed_cache[user_id]
-        if now - cached_entry['timestamp'] < CACHE_DURATION:
-            print(f"✅ Returning cached news feed for User {user_id}")
-            return jsonify({"news_feed": cached_entry['data']}), 200
-        else:
-            print(f"ℹ️ Cache expired for User {user_id}. Fetching fresh news.")
-            # Remove expired entry
-            news_feed_cache.pop(user_id, None)
-    else:
-        print(f"ℹ️ No cache found for User {user_id}. Fetching fresh news.")
-    # --- END Cache Check ---
+    record_news_activity(user_id)
 
-    # --- Proceed with fetching if cache missed or expired ---
+    # --- NEW: Check Cache (expired entries are never returned) ---
+    cached_feed = news_feed_cache.get(user_id)
+    if cached_feed is not None:
+        print(f"✅ Returning cached news feed for User {user_id}")
+        return jsonify({"news_feed": cached_feed}), 200
+    print(f"ℹ️ No cache found for User {user_id}. Building news feed.")
+    # --- END Cache Check ---
 
     if not NEWS_API_KEY:
         print("❌ NEWS_API_KEY not configured. Cannot fetch news feed.")
         return jsonify({"news_feed": [], "message": "News feed service is not configured."}), 200
 
-    conn = None
-    cur = None
     try:
-        conn = get_db_connection()
-        if not conn:
-            return jsonify({"error": "Database connection failed."}), 500
-
-        cur = conn.cursor(dictionary=True)
-
-        # --- Fetch User Topics (Same as before) ---
-        topics = set()
-        # 1. Roadmap Domains
-        cur.execute("SELECT domain FROM roadmaps WHERE user_id = %s", (user_id,))
-        roadmap_rows = cur.fetchall()
-        for row in roadmap_rows: topics.add(row['domain'].strip()) if row.get('domain') else None
-        # 2. User Details (Skills & Domain)
-        cur.execute("SELECT skills, domain FROM user_details WHERE user_id = %s", (user_id,))
-        details_row = cur.fetchone()
-        skills_list = []
-        if details_row:
-            if details_row.get('domain'):
-                 try:
-                     domain_data = details_row['domain']
-                     if isinstance(domain_data, (bytes, bytearray)): domain_data = domain_data.decode('utf-8')
-                     domain_list = json.loads(domain_data) if isinstance(domain_data, str) else domain_data
-                     if isinstance(domain_list, list):
-                         for d in domain_list: topics.add(d.strip()) if d and isinstance(d, str) else None
-                 except (json.JSONDecodeError, TypeError): pass
-            if details_row.get('skills'):
-                 try:
-                     skill_data = details_row['skills']
-                     if isinstance(skill_data, (bytes, bytearray)): skill_data = skill_data.decode('utf-8')
-                     loaded = json.loads(skill_data) if isinstance(skill_data, str) else skill_data
-                     if isinstance(loaded, list): skills_list.extend([str(s).strip() for s in loaded if s and str(s).strip()])
-                 except (json.JSONDecodeError, TypeError): pass
-        # 3. Extracted Skills
-        cur.execute("SELECT skills FROM extract_skills WHERE user_id = %s", (user_id,))
-        extracted_row = cur.fetchone()
-        if extracted_row and extracted_row.get('skills'):
-            try:
-                skill_data = extracted_row['skills']
-                if isinstance(skill_data, (bytes, bytearray)): skill_data = skill_data.decode('utf-8')
-                loaded = json.loads(skill_data) if isinstance(skill_data, str) else skill_data
-                if isinstance(loaded, list): skills_list = [str(s).strip() for s in loaded if s and str(s).strip()]
-            except (json.JSONDecodeError, TypeError): pass
-        # Add top skills
-        for skill in skills_list[:5]: topics.add(skill)
-        # --- End Fetch User Topics ---
-
-        if not topics:
-            # Cache the empty result so we don't keep hitting the DB/API
-            news_feed_cache[user_id] = {'data': [], 'timestamp': now}
-            print(f"No relevant topics found for User {user_id}. Caching empty result.")
-            return jsonify({"news_feed": [], "message": "No relevant topics found in your profile."}), 200
-
-        # --- Construct News API Query (Same as before) ---
-        query_terms = sorted(list(topics), key=len, reverse=True)
-        search_query = " OR ".join([f'"{term}"' if ' ' in term else term for term in query_terms])
-        print(f"Constructed News API query for User {user_id}: {search_query}")
-
-        # --- Call News API (Same as before) ---
-        headers = {'X-Api-Key': NEWS_API_KEY}
-        params = { 'q': search_query, 'language': 'en', 'sortBy': 'relevancy', 'pageSize': 10 }
-        api_response_data = None # To store successful response data
-        try:
-            response = requests.get(NEWS_API_ENDPOINT, headers=headers, params=params, timeout=15)
-            response.raise_for_status()
-            news_api_data = response.json()
-        except requests.exceptions.Timeout:
-            print(f"❌ News API call timed out for user {user_id}")
-            # Don't cache errors, just return error response
-            return jsonify({"error": "News feed service timed out."}), 408
-        except requests.exceptions.RequestException as e:
-            print(f"❌ Error calling News API for user {user_id}: {e}")
-            error_detail = str(e); status_code = 503
-            if e.response is not None:
-                status_code = e.response.status_code
-                try: error_detail = e.response.json().get('message', str(e.response.text))
-                except json.JSONDecodeError: error_detail = str(e.response.text)
-                if status_code == 401: error_detail = "Invalid News API Key."
-                if status_code == 429: error_detail = "News API rate limit exceeded."
-            # Don't cache errors
-            return jsonify({"error": f"Could not fetch news: {error_detail}"}), status_code
-
-        # --- Process and Format Results (Same as before) ---
-        if news_api_data.get('status') != 'ok' or not news_api_data.get('articles'):
-            print(f"News API returned status '{news_api_data.get('status')}' or no articles for user {user_id}.")
-            # Cache the empty result
-            news_feed_cache[user_id] = {'data': [], 'timestamp': now}
-            return jsonify({"news_feed": [], "message": "No relevant news found at this time."}), 200
-
-        formatted_feed = []
-        for article in news_api_data['articles']:
-            if not article.get('description') or article.get('title') == '[Removed]': continue
-            formatted_feed.append({
-                "title": article.get('title', 'No Title'),
-                "link": article.get('url', '#'),
-                "summary": (article['description'][:150] + '...') if len(article['description']) > 153 else article['description']
-            })
-            if len(formatted_feed) >= MAX_ARTICLES: break
-
-        # --- NEW: Store successful result in cache ---
-        news_feed_cache[user_id] = {'data': formatted_feed, 'timestamp': now}
-        print(f"📰 Cached {len(formatted_feed)} news items for user {user_id}.")
-        # ---------------------------------------------
-
+        formatted_feed, message, error, cached = _build_user_feed(user_id)
+        if error:
+            status_code, error_detail = error
+            return jsonify({"error": error_detail}), status_code
+        if cached:
+            news_refresh_scheduler.schedule(user_id, datetime.now() + CACHE_DURATION - REFRESH_LEAD)
+        if message:
+            return jsonify({"news_feed": formatted_feed, "message": message}), 200
         return jsonify({"news_feed": formatted_feed}), 200
 
     except Exception as e:
@@ -168,13 +287,18 @@ def get_news_feed_via_api():
         traceback.print_exc()
         # Don't cache unexpected errors
         return jsonify({"error": "An internal server error occurred fetching news feed."}), 500
-    finally:
-        if cur: cur.close()
-        if conn: conn.close()
+
+
+def record_news_activity(user_id, prewarm=False):
+    """
+    Marks the user as active so their feed is refreshed before it expires (login, dashboard reads).
+    With prewarm (login), a new user without a cached feed is due on the next scheduler tick.
+    """
+    first_refresh_after = timedelta(0) if prewarm and news_feed_cache.get(user_id) is None else None
+    news_refresh_scheduler.record_activity(user_id, first_refresh_after)
 
 # --- NEW: Function to clear cache for a user ---
 def clear_news_cache(user_id):
-    """Removes a user's news feed from the in-memory cache."""
-    if user_id in news_feed_cache:
-        del news_feed_cache[user_id]
-        print(f"Cleared news feed cache for user_id: {user_id}")
\ No newline at end of file
+    """Removes a user's news feed from the shared cache (for every worker)."""
+    if news_feed_cache.delete(user_id):
+        print(f"Cleared news feed cache for user_id: {user_id}")
@@ -4,10 +4,12 @@ import jwt
 import json
 import re
 import requests # To call Judge0 API
+from utils import judge0, cache, code_runner, practice_grader
 from db_config import get_db_connection
 from config import SECRET_KEY
 from api_config import gemini_model
 import traceback
+import time
 from datetime import datetime, timedelta
 import hashlib
 
@@ -25,8 +27,38 @@ except ImportError:
 
 practice_bp = Blueprint('practice', __name__)
 
-JUDGE0_API_URL = "https://ce.judge0.com"
 QUESTION_CACHE_VALIDITY = timedelta(days=2) # Cache questions for 2 days
+RUN_INLINE_WAIT = 3 # Seconds /practice/run polls before handing the token back to the browser
+RUN_TOKEN_TTL = timedelta(minutes=10)
+# Judge0 runs keep executing after the request returns their token, so a user's unfinished runs
+# count against this limit until they finish or their token expires
+MAX_PENDING_RUNS_PER_USER = judge0.MAX_ACTIVE_PER_USER
+
+AI_RESULT_TTL = timedelta(days=7)
+AI_RESULT_MAX_ENTRIES = 1024
+
+# Owner (and result cache key) of each pending run token, so a user can only poll their own submissions
+run_token_owners = cache.make_cache("practice_run_tokens", RUN_TOKEN_TTL)
+# Each user's unfinished Judge0 runs: { str(user_id): {token: submitted_at (epoch seconds)} }
+pending_runs = cache.make_cache("practice_pending_runs", RUN_TOKEN_TTL)
+# Submit analyses and explanations for identical (question, code) pairs, so repeated clicks cost no AI quota
+practice_ai_cache = cache.make_cache("practice_ai", AI_RESULT_TTL, max_entries=AI_RESULT_MAX_ENTRIES)
+
+def _question_identifier(skill, difficulty):
+    identifier_string = f"{skill.strip().lower()}::{difficulty.strip().lower()}"
+    return identifier_string, hashlib.sha256(identifier_string.encode('utf-8')).hexdigest()
+
+
+def _question_key(question):
+    """Stable id for a generated question (questions have no row id on the client)."""
+    raw = json.dumps([question.get('title'), question.get('description')])
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()[:32]
+
+
+def _public_question(question_data):
+    """The question as sent to the browser: hidden tests stay on the server."""
+    return {k: v for k, v in question_data.items() if k != "hidden_tests"}
+
 
 # --- /practice/question route (with Caching) ---
 @practice_bp.route('/practice/question', methods=['POST'])
@@ -51,8 +83,7 @@ def get_practice_question():
     if not skill or not difficulty:
         return jsonify({"error": "Skill and difficulty are required."}), 400
 
-    identifier_string = f"{skill.strip().lower()}::{difficulty.strip().lower()}"
-    question_identifier = hashlib.sha256(identifier_string.encode('utf-8')).hexdigest()
+    identifier_string, question_identifier = _question_identifier(skill, difficulty)
 
     conn = None
     cur = None
@@ -80,7 +111,7 @@ def get_practice_question():
                      print(f"✅ Returning cached practice question (ID: {cached_question['id']}) for: {identifier_string}")
                      cur.execute("UPDATE generated_practice_questions SET last_used_at = %s WHERE id = %s", (now, cached_question['id']))
                      conn.commit()
-                     return jsonify(question_data), 200
+                     return jsonify(_public_question(question_data)), 200
             except (json.JSONDecodeError, TypeError):
                  print(f"⚠️ Found cached question but failed to parse JSON. Regenerating.")
         else:
@@ -109,9 +140,13 @@ def get_practice_question():
             prompt = f"""
             You are an expert programming instructor. Generate ONE coding question
             suitable for practicing the skill '{skill}' at a '{difficulty}' difficulty level.
+            The program must read its input from standard input and print its answer to standard output.
             Your response MUST be a valid JSON object with keys:
             "title", "description", "examples" (list of {{"input": "...", "output": "..."}}),
+            "hidden_tests" (list of 3 to 5 more {{"input": "...", "output": "..."}} covering edge cases),
             "constraints" (string, can be empty), "default_stdin" (string, can be empty).
+            In "examples" and "hidden_tests", "input" is the EXACT text given on stdin and "output" is the
+            EXACT text a correct program prints, so answers can be checked automatically.
             Generate the JSON object now. Do NOT include ```json markdown.
             """
 
@@ -132,6 +167,7 @@ def get_practice_question():
                      raise ValueError("Code AI response missing required keys.")
                 question_data.setdefault("constraints", "")
                 question_data.setdefault("default_stdin", "")
+                question_data["test_format"] = practice_grader.TEST_FORMAT
 
         except ResourceExhausted as rate_limit_error:
             print(f"❌ RATE LIMIT HIT for Gemini API: {rate_limit_error}")
@@ -170,7 +206,7 @@ def get_practice_question():
             conn.rollback()
             print(f"⚠️ WARNING: Failed to save generated question to cache: {db_error}")
         
-        return jsonify(question_data), 200
+        return jsonify(_public_question(question_data)), 200
 
     except Exception as e:
         print(f"❌ Unexpected error in get_practice_question: {e}")
@@ -182,12 +218,51 @@ def get_practice_question():
 
 
 # --- /practice/run route ---
+def _format_run_result(result):
+    return {
+        "stdout": result.get("stdout"),
+        "stderr": result.get("stderr"),
+        "compile_output": result.get("compile_output"),
+        "message": result.get("message"),
+        "status": (result.get("status") or {}).get("description", "Unknown Status"),
+        "time": result.get("time"),
+        "memory": result.get("memory")
+    }
+
+
+def _pending_run(token):
+    return {"token": token, "pending": True, "status": "Processing"}
+
+
+def _live_pending_runs(user_id):
+    """The user's Judge0 runs still executing; expired tokens and finished runs are dropped."""
+    cutoff = time.time() - RUN_TOKEN_TTL.total_seconds()
+    pending = {t: at for t, at in (pending_runs.get(user_id) or {}).items() if at > cutoff}
+    if pending:
+        finished = {t for t, result in judge0.fetch_results(pending).items() if judge0.is_finished(result)}
+        pending = {t: at for t, at in pending.items() if t not in finished}
+    return pending
+
+
+def _save_pending_runs(user_id, pending):
+    if pending: pending_runs.set(user_id, pending)
+    else: pending_runs.delete(user_id)
+
+
 @practice_bp.route('/practice/run', methods=['POST'])
 def run_practice_code():
+    """
+    Runs the code locally when CODE_RUNNER_BACKEND=local supports the language. Otherwise it
+    is submitted to Judge0 without waiting (wait=false) and polled briefly: runs that finish
+    within RUN_INLINE_WAIT return their result, slower ones return 202 with a token for
+    GET /practice/run/<token>, so no request thread sits on a long execution. A user with
+    MAX_PENDING_RUNS_PER_USER runs still executing on Judge0 gets 429 until one finishes.
+    """
     token = request.cookies.get("token")
     if not token: return jsonify({"error": "Authentication required."}), 401
     try:
-        jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
+        data = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
+        user_id = data["user_id"]
     except (jwt.ExpiredSignatureError, jwt.InvalidTokenError):
         return jsonify({"error": "Invalid or expired session."}), 401
     
@@ -202,31 +277,49 @@ def run_practice_code():
 
     language_id = get_language_id(language)
     
-    if not language_id:
+    run_locally = code_runner.runs_locally(language)
+    if not language_id and not run_locally:
         return jsonify({"error": f"Unsupported language for practice: '{language}'."}), 400
 
-    print(f"Running code via Judge0 - Lang: {language} (ID: {language_id})")
-    judge0_payload = {"language_id": language_id, "source_code": source_code, "stdin": stdin_input}
+    result_key = code_runner.result_key(language, source_code, stdin_input)
+    cached = code_runner.cached_result(result_key)
+    if cached:
+        print(f"✅ Returning cached run result for user {user_id}")
+        return jsonify({**_format_run_result(cached), "cached": True}), 200
 
     try:
-        submission_url = f"{JUDGE0_API_URL}/submissions?base64_encoded=false&wait=true"
-        headers = { "Content-Type": "application/json" }
-        response = requests.post(submission_url, headers=headers, json=judge0_payload, timeout=20)
-        response.raise_for_status()
-        result = response.json()
-        print(f"Judge0 Run Result: Status: {result.get('status', {}).get('description', 'N/A')}")
-        
-        return jsonify({
-            "stdout": result.get("stdout"),
-            "stderr": result.get("stderr"),
-            "compile_output": result.get("compile_output"),
-            "message": result.get("message"),
-            "status": result.get("status", {}).get("description", "Unknown Status"),
-            "time": result.get("time"), 
-            "memory": result.get("memory")
-        }), 200
-        
-    except requests.exceptions.RequestException as e:
+        with judge0.execution_queue.slot(user_id):
+            result = None
+            if run_locally:
+                print(f"Running code locally - Lang: {language}")
+                result = code_runner.run_local(language, source_code, stdin_input)
+            if result is None:
+                if not language_id:
+                    return jsonify({"error": "Could not execute code."}), 503
+                pending = _live_pending_runs(user_id)
+                if len(pending) >= MAX_PENDING_RUNS_PER_USER:
+                    _save_pending_runs(user_id, pending)
+                    return jsonify({"error": "Your previous runs are still executing. Please wait for them to finish."}), 429
+                print(f"Running code via Judge0 - Lang: {language} (ID: {language_id})")
+                submission_token = judge0.submit(language_id, source_code, stdin_input)
+                result = judge0.poll([submission_token], max_wait=RUN_INLINE_WAIT).get(submission_token)
+
+        if not result:
+            run_token_owners.set(submission_token, {"user_id": user_id, "result_key": result_key})
+            pending[submission_token] = time.time()
+            _save_pending_runs(user_id, pending)
+            print(f"⏳ Judge0 run {submission_token} still running, client will poll.")
+            return jsonify(_pending_run(submission_token)), 202
+
+        code_runner.store_result(result_key, result)
+        print(f"Run Result: Status: {result.get('status', {}).get('description', 'N/A')}")
+        return jsonify(_format_run_result(result)), 200
+
+    except judge0.QueueFullError:
+        return jsonify({"error": "Too many code runs in progress. Please try again in a moment."}), 429
+    except judge0.QueueTimeoutError:
+        return jsonify({"error": "Code runner is busy. Please try again in a moment."}), 503
+    except (requests.exceptions.RequestException, ValueError) as e:
         print(f"❌ Error calling Judge0 API during Run: {e}")
         return jsonify({"error": f"Could not execute code via Judge0."}), 503
     except Exception as e:
@@ -235,6 +328,97 @@ def run_practice_code():
        return jsonify({"error": "An unexpected error occurred during code execution."}), 500
 
 
+@practice_bp.route('/practice/run/<submission_token>', methods=['GET'])
+def get_practice_run_result(submission_token):
+    """One non-blocking status check for a run that outlived RUN_INLINE_WAIT."""
+    token = request.cookies.get("token")
+    if not token: return jsonify({"error": "Authentication required."}), 401
+    try:
+        data = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
+        user_id = data["user_id"]
+    except (jwt.ExpiredSignatureError, jwt.InvalidTokenError):
+        return jsonify({"error": "Invalid or expired session."}), 401
+
+    owner = run_token_owners.get(submission_token)
+    if not isinstance(owner, dict) or owner.get("user_id") != user_id:
+        return jsonify({"error": "Run not found or expired."}), 404
+
+    result = judge0.fetch_results([submission_token]).get(submission_token)
+    if not judge0.is_finished(result):
+        return jsonify(_pending_run(submission_token)), 202
+    run_token_owners.delete(submission_token)
+    pending = pending_runs.get(user_id) or {}
+    if pending.pop(submission_token, None) is not None:
+        _save_pending_runs(user_id, pending)
+    code_runner.store_result(owner.get("result_key"), result)
+    return jsonify(_format_run_result(result)), 200
+
+
+def _load_stored_question(skill, difficulty, question):
+    """Server-side copy of the submitted question (with hidden tests), or None if it has been replaced."""
+    conn = get_db_connection()
+    if not conn: return None
+    cur = conn.cursor(dictionary=True)
+    try:
+        cur.execute("SELECT question_data FROM generated_practice_questions WHERE question_identifier = %s LIMIT 1",
+                    (_question_identifier(skill, difficulty)[1],))
+        row = cur.fetchone()
+        stored = json.loads(row['question_data']) if row and row.get('question_data') else None
+        if isinstance(stored, dict) and stored.get('title') == question.get('title'):
+            return stored
+        return None
+    except (json.JSONDecodeError, TypeError):
+        return None
+    finally:
+        cur.close()
+        conn.close()
+
+
+def _feedback_for_graded_submission(question, difficulty, skill, language, source_code, grading, user_id):
+    """
+    Tests already decided correctness, so the AI is only asked for qualitative feedback and
+    the efficiency / readability / robustness scores. Any AI failure keeps the test verdict.
+    """
+    prompt = f"""
+    You are an expert programming reviewer. The user's code has already been run against the test cases.
+    Problem Title: {question.get('title', 'N/A')}
+    Problem Difficulty: {difficulty}
+    Target Skill: {skill}
+    Problem Description: {question.get('description', 'N/A')}
+    Test Results:
+    {practice_grader.summarize_for_prompt(grading)}
+    User's Code ({language}):
+    ```
+    {source_code}
+    ```
+    Your Task: Do NOT re-judge correctness. Explain why failing tests fail (if any) and review the code quality.
+    Response Format: Your response MUST be a valid JSON object with keys:
+    * `summary_feedback`: (String) 2-3 sentences.
+    * `scores`: (Object) with keys: `efficiency`, `readability`, `robustness` (scores 1-10).
+
+    Generate the JSON object now. Do NOT include ```json markdown.
+    """
+    cleaned_response_text = ""
+    try:
+        print(f"⏳ Calling Gemini API for feedback on graded practice submission for user {user_id}")
+        response = gemini_model.generate_content(prompt)
+        cleaned_response_text = re.sub(r'^```(json)?\s*|\s*```$', '', response.text, flags=re.MULTILINE | re.DOTALL).strip()
+        feedback = json.loads(cleaned_response_text)
+        scores = feedback.get("scores") if isinstance(feedback, dict) else None
+        if not (isinstance(scores, dict) and feedback.get("summary_feedback")
+                and all(k in scores for k in ("efficiency", "readability", "robustness"))):
+            raise ValueError("AI feedback response missing summary_feedback or scores.")
+        return practice_grader.analysis_from_tests(grading, feedback["summary_feedback"], scores)
+    except ResourceExhausted as rate_limit_error:
+        print(f"⚠️ RATE LIMIT HIT for Gemini API (Feedback), returning test results only: {rate_limit_error}")
+    except (json.JSONDecodeError, ValueError) as json_error:
+        print(f"⚠️ Invalid AI feedback for user {user_id}, returning test results only: {json_error}")
+        print(f"--- Raw AI Feedback Response ---:\n{cleaned_response_text}\n---")
+    except Exception as e:
+        print(f"⚠️ AI feedback failed for user {user_id}, returning test results only: {e}")
+    return practice_grader.analysis_from_tests(grading)
+
+
 # --- *** MODIFIED: /practice/submit route *** ---
 @practice_bp.route('/practice/submit', methods=['POST'])
 def submit_practice_code():
@@ -255,113 +439,150 @@ def submit_practice_code():
     question = req_data.get('question')
     difficulty = req_data.get('difficulty')
     skill = req_data.get('skill')
+    skip_ai_feedback = bool(req_data.get('skip_ai_feedback')) # Only honoured when every test passes
 
     if not all([language, source_code, question, difficulty, skill, user_id]):
         return jsonify({"error": "Missing required data."}), 400
-    if not gemini_model: return jsonify({"error": "AI Model is not available."}), 503
+
+    is_sql = "sql" in skill.lower() or "mysql" in skill.lower()
+    analysis_cache_key = (f"analysis:{_question_key(question)}:{code_runner.source_hash(language, source_code)}"
+                          f":{int(skip_ai_feedback)}")
+    cached_analysis = practice_ai_cache.get(analysis_cache_key)
+
+    # --- 1. Run the code against the question's tests (decides correctness) ---
+    grading = None
+    if not is_sql and not cached_analysis:
+        try:
+            tests = practice_grader.collect_tests(_load_stored_question(skill, difficulty, question))
+            grading = practice_grader.grade(language, get_language_id(language), source_code, tests, user_id)
+        except (judge0.QueueFullError, judge0.QueueTimeoutError) as queue_error:
+            print(f"⚠️ Skipping test grading for user {user_id}: {queue_error}")
+        except Exception as e:
+            print(f"❌ Test grading failed for user {user_id}, falling back to AI grading: {e}")
+            traceback.print_exc()
+    if grading:
+        print(f"✅ Practice tests for user {user_id}: {grading['passed']}/{grading['total']} passed")
+
+    if not cached_analysis and not grading and not gemini_model:
+        return jsonify({"error": "AI Model is not available."}), 503
 
     conn = None
     cur = None
     analysis_data = {} # Define analysis_data in the outer scope
     cleaned_response_text = "" # Define cleaned_response_text in the outer scope
     
+    cache_analysis = True # Only complete analyses are cached, not ones degraded by an AI outage
     try:
-        # --- 1. Get AI Analysis (With SQL-aware prompt) ---
-        is_sql = "sql" in skill.lower() or "mysql" in skill.lower()
-
-        if is_sql:
-            prompt = f"""
-            You are an expert SQL judge. Analyze the user's query based on the problem and schema.
-            Problem Title: {question.get('title', 'N/A')}
-            Problem Description: {question.get('description', 'N/A')}
-            Schema Setup Script (to create tables):
-            ```sql
-            {question.get('setup_script', 'N/A')}
-            ```
-            Correct Solution Query:
-            ```sql
-            {question.get('solution_query', 'N/A')}
-            ```
-            User's SQL Query:
-            ```sql
-            {source_code}
-            ```
-            Your Task: Provide analysis and numerical scores.
-            Response Format: Your response MUST be a valid JSON object with keys:
-            * `overall_status`: (String) e.g., "Correct", "Incorrect", "Partially Correct".
-            * `summary_feedback`: (String) 2-3 sentences.
-            * `scores`: (Object) with keys: `correctness` (1-10), `efficiency` (1-10), `readability` (1-10), `robustness` (1-10).
-            
-            Generate the JSON object now. Do NOT include ```json markdown.
-            """
+        if cached_analysis:
+            print(f"✅ Returning cached practice analysis for user {user_id}")
+            analysis_data = cached_analysis
+            cache_analysis = False
+        elif grading and skip_ai_feedback and grading['all_passed']:
+            analysis_data = practice_grader.analysis_from_tests(grading)
+        elif grading and not gemini_model:
+            analysis_data = practice_grader.analysis_from_tests(grading)
+            cache_analysis = False
+        elif grading:
+            analysis_data = _feedback_for_graded_submission(question, difficulty, skill, language, source_code, grading, user_id)
+            cache_analysis = analysis_data["ai_feedback"]
         else:
-            prompt = f"""
-            You are an expert programming judge. Analyze the user's code based on the problem.
-            Problem Title: {question.get('title', 'N/A')}
-            Problem Difficulty: {difficulty}
-            Target Skill: {skill}
-            Problem Description: {question.get('description', 'N/A')}
-            User's Code ({language}):
-            ```
-            {source_code}
-            ```
-            Your Task: Provide analysis and numerical scores.
-            Response Format: Your response MUST be a valid JSON object with keys:
-            * `overall_status`: (String) e.g., "Likely Correct", "Potential Issues Found".
-            * `summary_feedback`: (String) 2-3 sentences.
-            * `scores`: (Object) with keys: `correctness`, `efficiency`, `readability`, `robustness` (scores 1-10).
+            # --- 1b. No runnable tests: the AI judges correctness too (With SQL-aware prompt) ---
+            if is_sql:
+                prompt = f"""
+                You are an expert SQL judge. Analyze the user's query based on the problem and schema.
+                Problem Title: {question.get('title', 'N/A')}
+                Problem Description: {question.get('description', 'N/A')}
+                Schema Setup Script (to create tables):
+                ```sql
+                {question.get('setup_script', 'N/A')}
+                ```
+                Correct Solution Query:
+                ```sql
+                {question.get('solution_query', 'N/A')}
+                ```
+                User's SQL Query:
+                ```sql
+                {source_code}
+                ```
+                Your Task: Provide analysis and numerical scores.
+                Response Format: Your response MUST be a valid JSON object with keys:
+                * `overall_status`: (String) e.g., "Correct", "Incorrect", "Partially Correct".
+                * `summary_feedback`: (String) 2-3 sentences.
+                * `scores`: (Object) with keys: `correctness` (1-10), `efficiency` (1-10), `readability` (1-10), `robustness` (1-10).
             
-            Generate the JSON object now. Do NOT include ```json markdown.
-            """
+                Generate the JSON object now. Do NOT include ```json markdown.
+                """
+            else:
+                prompt = f"""
+                You are an expert programming judge. Analyze the user's code based on the problem.
+                Problem Title: {question.get('title', 'N/A')}
+                Problem Difficulty: {difficulty}
+                Target Skill: {skill}
+                Problem Description: {question.get('description', 'N/A')}
+                User's Code ({language}):
+                ```
+                {source_code}
+                ```
+                Your Task: Provide analysis and numerical scores.
+                Response Format: Your response MUST be a valid JSON object with keys:
+                * `overall_status`: (String) e.g., "Likely Correct", "Potential Issues Found".
+                * `summary_feedback`: (String) 2-3 sentences.
+                * `scores`: (Object) with keys: `correctness`, `efficiency`, `readability`, `robustness` (scores 1-10).
+            
+                Generate the JSON object now. Do NOT include ```json markdown.
+                """
         
-        try:
-            print(f"⏳ Calling Gemini API to *analyze* practice submission for user {user_id}")
-            response = gemini_model.generate_content(prompt)
-            cleaned_response_text = re.sub(r'^```(json)?\s*|\s*```$', '', response.text, flags=re.MULTILINE | re.DOTALL).strip()
+            try:
+                print(f"⏳ Calling Gemini API to *analyze* practice submission for user {user_id}")
+                response = gemini_model.generate_content(prompt)
+                cleaned_response_text = re.sub(r'^```(json)?\s*|\s*```$', '', response.text, flags=re.MULTILINE | re.DOTALL).strip()
             
-            analysis_data = json.loads(cleaned_response_text)
+                analysis_data = json.loads(cleaned_response_text)
             
-            # --- *** THIS IS THE FIX *** ---
-            # We must validate that the AI response contains ALL the keys we need
-            # before we try to use them or send them to the frontend.
+                # --- *** THIS IS THE FIX *** ---
+                # We must validate that the AI response contains ALL the keys we need
+                # before we try to use them or send them to the frontend.
             
-            # 1. Check for top-level keys
-            if not ("overall_status" in analysis_data and 
-                    "summary_feedback" in analysis_data and 
-                    "scores" in analysis_data):
-                print(f"❌ AI analysis response missing top-level keys. Data: {analysis_data}")
-                raise ValueError("AI analysis response missing required keys (overall_status, summary_feedback, or scores).")
-
-            # 2. Check for nested score keys
-            scores_obj = analysis_data.get("scores")
-            if not (isinstance(scores_obj, dict) and 
-                    "correctness" in scores_obj and 
-                    "efficiency" in scores_obj and 
-                    "readability" in scores_obj and 
-                    "robustness" in scores_obj):
-                print(f"❌ AI analysis 'scores' object is malformed. Data: {scores_obj}")
-                # We can try to recover by adding dummy scores
-                analysis_data["scores"] = {
-                    "correctness": 0, "efficiency": 0, "readability": 0, "robustness": 0
-                }
-                analysis_data["summary_feedback"] = f"AI Warning: Could not generate scores. {analysis_data.get('summary_feedback', '')}"
-                # But it's safer to just raise the error
-                raise ValueError("AI analysis 'scores' object is missing required nested keys.")
-            # --- *** END FIX *** ---
-
-        except ResourceExhausted as rate_limit_error:
-            print(f"❌ RATE LIMIT HIT for Gemini API (Analysis): {rate_limit_error}")
-            return jsonify({"error": "AI Analyzer is busy, please try submitting again in a moment."}), 429
-        except (json.JSONDecodeError, ValueError) as json_error:
-            # This block will now catch our new ValueError
-            print(f"❌ Error parsing or validating AI analysis response for user {user_id}: {json_error}")
-            print(f"--- Raw AI Analysis Response ---:\n{cleaned_response_text}\n---")
-            return jsonify({"error": "AI generated an invalid analysis format."}), 500
-        except Exception as e:
-            print(f"❌ Error during AI analysis call for user {user_id}: {e}")
-            traceback.print_exc()
-            return jsonify({"error": "An unexpected error occurred during AI analysis."}), 500
+                # 1. Check for top-level keys
+                if not ("overall_status" in analysis_data and 
+                        "summary_feedback" in analysis_data and 
+                        "scores" in analysis_data):
+                    print(f"❌ AI analysis response missing top-level keys. Data: {analysis_data}")
+                    raise ValueError("AI analysis response missing required keys (overall_status, summary_feedback, or scores).")
+
+                # 2. Check for nested score keys
+                scores_obj = analysis_data.get("scores")
+                if not (isinstance(scores_obj, dict) and 
+                        "correctness" in scores_obj and 
+                        "efficiency" in scores_obj and 
+                        "readability" in scores_obj and 
+                        "robustness" in scores_obj):
+                    print(f"❌ AI analysis 'scores' object is malformed. Data: {scores_obj}")
+                    # We can try to recover by adding dummy scores
+                    analysis_data["scores"] = {
+                        "correctness": 0, "efficiency": 0, "readability": 0, "robustness": 0
+                    }
+                    analysis_data["summary_feedback"] = f"AI Warning: Could not generate scores. {analysis_data.get('summary_feedback', '')}"
+                    # But it's safer to just raise the error
+                    raise ValueError("AI analysis 'scores' object is missing required nested keys.")
+                # --- *** END FIX *** ---
+
+            except ResourceExhausted as rate_limit_error:
+                print(f"❌ RATE LIMIT HIT for Gemini API (Analysis): {rate_limit_error}")
+                return jsonify({"error": "AI Analyzer is busy, please try submitting again in a moment."}), 429
+            except (json.JSONDecodeError, ValueError) as json_error:
+                # This block will now catch our new ValueError
+                print(f"❌ Error parsing or validating AI analysis response for user {user_id}: {json_error}")
+                print(f"--- Raw AI Analysis Response ---:\n{cleaned_response_text}\n---")
+                return jsonify({"error": "AI generated an invalid analysis format."}), 500
+            except Exception as e:
+                print(f"❌ Error during AI analysis call for user {user_id}: {e}")
+                traceback.print_exc()
+                return jsonify({"error": "An unexpected error occurred during AI analysis."}), 500
         
+        if cache_analysis:
+            practice_ai_cache.set(analysis_cache_key, analysis_data)
+
         # 2. Save attempt to practice_history table
         conn = get_db_connection()
         if not conn: return jsonify({"error": "Database connection failed."}), 500
@@ -415,6 +636,14 @@ def explain_practice_feedback():
     if not user_code or not summary_feedback:
         return jsonify({"error": "user_code and summary_feedback are required."}), 400
 
+    # The feedback already identifies the question, so (code, feedback) keys the explanation
+    feedback_hash = hashlib.sha256(summary_feedback.strip().encode('utf-8')).hexdigest()
+    explain_cache_key = f"explain:{code_runner.source_hash('', user_code)}:{feedback_hash}"
+    cached_explanation = practice_ai_cache.get(explain_cache_key)
+    if cached_explanation:
+        print(f"✅ Returning cached practice explanation.")
+        return jsonify({"explanation": cached_explanation}), 200
+
     if not gemini_model: 
         return jsonify({"error": "AI Model is not available."}), 503
 
@@ -449,6 +678,8 @@ def explain_practice_feedback():
         print(f"⏳ Calling Gemini API to *explain* practice feedback.")
         response = gemini_model.generate_content(prompt)
         explanation_text = response.text.strip()
+        if explanation_text:
+            practice_ai_cache.set(explain_cache_key, explanation_text)
         
         return jsonify({"explanation": explanation_text}), 200
 
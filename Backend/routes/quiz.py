@@ -13,6 +13,15 @@ import hashlib # Import hashlib for creating identifiers
 # Import specific Google API error
 from google.api_core.exceptions import ResourceExhausted
 
+# --- Judge0 helpers for grading coding answers ---
+try:
+    from utils.language_map import get_language_id
+    from utils.judge0 import normalize_output, STATUS_ACCEPTED, execution_queue
+    from utils.code_runner import run_batch
+except ImportError:
+    print("⚠️ WARNING: Could not import Judge0 helpers. Coding answers will be graded by text matching only.")
+    run_batch = None
+
 quiz_bp = Blueprint('quiz', __name__)
 
 # --- Configuration ---
@@ -32,6 +41,96 @@ def _normalize_answer(text):
         return ""
     return re.sub(r'[^a-z0-9]', '', text.lower())
 
+# Order matters: 'javascript' must be checked before 'java'
+QUIZ_LANGUAGE_KEYWORDS = [
+    ('javascript', 'javascript'), ('node.js', 'javascript'), ('react', 'javascript'),
+    ('python', 'python'), ('flask', 'python'),
+    ('java', 'java'), ('c++', 'cpp')
+]
+
+def _detect_quiz_language(*texts):
+    """Guesses the programming language of a coding question from the quiz/question text."""
+    combined = " ".join(t.lower() for t in texts if isinstance(t, str))
+    for keyword, language in QUIZ_LANGUAGE_KEYWORDS:
+        if keyword in combined:
+            return language
+    return None
+
+def _grade_coding_answers_with_judge(coding_items, quiz_title, user_id):
+    """
+    Runs every coding answer AND its reference solution through the judge in one batch
+    and compares their outputs. Returns {question_text: is_correct} for the questions
+    the judge could decide; anything missing falls back to text matching.
+    """
+    if not run_batch or not coding_items:
+        return {}
+
+    submissions = []
+    judged = [] # (question_text, user_index, reference_index)
+    for q_text, user_ans, correct_ans in coding_items:
+        language = _detect_quiz_language(quiz_title, q_text)
+        language_id = get_language_id(language or "")
+        if not language_id or not isinstance(user_ans, str) or not user_ans.strip():
+            continue
+        judged.append((q_text, len(submissions), len(submissions) + 1))
+        submissions.append({"language": language, "language_id": language_id, "source_code": user_ans})
+        submissions.append({"language": language, "language_id": language_id, "source_code": str(correct_ans)})
+
+    if not submissions:
+        return {}
+
+    print(f"⏳ Grading {len(judged)} coding answer(s) via Judge0 batch ({len(submissions)} submissions)")
+    try:
+        with execution_queue.slot(user_id):
+            results = run_batch(submissions)
+    except Exception as e:
+        print(f"❌ Judge0 batch grading failed, falling back to text matching: {e}")
+        return {}
+
+    verdicts = {}
+    for q_text, user_idx, ref_idx in judged:
+        user_result, ref_result = results[user_idx], results[ref_idx]
+        if not user_result or not ref_result:
+            continue # Judge didn't finish, let text matching decide
+        ref_ok = (ref_result.get('status') or {}).get('id') == STATUS_ACCEPTED
+        expected_output = normalize_output(ref_result.get('stdout'))
+        if not ref_ok or not expected_output:
+            continue # Reference solution produced nothing to compare against
+        user_ok = (user_result.get('status') or {}).get('id') == STATUS_ACCEPTED
+        verdicts[q_text] = user_ok and normalize_output(user_result.get('stdout')) == expected_output
+    return verdicts
+
+def _course_identifier(course_title, course_description):
+    """Key of a step's quiz in generated_quizzes."""
+    identifier_string = f"{course_title.strip().lower()}::{course_description.strip().lower()}"
+    return hashlib.sha256(identifier_string.encode('utf-8')).hexdigest()
+
+def _load_stored_quiz(cur, roadmap_id, stage_index, step_index):
+    """
+    The server-side copy of a step's quiz (as generate_quiz stored it), found through the step's
+    title/description in the roadmap. Returns {"quiz_title", "questions"} or None.
+    Submissions are graded only against this copy, never against questions sent by the client.
+    """
+    cur.execute("SELECT roadmap FROM roadmaps WHERE id = %s", (roadmap_id,))
+    roadmap_record = cur.fetchone()
+    try:
+        stages = json.loads(roadmap_record['roadmap'])['roadmap'] if roadmap_record else None
+        step = stages[int(stage_index)]['steps'][int(step_index)]
+        course_identifier = _course_identifier(step['title'], step['description'])
+    except (json.JSONDecodeError, TypeError, KeyError, IndexError, ValueError, AttributeError):
+        return None
+
+    cur.execute("SELECT quiz_title, questions FROM generated_quizzes WHERE course_identifier = %s LIMIT 1",
+                (course_identifier,))
+    stored = cur.fetchone()
+    try:
+        questions = json.loads(stored['questions']) if stored and stored.get('questions') else None
+    except (json.JSONDecodeError, TypeError):
+        return None
+    if not isinstance(questions, list) or not questions:
+        return None
+    return {"quiz_title": stored.get('quiz_title') or "Quiz", "questions": questions}
+
 # --- MODIFIED: /generate-quiz route with Caching ---
 @quiz_bp.route('/generate-quiz', methods=['POST'])
 def generate_quiz():
@@ -54,8 +153,7 @@ def generate_quiz():
         return jsonify({"error": "Course title and description are required."}), 400
 
     # Create a unique identifier for this quiz topic
-    identifier_string = f"{course_title.strip().lower()}::{course_description.strip().lower()}"
-    course_identifier = hashlib.sha256(identifier_string.encode('utf-8')).hexdigest()
+    course_identifier = _course_identifier(course_title, course_description)
 
     conn = None
     cur = None
@@ -308,10 +406,25 @@ def submit_quiz():
     if not all([user_answers, quiz_data, roadmap_id, stage_index is not None, step_index is not None]):
         return jsonify({"error": "Missing quiz submission data."}), 400
 
-    questions = quiz_data.get('questions')
-    if not isinstance(questions, list) or len(questions) == 0:
-        print(f"❌ Invalid or empty questions list received in submit_quiz for user {user_id}")
-        return jsonify({"error": "Invalid quiz data received."}), 400
+    # Grade against the stored quiz: the client's copy (and its correct answers, which the
+    # coding judge runs as reference solutions) could be forged
+    conn = get_db_connection()
+    if not conn: return jsonify({"error": "Database connection failed."}), 500
+    cur = conn.cursor(dictionary=True)
+    try:
+        stored_quiz = _load_stored_quiz(cur, roadmap_id, stage_index, step_index)
+    finally:
+        cur.close()
+        conn.close()
+    if not stored_quiz:
+        print(f"❌ No stored quiz for roadmap {roadmap_id} step ({stage_index}, {step_index}) submitted by user {user_id}")
+        return jsonify({"error": "This quiz is no longer available. Please reload it and try again."}), 409
+    quiz_data = stored_quiz
+    questions = quiz_data['questions']
+    answered_texts = {a.get('question_text') for a in user_answers if isinstance(a, dict)}
+    if not any(isinstance(q, dict) and q.get('question_text') in answered_texts for q in questions):
+        # The quiz was regenerated after this user loaded it
+        return jsonify({"error": "This quiz has been updated. Please reload it and try again."}), 409
     
     # Calculate total questions, skipping any malformed ones
     total_questions = 0
@@ -330,19 +443,32 @@ def submit_quiz():
     detailed_results = []
     current_time = datetime.now()
 
+    def _find_user_answer(q_text):
+        return next((a.get('answer') for a in user_answers if a.get('question_text') == q_text), None)
+
+    # Grade all coding answers together through the judge (one batch for the whole quiz)
+    coding_items = [
+        (q['question_text'], _find_user_answer(q['question_text']), q['correct_answer'])
+        for q in valid_questions if q.get('type') == 'coding'
+    ]
+    judge_verdicts = _grade_coding_answers_with_judge(coding_items, quiz_data.get('quiz_title', ''), user_id)
+
     for q in valid_questions: # Iterate over valid questions only
         q_text = q['question_text']
         correct_ans = q['correct_answer']
         
-        user_ans = next((a.get('answer') for a in user_answers if a.get('question_text') == q_text), None)
+        user_ans = _find_user_answer(q_text)
         is_correct = False
         
-        norm_user_ans = _normalize_answer(user_ans)
-        norm_correct_ans = _normalize_answer(correct_ans)
+        if q_text in judge_verdicts:
+            is_correct = judge_verdicts[q_text]
+        else:
+            norm_user_ans = _normalize_answer(user_ans)
+            norm_correct_ans = _normalize_answer(correct_ans)
 
-        if norm_user_ans and norm_correct_ans:
-            if norm_user_ans in norm_correct_ans or norm_correct_ans in norm_user_ans:
-                is_correct = True
+            if norm_user_ans and norm_correct_ans:
+                if norm_user_ans in norm_correct_ans or norm_correct_ans in norm_user_ans:
+                    is_correct = True
 
         if is_correct:
             score += 1
@@ -351,7 +477,8 @@ def submit_quiz():
             "question": q_text,
             "user_answer": user_ans,
             "correct_answer": correct_ans,
-            "is_correct": is_correct
+            "is_correct": is_correct,
+            "graded_by": "judge" if q_text in judge_verdicts else "text_match"
         })
 
     percentage_score = (score / total_questions) * 100
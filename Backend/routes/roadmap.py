@@ -2,7 +2,9 @@ from flask import Blueprint, request, jsonify
 import jwt
 import json
 import re, traceback
+from datetime import datetime
 from db_config import get_db_connection
+from utils import profile_snapshot
 from config import SECRET_KEY
 from api_config import gemini_model
 from google.api_core.exceptions import ResourceExhausted
@@ -13,8 +15,91 @@ except ImportError:
     print("⚠️ WARNING: Could not import clear_news_cache. Cache won't be cleared on roadmap update.")
     clear_news_cache = None
 
+try:
+    from utils import link_checker, url_health
+except ImportError:
+    print("⚠️ WARNING: Could not import link checker. Study links won't be validated during generation.")
+    link_checker = url_health = None
+
 roadmap_bp = Blueprint('roadmap', __name__)
 
+# --- Generation-time study link validation ---
+INLINE_LINK_CHECK_DEADLINE = 4 # Max seconds generation waits on link checks; unfinished ones are left to link_validator.py
+INLINE_LINK_CHECK_WORKERS = 16
+REMOVED_LINK_MARKER = 'REMOVED_AT_GENERATION' # invalid_study_links.new_url for links dropped before saving
+
+def _step_link_urls(step):
+    """All study link URLs of a step: the study_links list plus the legacy single study_link field."""
+    urls = []
+    for link in step.get('study_links') or []:
+        if isinstance(link, dict) and isinstance(link.get('url'), str) and link['url'].startswith('http'):
+            urls.append(link['url'])
+    legacy = step.get('study_link')
+    if isinstance(legacy, str) and legacy.startswith('http'):
+        urls.append(legacy)
+    return urls
+
+
+def _validate_generated_links(cur, conn, roadmap_data):
+    """
+    Pipeline stage between parsing the AI response and saving the roadmap.
+    Known-dead links come straight from the url_health cache; unknown or due links are checked
+    concurrently within INLINE_LINK_CHECK_DEADLINE. Dead links are removed from roadmap_data
+    in place. Returns the removed links as (stage_idx, step_idx, url, status).
+    """
+    if not link_checker or not url_health:
+        return []
+    steps = [(stage_idx, step_idx, step)
+             for stage_idx, stage in enumerate(roadmap_data['roadmap'])
+             for step_idx, step in enumerate(stage.get('steps') or []) if isinstance(step, dict)]
+    urls = sorted({url for _, _, step in steps for url in _step_link_urls(step)})
+    if not urls:
+        return []
+
+    now = datetime.now()
+    url_health.ensure_url_health_table(cur)
+    health = url_health.load_url_health(cur, urls)
+    dead = {url: row['last_status'] for url, row in health.items()
+            if not row['is_valid'] and not url_health.is_due(row, now)}
+    due = [url for url in urls if url_health.is_due(health.get(url), now)]
+    if due:
+        results = link_checker.check_urls(due, max_workers=INLINE_LINK_CHECK_WORKERS, deadline=INLINE_LINK_CHECK_DEADLINE)
+        url_health.record_results(cur, results, health)
+        conn.commit()
+        dead.update({url: result[1] for url, result in results.items() if not result[0]})
+        print(f"ℹ️ Checked {len(results)}/{len(due)} new study links within {INLINE_LINK_CHECK_DEADLINE}s.")
+
+    removed = []
+    for stage_idx, step_idx, step in steps:
+        if isinstance(step.get('study_links'), list):
+            kept = []
+            for link in step['study_links']:
+                url = link.get('url') if isinstance(link, dict) else None
+                if url in dead:
+                    removed.append((stage_idx, step_idx, url, dead[url]))
+                else:
+                    kept.append(link)
+            step['study_links'] = kept
+        if step.get('study_link') in dead:
+            removed.append((stage_idx, step_idx, step['study_link'], dead[step['study_link']]))
+            step['study_link'] = None
+    return removed
+
+
+def _log_removed_links(cur, conn, roadmap_id, removed):
+    """Records links dropped at generation time in invalid_study_links (already resolved by removal)."""
+    if not removed:
+        return
+    now = datetime.now()
+    cur.executemany("""
+        INSERT INTO invalid_study_links
+        (roadmap_id, stage_index, step_index, original_url, status_code, checked_at, resolved_at, new_url)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+    """, [(roadmap_id, stage_idx, step_idx, url, status, now, now, REMOVED_LINK_MARKER)
+          for stage_idx, step_idx, url, status in removed])
+    conn.commit()
+
+
 # --- NEW: Helper function to calculate completion percentage ---
 def _get_roadmap_completion(user_id, roadmap_id, roadmap_data, cur):
     """Calculates the completion percentage for a given roadmap."""
@@ -159,26 +244,8 @@ def generate_roadmap():
         user_skills_list = []
         if is_personalized:
             try:
-                # Fetch manual skills
-                cur.execute("SELECT skills FROM user_details WHERE user_id = %s", (user_id,))
-                manual_skills_row = cur.fetchone()
-                if manual_skills_row and manual_skills_row.get('skills'):
-                    manual_data = manual_skills_row['skills']
-                    if isinstance(manual_data, (bytes, bytearray)): manual_data = manual_data.decode('utf-8')
-                    if isinstance(manual_data, str): user_skills_list.extend(json.loads(manual_data))
-                    elif isinstance(manual_data, list): user_skills_list.extend(manual_data)
-
-                # Fetch extracted skills
-                cur.execute("SELECT skills FROM extract_skills WHERE user_id = %s", (user_id,))
-                extracted_skills_row = cur.fetchone()
-                if extracted_skills_row and extracted_skills_row.get('skills'):
-                    extracted_data = extracted_skills_row['skills']
-                    if isinstance(extracted_data, (bytes, bytearray)): extracted_data = extracted_data.decode('utf-8')
-                    if isinstance(extracted_data, str): user_skills_list.extend(json.loads(extracted_data))
-                    elif isinstance(extracted_data, list): user_skills_list.extend(extracted_data)
-                
-                # Deduplicate
-                user_skills_list = sorted(list(set([str(s).strip().lower() for s in user_skills_list if s and str(s).strip()])))
+                # Manual + extracted skills, already merged and deduplicated in the profile snapshot
+                user_skills_list = [s.lower() for s in profile_snapshot.get_snapshot(cur, user_id, conn)['skills']]
                 print(f"ℹ️ Found {len(user_skills_list)} unique skills for personalized roadmap: {user_skills_list}")
             except Exception as e:
                 print(f"⚠️ Warning: Could not fetch user skills for personalization. Defaulting to general. Error: {e}")
@@ -272,6 +339,16 @@ def generate_roadmap():
             print(f"❌ RATE LIMIT HIT for Gemini API (Roadmap)")
             return jsonify({"error": "AI service is busy. Please try again in a moment."}), 429
 
+        # --- Drop dead study links before the user ever sees them ---
+        removed_links = []
+        try:
+            removed_links = _validate_generated_links(cur, conn, roadmap_data)
+            if removed_links:
+                print(f"⚠️ Removed {len(removed_links)} dead study link(s) from the generated roadmap.")
+        except Exception as e:
+            conn.rollback()
+            print(f"⚠️ Warning: Inline study link validation failed, saving roadmap unchecked: {e}")
+
         # --- Save the newly generated roadmap to the database ---
         cur.execute(
             # --- NEW: Added is_personalized column ---
@@ -281,6 +358,11 @@ def generate_roadmap():
         conn.commit()
         
         roadmap_id = cur.lastrowid # Get the ID of the new roadmap
+        try:
+            _log_removed_links(cur, conn, roadmap_id, removed_links)
+        except Exception as e:
+            conn.rollback()
+            print(f"⚠️ Warning: Could not log removed study links for roadmap {roadmap_id}: {e}")
         if clear_news_cache:
             clear_news_cache(user_id)
             print(f"✅ Cleared news cache for user {user_id} after new roadmap generation.")
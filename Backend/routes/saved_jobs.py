@@ -6,6 +6,7 @@ import traceback
 from db_config import get_db_connection
 from config import SECRET_KEY
 from datetime import datetime
+from utils import job_index, job_history
 
 saved_jobs_bp = Blueprint('saved_jobs', __name__)
 
@@ -26,24 +27,32 @@ def get_saved_jobs():
     
     cur = conn.cursor(dictionary=True)
     try:
-        cur.execute("""
-            SELECT job_data, saved_at FROM saved_jobs
-            WHERE user_id = %s
-            ORDER BY saved_at DESC
+        job_index.ensure_index_tables(cur)
+        # Job details come from the shared `jobs` table; job_data only holds the per-user
+        # extras (or, for rows saved before normalization, the full job)
+        cur.execute(f"""
+            SELECT s.job_id AS saved_job_id, s.job_data, s.saved_at,
+                   {", ".join("j." + c for c in job_index.JOB_COLUMNS)}
+            FROM saved_jobs s LEFT JOIN jobs j ON j.job_id = s.job_id
+            WHERE s.user_id = %s
+            ORDER BY s.saved_at DESC
         """, (user_id,))
         
         saved_jobs = cur.fetchall()
         
-        # Extract the job_data JSON from each row
         job_list = []
         for item in saved_jobs:
-            if item.get('job_data'):
-                try:
-                    job_data = json.loads(item['job_data'])
-                    job_data['saved_at_timestamp'] = item['saved_at'].strftime('%d %b %Y, %I:%M %p')
-                    job_list.append(job_data)
-                except (json.JSONDecodeError, TypeError):
-                    print(f"Warning: Could not parse job_data for saved job ID {item.get('id')}")
+            try:
+                job_data = json.loads(item['job_data']) if item.get('job_data') else {}
+            except (json.JSONDecodeError, TypeError):
+                print(f"Warning: Could not parse job_data for saved job ID {item.get('saved_job_id')}")
+                job_data = {}
+            if item.get('job_id'):
+                job_data.update({c: item[c] for c in job_index.JOB_COLUMNS})
+            elif not job_data.get('job_id'):
+                continue # Neither a jobs row nor a legacy blob to show
+            job_data['saved_at_timestamp'] = item['saved_at'].strftime('%d %b %Y, %I:%M %p')
+            job_list.append(job_data)
 
         return jsonify({"saved_jobs": job_list}), 200
 
@@ -100,13 +109,20 @@ def save_job():
         return jsonify({"error": "Invalid job data provided."}), 400
 
     job_id = job_data.get('job_id')
-    job_data_json = json.dumps(job_data) # Store the whole object
 
     conn = get_db_connection()
     if not conn: return jsonify({"error": "Database connection failed."}), 500
     
     cur = conn.cursor()
     try:
+        job_index.ensure_index_tables(cur)
+        # The request body is the client's copy, so it never goes into the shared `jobs` table.
+        # Jobs that came from JSearch are referenced; anything else keeps its copy in job_data only.
+        cur.execute("SELECT 1 FROM jobs WHERE job_id = %s", (job_id,))
+        if cur.fetchone():
+            job_data_json = json.dumps(job_history.saved_job_extras(job_data))
+        else:
+            job_data_json = json.dumps(job_data)
         cur.execute("""
             INSERT INTO saved_jobs (user_id, job_id, job_data)
             VALUES (%s, %s, %s)
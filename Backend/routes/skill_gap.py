@@ -4,6 +4,7 @@ import json
 import re
 import jwt
 from db_config import get_db_connection
+from utils import profile_snapshot
 from config import SECRET_KEY
 from api_config import gemini_model
 import traceback # Import traceback for detailed error logging
@@ -33,71 +34,8 @@ def get_user_skills():
             return jsonify({"error": "Database connection failed"}), 500
 
         cur = conn.cursor(dictionary=True) # Use dictionary cursor throughout
-        manual_skills, extracted_skills = [], []
-
-        # --- Query 1 for manual skills ---
-        cur.execute("SELECT skills FROM user_details WHERE user_id = %s", (user_id,))
-        user_details_rows = cur.fetchall() # Fetch all results
-        user_details = user_details_rows[0] if user_details_rows else None
-
-        if user_details and user_details.get('skills') is not None: # Check explicitly for None
-            skills_data = user_details['skills']
-            if isinstance(skills_data, (bytes, bytearray)):
-                skills_data = skills_data.decode('utf-8') # Decode if bytes
-            if isinstance(skills_data, str):
-                try:
-                    loaded_skills = json.loads(skills_data)
-                    # Ensure it's a list after loading
-                    if isinstance(loaded_skills, list):
-                         manual_skills = loaded_skills
-                    else:
-                         print(f"Warning: Manual skills JSON for user {user_id} decoded to non-list type: {type(loaded_skills)}")
-                         manual_skills = [] # Default to empty list if not a list
-                except json.JSONDecodeError:
-                    print(f"Warning: Could not decode manual skills JSON for user {user_id}. Data: '{skills_data}'")
-                    manual_skills = [] # Default to empty list on decode error
-            elif isinstance(skills_data, list):
-                manual_skills = skills_data
-            else:
-                 print(f"Warning: Manual skills data for user {user_id} is unexpected type: {type(skills_data)}")
-                 manual_skills = []
-
-
-        # --- Query 2 for extracted skills ---
-        cur.execute("SELECT skills FROM extract_skills WHERE user_id = %s", (user_id,))
-        extracted_details_rows = cur.fetchall() # Fetch all results
-        extracted_details = extracted_details_rows[0] if extracted_details_rows else None
-
-        if extracted_details and extracted_details.get('skills') is not None:
-            skills_data = extracted_details['skills']
-            if isinstance(skills_data, (bytes, bytearray)):
-                 skills_data = skills_data.decode('utf-8')
-            if isinstance(skills_data, str):
-                try:
-                    loaded_skills = json.loads(skills_data)
-                    if isinstance(loaded_skills, list):
-                         extracted_skills = loaded_skills
-                    else:
-                         print(f"Warning: Extracted skills JSON for user {user_id} decoded to non-list type: {type(loaded_skills)}")
-                         extracted_skills = []
-                except json.JSONDecodeError:
-                    print(f"Warning: Could not decode extracted skills JSON for user {user_id}. Data: '{skills_data}'")
-                    extracted_skills = []
-            elif isinstance(skills_data, list):
-                extracted_skills = skills_data
-            else:
-                 print(f"Warning: Extracted skills data for user {user_id} is unexpected type: {type(skills_data)}")
-                 extracted_skills = []
-
-        # Combine, ensure strings, deduplicate (case-insensitive), title case, and sort
-        combined_skills_raw = manual_skills + extracted_skills
-        # Filter out None or empty strings robustly AFTER converting to string
-        combined_skills_str = [str(skill).strip() for skill in combined_skills_raw if skill is not None]
-        # Filter again for non-empty strings after stripping
-        combined_skills_clean = [skill for skill in combined_skills_str if skill]
-
-        unique_skills_dict = {skill.lower(): skill for skill in reversed(combined_skills_clean)} # Keep last occurrence casing
-        final_skills = sorted([s.title() for s in unique_skills_dict.values()]) # Title case after deduplication
+        # Manual + extracted skills, deduplicated case-insensitively (first spelling kept) and sorted when the profile was saved
+        final_skills = profile_snapshot.get_snapshot(cur, user_id, conn)['skills']
 
         print(f"Returning skills for user {user_id}: {final_skills}") # Log returned skills
         return jsonify({"skills": final_skills})
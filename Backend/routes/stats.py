@@ -5,6 +5,7 @@ from db_config import get_db_connection
 from config import SECRET_KEY
 from datetime import datetime, timedelta
 import traceback
+from utils import http_client, cache
 
 stats_bp = Blueprint('stats', __name__)
 
@@ -142,4 +143,30 @@ def get_user_stats():
         return jsonify(response_data), 200
     finally:
         cur.close()
-        conn.close()
\ No newline at end of file
+        conn.close()
+
+
+@stats_bp.route('/stats/upstreams', methods=['GET'])
+def get_upstream_stats():
+    """Per-upstream HTTP metrics (latency percentiles, failures, retries, circuit state) for this worker."""
+    token = request.cookies.get("token")
+    if not token:
+        return jsonify({"error": "Unauthorized"}), 401
+    try:
+        jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
+    except (jwt.ExpiredSignatureError, jwt.InvalidTokenError):
+        return jsonify({"error": "Invalid session"}), 401
+    return jsonify(http_client.metrics()), 200
+
+
+@stats_bp.route('/stats/caches', methods=['GET'])
+def get_cache_stats():
+    """Hit/miss counters for every utils.cache namespace used by this worker."""
+    token = request.cookies.get("token")
+    if not token:
+        return jsonify({"error": "Unauthorized"}), 401
+    try:
+        jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
+    except (jwt.ExpiredSignatureError, jwt.InvalidTokenError):
+        return jsonify({"error": "Invalid session"}), 401
+    return jsonify(cache.all_stats()), 200
@@ -5,6 +5,7 @@ from flask import Blueprint, request, jsonify
 from werkzeug.utils import secure_filename
 from PyPDF2 import PdfReader
 from db_config import get_db_connection
+from utils import profile_snapshot
 from config import SECRET_KEY
 from datetime import datetime
 import traceback
@@ -55,6 +56,7 @@ def update_user_details():
     new_resume_processed = False # Flag to trigger skill extraction
 
     try:
+        profile_snapshot.ensure_snapshot_table(cursor)
         # Fetch Existing Details
         cursor.execute("SELECT * FROM user_details WHERE user_id = %s", (user_id,))
         existing_details = cursor.fetchone() or {}
@@ -184,6 +186,7 @@ def update_user_details():
             )
 
         cursor.execute(query, params)
+        profile_snapshot.refresh_snapshot(cursor, user_id) # Same transaction as the skills/domain write
         conn.commit()
         # This log will now show the path that was *actually* saved
         print(f"✅ Successfully saved user_details for user {user_id}.")
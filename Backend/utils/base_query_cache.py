@@ -0,0 +1,81 @@
+# backend/utils/base_query_cache.py
+import os
+import json
+import hashlib
+from datetime import datetime, timedelta
+
+# --- Configuration ---
+# AI base queries depend only on the skill set and completed courses, so identical profiles share them.
+# The key is derived from the profile itself: any profile change maps to a new entry, the TTL only
+# bounds how long an unchanged profile keeps the same queries.
+BASE_QUERY_CACHE_TTL = timedelta(seconds=int(os.getenv("BASE_QUERY_CACHE_TTL_SECONDS", 7 * 24 * 3600)))
+PROMPT_VERSION = 1 # Bump when the generation prompt changes so old answers aren't reused
+
+BASE_QUERY_CACHE_DDL = """
+    CREATE TABLE IF NOT EXISTS job_base_query_cache (
+        fingerprint CHAR(64) NOT NULL PRIMARY KEY,
+        base_queries VARCHAR(1024) NOT NULL,
+        created_at DATETIME NOT NULL,
+        expires_at DATETIME NOT NULL,
+        hit_count INT NOT NULL DEFAULT 0,
+        INDEX idx_base_query_cache_expires (expires_at)
+    )
+"""
+
+_table_ready = False
+
+
+def _canonical(text):
+    return " ".join(str(text).split()).casefold()
+
+
+def fingerprint(skills, completed_courses):
+    """
+    Order- and case-insensitive key for a profile: sorted, case-folded, deduplicated skills
+    plus sorted (domain, course title) pairs.
+    """
+    skill_set = sorted({_canonical(s) for s in skills or [] if s and str(s).strip()})
+    course_set = set()
+    if isinstance(completed_courses, dict):
+        for domain, titles in completed_courses.items():
+            for title in titles if isinstance(titles, list) else [titles]:
+                if title and str(title).strip():
+                    course_set.add((_canonical(domain), _canonical(title)))
+    payload = json.dumps({"v": PROMPT_VERSION, "skills": skill_set, "courses": sorted(course_set)})
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def ensure_cache_table(cur):
+    global _table_ready
+    if not _table_ready:
+        cur.execute(BASE_QUERY_CACHE_DDL)
+        _table_ready = True
+
+
+def get(cur, key, now=None):
+    """Cached comma-separated base queries for a fingerprint, or None."""
+    now = now or datetime.now()
+    cur.execute("""
+        SELECT base_queries FROM job_base_query_cache WHERE fingerprint = %s AND expires_at > %s
+    """, (key, now))
+    row = cur.fetchone()
+    if not row:
+        return None
+    cur.execute("UPDATE job_base_query_cache SET hit_count = hit_count + 1 WHERE fingerprint = %s", (key,))
+    return row['base_queries']
+
+
+def put(cur, key, base_queries, now=None):
+    now = now or datetime.now()
+    cur.execute("""
+        INSERT INTO job_base_query_cache (fingerprint, base_queries, created_at, expires_at)
+        VALUES (%s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            base_queries = VALUES(base_queries), created_at = VALUES(created_at),
+            expires_at = VALUES(expires_at), hit_count = 0
+    """, (key, base_queries[:1024], now, now + BASE_QUERY_CACHE_TTL))
+
+
+def purge_expired(cur, now=None):
+    cur.execute("DELETE FROM job_base_query_cache WHERE expires_at <= %s", (now or datetime.now(),))
+    return cur.rowcount
@@ -0,0 +1,300 @@
+# backend/utils/cache.py
+import os
+import json
+import random
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from db_config import get_db_connection
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+# --- Configuration ---
+# CACHE_BACKEND picks the shared store for make_cache(): "mysql", "redis" or "memory" (per process,
+# for local development). Unset means Redis when REDIS_URL is set and the client is installed, else MySQL.
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "").strip().lower()
+REDIS_URL = os.getenv("REDIS_URL")
+DEFAULT_MAX_ENTRIES = 1024
+PURGE_PROBABILITY = 0.01 # Share of MySQL writes that also delete expired rows and trim to max_entries
+
+APP_CACHE_DDL = """
+    CREATE TABLE IF NOT EXISTS app_cache (
+        namespace VARCHAR(64) NOT NULL,
+        cache_key VARCHAR(255) NOT NULL,
+        value LONGTEXT NOT NULL,
+        expires_at DATETIME NOT NULL,
+        updated_at DATETIME NOT NULL,
+        PRIMARY KEY (namespace, cache_key),
+        INDEX idx_app_cache_expires (expires_at),
+        INDEX idx_app_cache_namespace_updated (namespace, updated_at)
+    )
+"""
+
+
+def _seconds(ttl):
+    return ttl.total_seconds() if isinstance(ttl, timedelta) else float(ttl)
+
+
+class _Counters:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.sets = 0
+        self.evictions = 0
+        self.errors = 0
+
+    def add(self, **counts):
+        with self._lock:
+            for name, value in counts.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def snapshot(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits, "misses": self.misses, "sets": self.sets,
+                "evictions": self.evictions, "errors": self.errors,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+            }
+
+
+class MemoryCache:
+    """
+    Per-process LRU cache bounded by entry count and TTL. Values are returned as stored
+    (not copied), so callers must not mutate them.
+    """
+    backend = "memory"
+
+    def __init__(self, namespace, ttl, max_entries=DEFAULT_MAX_ENTRIES):
+        self.namespace = namespace
+        self.ttl = _seconds(ttl)
+        self.max_entries = max_entries
+        self._entries = OrderedDict() # key -> (expires_at monotonic, value)
+        self._lock = threading.Lock()
+        self.counters = _Counters()
+
+    def get(self, key, default=None):
+        key = str(key)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.counters.add(hits=1)
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+        self.counters.add(misses=1)
+        return default
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else _seconds(ttl))
+        evicted = 0
+        with self._lock:
+            self._entries[str(key)] = (expires_at, value)
+            self._entries.move_to_end(str(key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                evicted += 1
+        self.counters.add(sets=1, evictions=evicted)
+
+    def delete(self, key):
+        with self._lock:
+            return self._entries.pop(str(key), None) is not None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            size = len(self._entries)
+        return {"backend": self.backend, "namespace": self.namespace, "entries": size,
+                "max_entries": self.max_entries, **self.counters.snapshot()}
+
+
+class MySQLCache:
+    """
+    Cache shared by every worker through the app_cache table. Values are stored as JSON.
+    With max_entries, occasional writes delete the namespace's oldest rows beyond it (a soft cap).
+    Errors are logged and treated as misses, so a cache problem never fails the request.
+    """
+    backend = "mysql"
+    _table_ready = False
+
+    def __init__(self, namespace, ttl, max_entries=None):
+        self.namespace = namespace
+        self.ttl = _seconds(ttl)
+        self.max_entries = max_entries
+        self.counters = _Counters()
+
+    def _run(self, action, sql, params, fetch=False):
+        conn = get_db_connection()
+        if not conn:
+            self.counters.add(errors=1)
+            return None
+        cur = conn.cursor(dictionary=True)
+        try:
+            if not MySQLCache._table_ready:
+                cur.execute(APP_CACHE_DDL)
+                MySQLCache._table_ready = True
+            cur.execute(sql, params)
+            if fetch:
+                return cur.fetchone()
+            conn.commit()
+            return cur.rowcount
+        except Exception as e:
+            self.counters.add(errors=1)
+            print(f"⚠️ Cache {action} failed for '{self.namespace}': {e}")
+            return None
+        finally:
+            cur.close()
+            conn.close()
+
+    def get(self, key, default=None):
+        row = self._run("read", """
+            SELECT value FROM app_cache WHERE namespace = %s AND cache_key = %s AND expires_at > %s
+        """, (self.namespace, str(key)[:255], datetime.now()), fetch=True)
+        if row:
+            try:
+                value = json.loads(row['value'])
+                self.counters.add(hits=1)
+                return value
+            except (json.JSONDecodeError, TypeError):
+                pass
+        self.counters.add(misses=1)
+        return default
+
+    def set(self, key, value, ttl=None):
+        now = datetime.now()
+        expires_at = now + timedelta(seconds=self.ttl if ttl is None else _seconds(ttl))
+        self._run("write", """
+            INSERT INTO app_cache (namespace, cache_key, value, expires_at, updated_at)
+            VALUES (%s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE value = VALUES(value), expires_at = VALUES(expires_at), updated_at = VALUES(updated_at)
+        """, (self.namespace, str(key)[:255], json.dumps(value, default=str), expires_at, now))
+        self.counters.add(sets=1)
+        if random.random() < PURGE_PROBABILITY:
+            self._run("purge", "DELETE FROM app_cache WHERE namespace = %s AND expires_at <= %s", (self.namespace, now))
+            if self.max_entries:
+                self._trim()
+
+    def _trim(self):
+        row = self._run("count", "SELECT COUNT(*) AS entries FROM app_cache WHERE namespace = %s",
+                        (self.namespace,), fetch=True)
+        excess = (row['entries'] - self.max_entries) if row else 0
+        if excess > 0:
+            deleted = self._run("trim", "DELETE FROM app_cache WHERE namespace = %s ORDER BY updated_at LIMIT %s",
+                                (self.namespace, excess))
+            self.counters.add(evictions=deleted or 0)
+
+    def delete(self, key):
+        return bool(self._run("delete", "DELETE FROM app_cache WHERE namespace = %s AND cache_key = %s",
+                              (self.namespace, str(key)[:255])))
+
+    def clear(self):
+        self._run("clear", "DELETE FROM app_cache WHERE namespace = %s", (self.namespace,))
+
+    def stats(self):
+        return {"backend": self.backend, "namespace": self.namespace, "max_entries": self.max_entries,
+                **self.counters.snapshot()}
+
+
+class RedisCache:
+    """
+    Cache shared by every worker through Redis (SETEX on namespaced keys, JSON values).
+    Every key has a TTL, so run Redis with maxmemory and maxmemory-policy volatile-lru to bound it.
+    """
+    backend = "redis"
+    _client = None
+
+    def __init__(self, namespace, ttl):
+        self.namespace = namespace
+        self.ttl = _seconds(ttl)
+        self.counters = _Counters()
+        if RedisCache._client is None:
+            RedisCache._client = redis.Redis.from_url(REDIS_URL, socket_timeout=2)
+
+    def _key(self, key):
+        return f"{self.namespace}:{key}"
+
+    def get(self, key, default=None):
+        try:
+            raw = RedisCache._client.get(self._key(key))
+        except redis.exceptions.RedisError as e:
+            self.counters.add(errors=1, misses=1)
+            print(f"⚠️ Cache read failed for '{self.namespace}': {e}")
+            return default
+        if raw is None:
+            self.counters.add(misses=1)
+            return default
+        self.counters.add(hits=1)
+        return json.loads(raw)
+
+    def set(self, key, value, ttl=None):
+        try:
+            RedisCache._client.setex(self._key(key), max(1, int(self.ttl if ttl is None else _seconds(ttl))),
+                                     json.dumps(value, default=str))
+            self.counters.add(sets=1)
+        except redis.exceptions.RedisError as e:
+            self.counters.add(errors=1)
+            print(f"⚠️ Cache write failed for '{self.namespace}': {e}")
+
+    def delete(self, key):
+        try:
+            return bool(RedisCache._client.delete(self._key(key)))
+        except redis.exceptions.RedisError as e:
+            self.counters.add(errors=1)
+            print(f"⚠️ Cache delete failed for '{self.namespace}': {e}")
+            return False
+
+    def clear(self):
+        try:
+            keys = list(RedisCache._client.scan_iter(match=f"{self.namespace}:*", count=500))
+            if keys: RedisCache._client.delete(*keys)
+        except redis.exceptions.RedisError as e:
+            self.counters.add(errors=1)
+            print(f"⚠️ Cache clear failed for '{self.namespace}': {e}")
+
+    def stats(self):
+        return {"backend": self.backend, "namespace": self.namespace, **self.counters.snapshot()}
+
+
+def _shared_backend():
+    if CACHE_BACKEND in ("mysql", "memory"):
+        return CACHE_BACKEND
+    if CACHE_BACKEND == "redis" or REDIS_URL:
+        if redis is not None and REDIS_URL:
+            return "redis"
+        print("⚠️ WARNING: Redis cache requested but redis/REDIS_URL is unavailable. Falling back to MySQL.")
+    return "mysql"
+
+
+_caches = {}
+_registry_lock = threading.Lock()
+
+
+def make_cache(namespace, ttl, max_entries=None, shared=True):
+    """
+    Returns the cache for a namespace (one instance per process). shared=True uses the
+    configured cross-worker backend, so deletes are seen by every worker; shared=False
+    gives a per-process LRU bounded by max_entries (DEFAULT_MAX_ENTRIES if not given).
+    max_entries also caps the namespace's rows in MySQL; without it MySQL rows are only
+    bounded by their TTL.
+    """
+    with _registry_lock:
+        if namespace not in _caches:
+            backend = _shared_backend() if shared else "memory"
+            if backend == "redis": _caches[namespace] = RedisCache(namespace, ttl)
+            elif backend == "mysql": _caches[namespace] = MySQLCache(namespace, ttl, max_entries)
+            else: _caches[namespace] = MemoryCache(namespace, ttl, max_entries or DEFAULT_MAX_ENTRIES)
+        return _caches[namespace]
+
+
+def all_stats():
+    """{namespace: stats} for every cache created in this process."""
+    return {namespace: c.stats() for namespace, c in list(_caches.items())}
@@ -0,0 +1,111 @@
+# backend/utils/code_runner.py
+import os
+import json
+import hashlib
+import concurrent.futures
+from datetime import timedelta
+from utils import judge0, local_runner, cache
+
+# --- Backend Selection ---
+# CODE_RUNNER_BACKEND=local runs every language the local runner supports on this machine and
+# sends the rest to Judge0; "judge0" (default) sends everything to JUDGE0_BASE_URL. The local
+# runner only runs code once it is isolated (see utils/local_runner.py), otherwise Judge0 is used.
+CODE_RUNNER_BACKEND = os.getenv("CODE_RUNNER_BACKEND", "judge0").strip().lower()
+LOCAL_BATCH_PARALLELISM = 2 # Local runs are CPU-bound, keep a batch from taking every core
+
+# --- Result Cache ---
+# Students press Run again on unchanged code, and quiz / practice grading re-run the same
+# (code, stdin) pairs, so finished results are cached by language + normalized source + stdin.
+RUN_RESULT_TTL = timedelta(hours=6)
+RUN_RESULT_MAX_ENTRIES = 2048
+MAX_CACHED_OUTPUT = 64 * 1024
+UNCACHED_STATUS_IDS = (5, 13) # Time limit and internal errors depend on load, so they are re-run
+
+run_result_cache = cache.make_cache("code_run_results", RUN_RESULT_TTL, max_entries=RUN_RESULT_MAX_ENTRIES)
+
+
+def normalize_source(source_code):
+    """Drops differences that cannot change a run: line endings, trailing spaces and trailing blank lines."""
+    lines = [line.rstrip() for line in (source_code or "").replace("\r\n", "\n").split("\n")]
+    return "\n".join(lines).rstrip("\n")
+
+
+def canonical_language(language=None, language_id=None):
+    """
+    One cache-key name per language, whether the caller passed a name ("Python", "c++") or only
+    a Judge0 id, so the same program shares its cached result across practice and quiz.
+    """
+    if language:
+        return local_runner.normalize_language(str(language))
+    if not language_id:
+        return ""
+    from utils import language_map # Deferred: importing it fetches Judge0's language list
+    return next((name for name in local_runner.LANGUAGES if language_map.JUDGE0_LANGUAGE_MAP.get(name) == language_id),
+                f"judge0:{language_id}")
+
+
+def source_hash(language, source_code):
+    raw = json.dumps([local_runner.normalize_language(str(language)), normalize_source(source_code)])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def result_key(language, source_code, stdin=""):
+    return hashlib.sha256(f"{source_hash(language, source_code)}:{stdin or ''}".encode("utf-8")).hexdigest()
+
+
+def cached_result(key):
+    return run_result_cache.get(key)
+
+
+def store_result(key, result):
+    """Caches a finished result unless it is load-dependent or too large to be worth keeping."""
+    if not judge0.is_finished(result) or (result.get("status") or {}).get("id") in UNCACHED_STATUS_IDS:
+        return
+    if sum(len(result.get(k) or "") for k in ("stdout", "stderr", "compile_output")) > MAX_CACHED_OUTPUT:
+        return
+    run_result_cache.set(key, result)
+
+
+def runs_locally(language):
+    return CODE_RUNNER_BACKEND == "local" and local_runner.supports(language)
+
+
+def run_local(language, source_code, stdin=""):
+    """Runs code with the local runner; None if the runner could not start (callers then use Judge0)."""
+    try:
+        return local_runner.run(language, source_code, stdin)
+    except OSError as e:
+        print(f"⚠️ Local runner failed for {language}, falling back to Judge0: {e}")
+        return None
+
+
+def run_batch(submissions, max_wait=judge0.BATCH_MAX_WAIT):
+    """
+    Same contract as judge0.run_batch. Submissions may also carry "language": those the
+    local runner supports run here, everything else (and any local failure) goes to Judge0.
+    Cached results are reused and fresh ones are cached.
+    """
+    keys = [result_key(canonical_language(s.get("language"), s.get("language_id")), s["source_code"], s.get("stdin", ""))
+            for s in submissions]
+    results = [cached_result(key) for key in keys]
+    hits = [result is not None for result in results]
+    local_indexes = [i for i, s in enumerate(submissions) if results[i] is None and runs_locally(s.get("language"))]
+    if local_indexes:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=LOCAL_BATCH_PARALLELISM) as executor:
+            local_results = executor.map(
+                lambda i: run_local(submissions[i]["language"], submissions[i]["source_code"], submissions[i].get("stdin", "")),
+                local_indexes
+            )
+            for i, result in zip(local_indexes, local_results):
+                results[i] = result
+
+    remote_indexes = [i for i, s in enumerate(submissions) if results[i] is None and s.get("language_id")]
+    if remote_indexes:
+        remote_results = judge0.run_batch([submissions[i] for i in remote_indexes], max_wait)
+        for i, result in zip(remote_indexes, remote_results):
+            results[i] = result
+
+    for key, result, hit in zip(keys, results, hits):
+        if result and not hit:
+            store_result(key, result)
+    return results
@@ -0,0 +1,224 @@
+# backend/utils/http_client.py
+import random
+import threading
+import time
+from collections import deque
+from http import cookiejar
+import requests
+from requests.adapters import HTTPAdapter
+
+# --- Per-upstream Configuration ---
+# timeout:  per-attempt timeout (seconds)
+# deadline: total budget for all attempts and backoff sleeps (None = attempts * timeout)
+# retries:  extra attempts after the first, for connection errors and RETRY_STATUSES
+# breaker:  open the circuit after `breaker_threshold` consecutive failures, for `breaker_cooldown` seconds
+# cookies:  keep cookies in the shared Session (off for upstreams hit from many threads for unrelated hosts)
+DEFAULT_UPSTREAM = {
+    "timeout": 15, "deadline": None, "retries": 1, "backoff_base": 0.3, "backoff_max": 3.0,
+    "pool_size": 10, "breaker": True, "breaker_threshold": 5, "breaker_cooldown": 30, "cookies": True,
+}
+UPSTREAMS = {
+    "jsearch": {"timeout": 15, "deadline": 20, "retries": 1, "pool_size": 10},
+    "newsapi": {"timeout": 15, "deadline": 20, "retries": 1, "pool_size": 4},
+    "judge0": {"timeout": 20, "deadline": 30, "retries": 2, "pool_size": 20},
+    # Link checks hit many unrelated hosts: one dead site must not trip a breaker for all of them,
+    # and failed checks are already retried on the url_health backoff schedule. Its Session is shared
+    # by every checker thread, so it must not collect cookies from the sites it checks.
+    "links": {"timeout": 10, "retries": 0, "pool_size": 32, "breaker": False, "cookies": False},
+}
+RETRY_STATUSES = {429, 502, 503, 504}
+# A gateway 502/504 on a POST may come after the upstream already acted on it (e.g. created a Judge0
+# submission), so non-idempotent calls only retry statuses that mean "not processed"
+NON_IDEMPOTENT_RETRY_STATUSES = {429, 503}
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS"}
+LATENCY_WINDOW = 200 # Recent requests kept per upstream for percentiles
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Raised without touching the network while an upstream's circuit is open."""
+
+
+class _NoCookiesPolicy(cookiejar.DefaultCookiePolicy):
+    """Accepts and returns no cookies, so a Session shared across threads and hosts stays stateless."""
+
+    def set_ok(self, cookie, request):
+        return False
+
+    def return_ok(self, cookie, request):
+        return False
+
+
+class _Upstream:
+    """Session, circuit breaker and metrics for one upstream service."""
+
+    def __init__(self, name, config):
+        self.name = name
+        self.config = config
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=config["pool_size"], pool_maxsize=config["pool_size"])
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        if not config["cookies"]:
+            self.session.cookies.set_policy(_NoCookiesPolicy())
+        self._lock = threading.Lock()
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self.half_open_trial = False
+        self.requests = 0
+        self.failures = 0
+        self.retries = 0
+        self.rejected = 0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+
+    # --- Circuit breaker ---
+    def before_request(self):
+        if not self.config["breaker"]:
+            return
+        with self._lock:
+            now = time.monotonic()
+            if self.open_until > now or (self.open_until and self.half_open_trial):
+                self.rejected += 1
+                raise CircuitOpenError(f"Circuit open for upstream '{self.name}'")
+            if self.open_until:
+                self.half_open_trial = True # Cooldown over: let exactly one trial request through
+
+    def abandon_request(self):
+        """The request failed before reaching the upstream: free the half-open trial for the next caller."""
+        with self._lock:
+            self.half_open_trial = False
+
+    def after_request(self, seconds, ok):
+        with self._lock:
+            self.requests += 1
+            self.latencies.append(seconds)
+            if ok:
+                self.consecutive_failures = 0
+                self.open_until = 0.0
+                self.half_open_trial = False
+                return
+            self.failures += 1
+            self.consecutive_failures += 1
+            if self.config["breaker"] and (self.half_open_trial or self.consecutive_failures >= self.config["breaker_threshold"]):
+                self.open_until = time.monotonic() + self.config["breaker_cooldown"]
+                self.half_open_trial = False
+                print(f"⚠️ Circuit opened for upstream '{self.name}' for {self.config['breaker_cooldown']}s.")
+
+    def state(self):
+        if not self.open_until: return "closed"
+        return "half_open" if self.open_until <= time.monotonic() else "open"
+
+    def snapshot(self):
+        with self._lock:
+            latencies = sorted(self.latencies)
+            def pct(p):
+                return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000, 1) if latencies else None
+            return {
+                "requests": self.requests, "failures": self.failures, "retries": self.retries,
+                "rejected_by_breaker": self.rejected, "circuit": self.state(),
+                "p50_ms": pct(0.5), "p95_ms": pct(0.95), "max_ms": round(latencies[-1] * 1000, 1) if latencies else None,
+            }
+
+
+_upstreams = {}
+_registry_lock = threading.Lock()
+
+
+def _get_upstream(name):
+    upstream = _upstreams.get(name)
+    if upstream is None:
+        with _registry_lock:
+            upstream = _upstreams.get(name)
+            if upstream is None:
+                upstream = _Upstream(name, {**DEFAULT_UPSTREAM, **UPSTREAMS.get(name, {})})
+                _upstreams[name] = upstream
+    return upstream
+
+
+def get_session(name):
+    """The pooled keep-alive Session for an upstream (for callers that need raw Session access)."""
+    return _get_upstream(name).session
+
+
+def _backoff(config, attempt, response=None):
+    """Full-jitter exponential backoff; honours a numeric Retry-After when the server sends one."""
+    retry_after = response.headers.get("Retry-After") if response is not None else None
+    if retry_after and retry_after.isdigit():
+        return min(float(retry_after), config["backoff_max"])
+    return random.uniform(0, min(config["backoff_max"], config["backoff_base"] * (2 ** attempt)))
+
+
+def _attempt_timeout(timeout, remaining):
+    """Caps a per-attempt timeout (seconds or a requests-style (connect, read) tuple) to the time left."""
+    if isinstance(timeout, (tuple, list)):
+        return tuple(max(0.5, min(t, remaining)) if t is not None else max(0.5, remaining) for t in timeout)
+    return max(0.5, min(timeout, remaining)) if timeout is not None else max(0.5, remaining)
+
+
+def _timeout_seconds(timeout, default):
+    if isinstance(timeout, (tuple, list)):
+        return sum(t for t in timeout if t is not None) or default
+    return timeout if timeout is not None else default
+
+
+def request(name, method, url, **kwargs):
+    """
+    Sends a request through the upstream's pooled session with retries, a total deadline,
+    the circuit breaker and latency metrics. Returns the Response (callers still call
+    raise_for_status()); raises requests exceptions like a plain requests call would,
+    plus CircuitOpenError (a ConnectionError) while the circuit is open.
+    """
+    upstream = _get_upstream(name)
+    config = upstream.config
+    method = method.upper()
+    retry_statuses = RETRY_STATUSES if method in IDEMPOTENT_METHODS else NON_IDEMPOTENT_RETRY_STATUSES
+    timeout = kwargs.pop("timeout", config["timeout"])
+    deadline = config["deadline"] or _timeout_seconds(timeout, config["timeout"]) * (config["retries"] + 1)
+    give_up_at = time.monotonic() + deadline
+    attempt = 0
+    while True:
+        upstream.before_request()
+        remaining = give_up_at - time.monotonic()
+        started = time.monotonic()
+        try:
+            response = upstream.session.request(method, url, timeout=_attempt_timeout(timeout, remaining), **kwargs)
+        except requests.exceptions.RequestException as e:
+            upstream.after_request(time.monotonic() - started, False)
+            # A read timeout or dropped connection on a POST may come after the request was processed,
+            # so non-idempotent calls only retry when the connection was never established
+            if isinstance(e, requests.exceptions.ConnectTimeout): retryable = True
+            elif method not in IDEMPOTENT_METHODS: retryable = False
+            else: retryable = isinstance(e, (requests.exceptions.Timeout, requests.exceptions.ConnectionError))
+            if not retryable or attempt >= config["retries"]:
+                raise
+            delay = _backoff(config, attempt)
+            if time.monotonic() + delay >= give_up_at:
+                raise
+        except BaseException:
+            upstream.abandon_request() # e.g. the body could not be encoded; otherwise a half-open circuit stays stuck
+            raise
+        else:
+            failed = response.status_code in RETRY_STATUSES or response.status_code >= 500
+            upstream.after_request(time.monotonic() - started, not failed)
+            if response.status_code not in retry_statuses or attempt >= config["retries"]:
+                return response
+            delay = _backoff(config, attempt, response)
+            if time.monotonic() + delay >= give_up_at:
+                return response
+            response.close()
+        with upstream._lock:
+            upstream.retries += 1
+        time.sleep(delay)
+        attempt += 1
+
+
+def get(name, url, **kwargs):
+    return request(name, "GET", url, **kwargs)
+
+
+def post(name, url, **kwargs):
+    return request(name, "POST", url, **kwargs)
+
+
+def metrics():
+    """{upstream: {requests, failures, retries, rejected_by_breaker, circuit, p50_ms, p95_ms, max_ms}}"""
+    return {name: upstream.snapshot() for name, upstream in list(_upstreams.items())}
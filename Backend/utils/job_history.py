@@ -0,0 +1,101 @@
+# backend/utils/job_history.py
+import json
+from datetime import datetime
+from utils import job_index
+
+# --- Normalized Recommendation History ---
+# job_recommendation_history keeps one row per search (queries, locations, job_count) and
+# job_recommendation_history_jobs references the `jobs` table by job_id, in ranked order.
+# Rows written before this layout still carry the full `recommendations` JSON blob; they
+# are normalized the first time they are hydrated. The history table changes are applied by
+# migrations/002_job_recommendation_history_job_count.sql rather than at request time.
+HISTORY_JOBS_DDL = """
+    CREATE TABLE IF NOT EXISTS job_recommendation_history_jobs (
+        history_id INT NOT NULL,
+        position SMALLINT NOT NULL,
+        job_id VARCHAR(255) NOT NULL,
+        match_score SMALLINT,
+        recommendation_reason VARCHAR(512),
+        PRIMARY KEY (history_id, position),
+        INDEX idx_history_jobs_job (job_id)
+    )
+"""
+# Per-search fields that differ from the shared `jobs` row
+SAVED_JOB_EXTRA_FIELDS = ("recommendation_reason", "match_score")
+
+_tables_ready = False
+
+
+def ensure_history_tables(cur):
+    """
+    Creates the reference table once per process. The job_count column and the nullable
+    blob come from migrations/002_job_recommendation_history_job_count.sql.
+    """
+    global _tables_ready
+    if _tables_ready:
+        return
+    job_index.ensure_index_tables(cur)
+    cur.execute(HISTORY_JOBS_DDL)
+    _tables_ready = True
+
+
+def _insert_history_jobs(cur, history_id, jobs):
+    jobs = [job for job in jobs if isinstance(job, dict) and job.get('job_id')]
+    job_index.store_jobs(cur, jobs)
+    cur.executemany("""
+        INSERT INTO job_recommendation_history_jobs (history_id, position, job_id, match_score, recommendation_reason)
+        VALUES (%s, %s, %s, %s, %s)
+    """, [(history_id, position, str(job['job_id'])[:255], job.get('match_score'),
+           str(job.get('recommendation_reason') or '')[:512] or None)
+          for position, job in enumerate(jobs)])
+    return len(jobs)
+
+
+def save_history(cur, user_id, base_queries_str, location_list, jobs, now=None):
+    """Stores one search as a compact history row plus job_id references. Returns the history id."""
+    cur.execute("""
+        INSERT INTO job_recommendation_history
+        (user_id, base_queries, locations, recommendations, job_count, created_at)
+        VALUES (%s, %s, %s, NULL, %s, %s)
+    """, (user_id, base_queries_str, json.dumps(location_list), len(jobs), now or datetime.now()))
+    history_id = cur.lastrowid
+    _insert_history_jobs(cur, history_id, jobs)
+    return history_id
+
+
+def load_history_jobs(cur, history_id):
+    """The jobs of one normalized history row, in their original ranked order."""
+    cur.execute(f"""
+        SELECT {", ".join("j." + c for c in job_index.JOB_COLUMNS)}, h.match_score, h.recommendation_reason
+        FROM job_recommendation_history_jobs h JOIN jobs j ON j.job_id = h.job_id
+        WHERE h.history_id = %s
+        ORDER BY h.position
+    """, (history_id,))
+    jobs = cur.fetchall()
+    for job in jobs:
+        if job.get('match_score') is None: job.pop('match_score', None)
+    return jobs
+
+
+def normalize_legacy_row(cur, history_id, recommendations_blob):
+    """
+    Moves a legacy row's job blob into `jobs` + references and clears the blob.
+    Returns the parsed jobs (empty list if the blob can't be parsed).
+    """
+    try:
+        jobs = json.loads(recommendations_blob)
+    except (json.JSONDecodeError, TypeError):
+        jobs = []
+    if not isinstance(jobs, list):
+        jobs = []
+    cur.execute("DELETE FROM job_recommendation_history_jobs WHERE history_id = %s", (history_id,))
+    job_count = _insert_history_jobs(cur, history_id, jobs)
+    cur.execute("""
+        UPDATE job_recommendation_history SET recommendations = NULL, job_count = %s WHERE id = %s
+    """, (job_count, history_id))
+    return jobs
+
+
+def saved_job_extras(job_data):
+    """The part of a saved job that isn't shared through `jobs` (stored in saved_jobs.job_data)."""
+    return {field: job_data[field] for field in SAVED_JOB_EXTRA_FIELDS if job_data.get(field) is not None}
@@ -0,0 +1,257 @@
+# backend/utils/job_index.py
+import os
+import re
+from collections import Counter
+from datetime import datetime, timedelta
+
+try:
+    import numpy as np
+except ImportError:
+    print("⚠️ WARNING: numpy is not installed. Job results won't be ranked by skill match.")
+    np = None
+
+# --- Configuration ---
+LOCAL_INDEX_MAX_AGE = timedelta(days=int(os.getenv("JOB_INDEX_MAX_AGE_DAYS", 3))) # Older postings aren't served locally
+MAX_TERMS_PER_JOB = 200   # Most frequent terms kept per job in the inverted index
+MAX_DESCRIPTION_CHARS = 6000
+LOOKUP_CHUNK_SIZE = 500
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "has", "have", "in", "is", "it",
+    "of", "on", "or", "our", "the", "this", "to", "we", "will", "with", "you", "your", "job", "jobs",
+}
+SINGLE_CHAR_TERMS = {"c", "r"}
+
+JOBS_DDL = """
+    CREATE TABLE IF NOT EXISTS jobs (
+        job_id VARCHAR(255) NOT NULL PRIMARY KEY,
+        job_title VARCHAR(512),
+        company_name VARCHAR(255),
+        location VARCHAR(255),
+        job_url TEXT,
+        source VARCHAR(255),
+        estimated_salary_lpa VARCHAR(128),
+        first_seen_at DATETIME NOT NULL,
+        last_seen_at DATETIME NOT NULL,
+        INDEX idx_jobs_last_seen (last_seen_at)
+    )
+"""
+JOB_TERMS_DDL = """
+    CREATE TABLE IF NOT EXISTS job_terms (
+        term VARCHAR(64) NOT NULL,
+        job_id VARCHAR(255) NOT NULL,
+        tf SMALLINT NOT NULL,
+        PRIMARY KEY (term, job_id),
+        INDEX idx_job_terms_job (job_id)
+    )
+"""
+JOB_COLUMNS = ("job_id", "job_title", "company_name", "location", "job_url", "source", "estimated_salary_lpa")
+# VARCHAR widths from JOBS_DDL; values are cut to fit so one long field can't fail a whole batch
+# in strict SQL mode (job_url is TEXT and stored as-is)
+JOB_COLUMN_WIDTHS = {"job_id": 255, "job_title": 512, "company_name": 255, "location": 255, "source": 255,
+                     "estimated_salary_lpa": 128}
+
+_tables_ready = False
+
+
+def ensure_index_tables(cur):
+    global _tables_ready
+    if not _tables_ready:
+        cur.execute(JOBS_DDL)
+        cur.execute(JOB_TERMS_DDL)
+        _tables_ready = True
+
+
+def tokenize(text):
+    """'Node.js / C++ developer' -> ['node.js', 'c++', 'developer']"""
+    tokens = re.findall(r"[a-z0-9][a-z0-9+#.]*", str(text or "").lower())
+    tokens = [t.rstrip(".") for t in tokens]
+    return [t for t in tokens if t not in STOPWORDS and (len(t) > 1 or t in SINGLE_CHAR_TERMS) and len(t) <= 64]
+
+
+def _job_text(raw_job, formatted_job):
+    """Everything a skill could be matched against: title, employer, location, description, skills."""
+    highlights = raw_job.get('job_highlights') or {}
+    parts = [
+        formatted_job['job_title'], formatted_job['company_name'], formatted_job['location'],
+        raw_job.get('job_city'), raw_job.get('job_state'), raw_job.get('job_country'),
+        (raw_job.get('job_description') or "")[:MAX_DESCRIPTION_CHARS],
+        " ".join(raw_job.get('job_required_skills') or []),
+        " ".join(highlights.get('Qualifications') or []) if isinstance(highlights, dict) else "",
+    ]
+    return " ".join(str(p) for p in parts if p)
+
+
+def _job_row(job):
+    return tuple(None if job.get(c) is None else (job[c] if c not in JOB_COLUMN_WIDTHS else str(job[c])[:JOB_COLUMN_WIDTHS[c]])
+                 for c in JOB_COLUMNS)
+
+
+def store_jobs(cur, jobs, now=None):
+    """
+    Makes sure formatted jobs from our own JSearch results (e.g. search history) have a `jobs` row.
+    Never pass client-supplied jobs: other users' history and searches read these rows.
+    Existing rows are left alone: they hold the index's own, possibly fresher, copy.
+    """
+    rows = {job['job_id']: job for job in jobs if isinstance(job, dict) and job.get('job_id')}
+    if not rows:
+        return 0
+    now = now or datetime.now()
+    cur.executemany(f"""
+        INSERT INTO jobs ({", ".join(JOB_COLUMNS)}, first_seen_at, last_seen_at)
+        VALUES ({", ".join(["%s"] * (len(JOB_COLUMNS) + 2))})
+        ON DUPLICATE KEY UPDATE job_id = job_id
+    """, [_job_row(job) + (now, now) for job in rows.values()])
+    return len(rows)
+
+
+def ingest_jobs(cur, raw_jobs, format_job, now=None):
+    """
+    Upserts raw JSearch results into `jobs` and rebuilds their `job_terms` postings.
+    format_job: the route's formatter (raw JSearch job -> formatted dict or None).
+    Returns the number of jobs indexed.
+    """
+    now = now or datetime.now()
+    documents = {}
+    for raw_job in raw_jobs:
+        formatted_job = format_job(raw_job)
+        if formatted_job:
+            documents[formatted_job['job_id']] = (formatted_job, _job_text(raw_job, formatted_job))
+    if not documents:
+        return 0
+
+    cur.executemany(f"""
+        INSERT INTO jobs ({", ".join(JOB_COLUMNS)}, first_seen_at, last_seen_at)
+        VALUES ({", ".join(["%s"] * (len(JOB_COLUMNS) + 2))})
+        ON DUPLICATE KEY UPDATE
+            job_title = VALUES(job_title), company_name = VALUES(company_name), location = VALUES(location),
+            job_url = VALUES(job_url), source = VALUES(source), estimated_salary_lpa = VALUES(estimated_salary_lpa),
+            last_seen_at = VALUES(last_seen_at)
+    """, [_job_row(job) + (now, now) for job, _ in documents.values()])
+
+    job_ids = list(documents.keys())
+    for i in range(0, len(job_ids), LOOKUP_CHUNK_SIZE):
+        chunk = job_ids[i:i + LOOKUP_CHUNK_SIZE]
+        cur.execute(f"DELETE FROM job_terms WHERE job_id IN ({', '.join(['%s'] * len(chunk))})", tuple(chunk))
+    postings = []
+    for job_id, (_, text) in documents.items():
+        for term, tf in Counter(tokenize(text)).most_common(MAX_TERMS_PER_JOB):
+            postings.append((term, job_id, min(tf, 32767)))
+    if postings:
+        cur.executemany("INSERT INTO job_terms (term, job_id, tf) VALUES (%s, %s, %s)", postings)
+    return len(documents)
+
+
+def load_jobs(cur, job_ids):
+    """Returns {job_id: formatted job dict} for indexed jobs."""
+    jobs = {}
+    job_ids = list(job_ids)
+    for i in range(0, len(job_ids), LOOKUP_CHUNK_SIZE):
+        chunk = job_ids[i:i + LOOKUP_CHUNK_SIZE]
+        cur.execute(f"""
+            SELECT {", ".join(JOB_COLUMNS)} FROM jobs WHERE job_id IN ({", ".join(["%s"] * len(chunk))})
+        """, tuple(chunk))
+        for row in cur.fetchall():
+            jobs[row['job_id']] = {**row, "recommendation_reason": "Matched from previously indexed job results"}
+    return jobs
+
+
+def search_local(cur, base_query_list, location_list, max_age=LOCAL_INDEX_MAX_AGE, now=None):
+    """
+    Answers a search from the inverted index: jobs seen within max_age that contain every
+    term of a base query and every term of at least one location. Returns formatted jobs.
+    """
+    seen_after = (now or datetime.now()) - max_age
+    location_terms = [set(tokenize(loc)) for loc in location_list]
+    location_terms = [terms for terms in location_terms if terms]
+    matched_ids = []
+    for base_query in base_query_list:
+        terms = sorted(set(tokenize(base_query)))
+        if not terms: continue
+        cur.execute(f"""
+            SELECT jt.job_id FROM job_terms jt JOIN jobs j ON j.job_id = jt.job_id
+            WHERE jt.term IN ({", ".join(["%s"] * len(terms))}) AND j.last_seen_at >= %s
+            GROUP BY jt.job_id HAVING COUNT(DISTINCT jt.term) = %s
+        """, tuple(terms) + (seen_after, len(terms)))
+        candidates = [row['job_id'] for row in cur.fetchall()]
+        if not candidates: continue
+        if location_terms:
+            all_location_terms = sorted(set().union(*location_terms))
+            job_terms = {}
+            for i in range(0, len(candidates), LOOKUP_CHUNK_SIZE):
+                chunk = candidates[i:i + LOOKUP_CHUNK_SIZE]
+                cur.execute(f"""
+                    SELECT job_id, term FROM job_terms
+                    WHERE job_id IN ({", ".join(["%s"] * len(chunk))}) AND term IN ({", ".join(["%s"] * len(all_location_terms))})
+                """, tuple(chunk) + tuple(all_location_terms))
+                for row in cur.fetchall():
+                    job_terms.setdefault(row['job_id'], set()).add(row['term'])
+            candidates = [job_id for job_id in candidates
+                          if any(terms <= job_terms.get(job_id, set()) for terms in location_terms)]
+        matched_ids.extend(candidates)
+    jobs = load_jobs(cur, dict.fromkeys(matched_ids))
+    return [jobs[job_id] for job_id in dict.fromkeys(matched_ids) if job_id in jobs]
+
+
+def rank_jobs(cur, job_ids, skills):
+    """
+    Scores jobs by cosine similarity between TF-IDF job vectors (from job_terms, IDF over the whole
+    index) and the user's skill vector, using NumPy. Returns {job_id: (score, [matched skills])};
+    jobs without indexed terms are left out.
+    """
+    job_ids = list(dict.fromkeys(job_ids))
+    skill_terms = {skill: set(tokenize(skill)) for skill in skills}
+    skill_terms = {skill: terms for skill, terms in skill_terms.items() if terms}
+    if np is None or not job_ids or not skill_terms:
+        return {}
+
+    posting_job, posting_term, posting_tf = [], [], []
+    for i in range(0, len(job_ids), LOOKUP_CHUNK_SIZE):
+        chunk = job_ids[i:i + LOOKUP_CHUNK_SIZE]
+        cur.execute(f"SELECT job_id, term, tf FROM job_terms WHERE job_id IN ({', '.join(['%s'] * len(chunk))})", tuple(chunk))
+        for row in cur.fetchall():
+            posting_job.append(row['job_id']); posting_term.append(row['term']); posting_tf.append(row['tf'])
+    if not posting_term:
+        return {}
+
+    vocab, term_idx = np.unique(np.array(posting_term, dtype=object), return_inverse=True)
+    row_of = {job_id: i for i, job_id in enumerate(job_ids)}
+    job_idx = np.fromiter((row_of[j] for j in posting_job), dtype=np.int64, count=len(posting_job))
+
+    # Document frequencies over the whole index
+    df = np.zeros(len(vocab), dtype=np.float64)
+    col_of = {term: i for i, term in enumerate(vocab)}
+    for i in range(0, len(vocab), LOOKUP_CHUNK_SIZE):
+        chunk = list(vocab[i:i + LOOKUP_CHUNK_SIZE])
+        cur.execute(f"""
+            SELECT term, COUNT(*) AS df FROM job_terms
+            WHERE term IN ({", ".join(["%s"] * len(chunk))}) GROUP BY term
+        """, tuple(chunk))
+        for row in cur.fetchall():
+            df[col_of[row['term']]] = row['df']
+    cur.execute("SELECT COUNT(*) AS n FROM jobs")
+    n_docs = max((cur.fetchone() or {}).get('n') or 0, len(job_ids))
+    idf = np.log((n_docs + 1) / (df + 1)) + 1
+
+    # Sublinear TF-IDF job matrix (jobs x vocab) and the binary TF-IDF skill query vector
+    doc_matrix = np.zeros((len(job_ids), len(vocab)), dtype=np.float64)
+    doc_matrix[job_idx, term_idx] = (1 + np.log(np.asarray(posting_tf, dtype=np.float64))) * idf[term_idx]
+    query = np.zeros(len(vocab), dtype=np.float64)
+    for terms in skill_terms.values():
+        for term in terms:
+            if term in col_of: query[col_of[term]] = idf[col_of[term]]
+    indexed = set(posting_job)
+    query_norm = np.linalg.norm(query)
+    if not query_norm:
+        return {job_id: (0.0, []) for job_id in job_ids if job_id in indexed}
+    doc_norms = np.linalg.norm(doc_matrix, axis=1)
+    scores = (doc_matrix @ query) / np.where(doc_norms > 0, doc_norms * query_norm, 1)
+
+    present = doc_matrix > 0
+    results = {}
+    for job_id, row in row_of.items():
+        if job_id not in indexed: continue
+        matched = [skill for skill, terms in skill_terms.items()
+                   if all(term in col_of and present[row, col_of[term]] for term in terms)]
+        results[job_id] = (float(scores[row]), matched)
+    return results
@@ -0,0 +1,77 @@
+# backend/utils/job_query_planner.py
+import os
+
+# --- Configuration ---
+JSEARCH_CALL_BUDGET = int(os.getenv("JSEARCH_CALL_BUDGET", 10))   # Max live JSearch calls per search (cache hits are free)
+JSEARCH_TARGET_JOBS = int(os.getenv("JSEARCH_TARGET_JOBS", 40))   # Stop searching once this many unique jobs are collected
+MAX_LOCATIONS_PER_QUERY = 3  # Longer "in A or B or C" queries stop matching well
+UNKNOWN_QUERY_YIELD = 10     # Expected results for a never-seen query (one JSearch page), so new queries beat known-poor ones
+
+
+def _dedupe(items):
+    """Case-insensitive dedupe that keeps the first spelling and the original order."""
+    seen = {}
+    for item in items:
+        seen.setdefault(item.lower(), item)
+    return list(seen.values())
+
+
+def _merged_query(base_query, locations):
+    if len(locations) == 1:
+        return f"{base_query} {locations[0]}"
+    return f"{base_query} in {' or '.join(locations)}"
+
+
+def plan_queries(base_query_list, location_list, cache_meta_lookup, budget=JSEARCH_CALL_BUDGET):
+    """
+    Turns base queries x locations into an ordered list of JSearch query strings.
+    - Combinations with a live cache entry are always kept (they cost no API call).
+    - If the remaining combinations exceed `budget`, the locations of each base query are
+      merged into "<base> in A or B" queries (up to MAX_LOCATIONS_PER_QUERY per query).
+    - Whatever still exceeds the budget is dropped, lowest expected yield first.
+    - Queries are ordered by expected yield: past result counts from the cache, or
+      UNKNOWN_QUERY_YIELD for queries never run before.
+    cache_meta_lookup: callable(list of queries) -> {query: {"live", "result_count"}}.
+    Returns {"queries", "cached", "live_calls", "merged", "skipped"}.
+    """
+    base_query_list = _dedupe(base_query_list)
+    location_list = _dedupe(location_list)
+    combos = [(bq, loc) for bq in base_query_list for loc in location_list]
+    meta = cache_meta_lookup([_merged_query(bq, [loc]) for bq, loc in combos])
+
+    def expected_yield(query):
+        entry = meta.get(query)
+        return entry["result_count"] if entry else UNKNOWN_QUERY_YIELD
+
+    cached = [_merged_query(bq, [loc]) for bq, loc in combos if meta.get(_merged_query(bq, [loc]), {}).get("live")]
+    uncached = {}
+    for bq, loc in combos:
+        if _merged_query(bq, [loc]) not in cached:
+            uncached.setdefault(bq, []).append(loc)
+
+    live = [_merged_query(bq, [loc]) for bq, locs in uncached.items() for loc in locs]
+    merged = 0
+    if len(live) > budget and uncached:
+        # Spread the budget over the base queries, then pack each one's locations into that many queries
+        per_base = max(1, budget // len(uncached))
+        live = []
+        for bq, locs in uncached.items():
+            locs = sorted(locs, key=lambda loc: expected_yield(_merged_query(bq, [loc])), reverse=True)
+            groups = max(per_base, -(-len(locs) // MAX_LOCATIONS_PER_QUERY))
+            chunks = [locs[i::groups] for i in range(min(groups, len(locs)))]
+            merged += sum(1 for chunk in chunks if len(chunk) > 1)
+            live.extend(_merged_query(bq, chunk) for chunk in chunks)
+        if merged:
+            meta.update(cache_meta_lookup([q for q in live if q not in meta]))
+
+    live.sort(key=expected_yield, reverse=True)
+    skipped = live[budget:]
+    live = live[:budget]
+    cached.sort(key=expected_yield, reverse=True)
+    return {
+        "queries": cached + live,
+        "cached": len(cached),
+        "live_calls": len(live),
+        "merged": merged,
+        "skipped": skipped,
+    }
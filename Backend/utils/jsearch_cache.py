@@ -0,0 +1,180 @@
+# backend/utils/jsearch_cache.py
+import os
+import re
+import json
+import hashlib
+import threading
+from datetime import datetime, timedelta
+
+# --- Configuration ---
+# Job listings change slowly, so the same query can be answered from the cache for hours
+JSEARCH_CACHE_TTL = timedelta(seconds=int(os.getenv("JSEARCH_CACHE_TTL_SECONDS", 6 * 3600)))
+LOOKUP_CHUNK_SIZE = 200
+
+JSEARCH_CACHE_DDL = """
+    CREATE TABLE IF NOT EXISTS jsearch_cache (
+        cache_key CHAR(64) NOT NULL PRIMARY KEY,
+        query_text VARCHAR(512) NOT NULL,
+        params VARCHAR(512) NOT NULL,
+        response LONGTEXT NOT NULL,
+        result_count INT NOT NULL DEFAULT 0,
+        fetched_at DATETIME NOT NULL,
+        expires_at DATETIME NOT NULL,
+        hit_count INT NOT NULL DEFAULT 0,
+        last_hit_at DATETIME,
+        INDEX idx_jsearch_cache_expires (expires_at)
+    )
+"""
+
+
+class CacheStats:
+    """Per-process hit/miss counters (the shared, cross-worker view is jsearch_cache.hit_count)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.errors = 0
+
+    def add(self, hits=0, misses=0, stores=0, errors=0):
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+            self.stores += stores
+            self.errors += errors
+
+    def snapshot(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits, "misses": self.misses, "stores": self.stores, "errors": self.errors,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None
+            }
+
+
+stats = CacheStats()
+_table_ready = False
+
+
+def normalize_query(query):
+    """'  Python Developer   india ' -> 'python developer india'"""
+    return re.sub(r'\s+', ' ', str(query or '')).strip().lower()
+
+
+def cache_key(query, params):
+    payload = json.dumps({"query": normalize_query(query), "params": params}, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def ensure_cache_table(cur):
+    global _table_ready
+    if not _table_ready: # Once per process is enough
+        cur.execute(JSEARCH_CACHE_DDL)
+        _table_ready = True
+
+
+def get_many(cur, queries, params, now=None):
+    """
+    Returns {query: jobs list} for the queries that have a live cache entry,
+    and bumps their hit counters. Queries missing from the result are misses.
+    """
+    now = now or datetime.now()
+    found = {}
+    queries = list(queries)
+    for i in range(0, len(queries), LOOKUP_CHUNK_SIZE):
+        key_to_queries = {}
+        for query in queries[i:i + LOOKUP_CHUNK_SIZE]:
+            key_to_queries.setdefault(cache_key(query, params), []).append(query)
+        placeholders = ", ".join(["%s"] * len(key_to_queries))
+        cur.execute(f"""
+            SELECT cache_key, response FROM jsearch_cache
+            WHERE cache_key IN ({placeholders}) AND expires_at > %s
+        """, tuple(key_to_queries.keys()) + (now,))
+        hit_keys = []
+        for row in cur.fetchall():
+            try:
+                jobs = json.loads(row['response'])
+            except (json.JSONDecodeError, TypeError):
+                continue
+            hit_keys.append(row['cache_key'])
+            for query in key_to_queries[row['cache_key']]:
+                found[query] = jobs
+        if hit_keys:
+            cur.execute(f"""
+                UPDATE jsearch_cache SET hit_count = hit_count + 1, last_hit_at = %s
+                WHERE cache_key IN ({", ".join(["%s"] * len(hit_keys))})
+            """, (now,) + tuple(hit_keys))
+    stats.add(hits=len(found), misses=len(queries) - len(found))
+    return found
+
+
+def lookup_meta(cur, queries, params, now=None):
+    """
+    Planner view of the cache, without counting as hits: {query: {"live": bool, "result_count": int}}
+    for queries seen before. Expired rows still tell how many results a query used to return.
+    """
+    now = now or datetime.now()
+    meta = {}
+    queries = list(queries)
+    for i in range(0, len(queries), LOOKUP_CHUNK_SIZE):
+        key_to_queries = {}
+        for query in queries[i:i + LOOKUP_CHUNK_SIZE]:
+            key_to_queries.setdefault(cache_key(query, params), []).append(query)
+        placeholders = ", ".join(["%s"] * len(key_to_queries))
+        cur.execute(f"""
+            SELECT cache_key, result_count, expires_at > %s AS live FROM jsearch_cache
+            WHERE cache_key IN ({placeholders})
+        """, (now,) + tuple(key_to_queries.keys()))
+        for row in cur.fetchall():
+            for query in key_to_queries[row['cache_key']]:
+                meta[query] = {"live": bool(row['live']), "result_count": int(row['result_count'] or 0)}
+    return meta
+
+
+def put_many(cur, results, params, now=None):
+    """Stores {query: jobs list} fresh API responses. Failed calls must not be passed in."""
+    if not results:
+        return
+    now = now or datetime.now()
+    expires_at = now + JSEARCH_CACHE_TTL
+    params_text = json.dumps(params, sort_keys=True)
+    rows = [(cache_key(query, params), normalize_query(query)[:512], params_text, json.dumps(jobs),
+             len(jobs), now, expires_at) for query, jobs in results.items()]
+    cur.executemany("""
+        INSERT INTO jsearch_cache (cache_key, query_text, params, response, result_count, fetched_at, expires_at)
+        VALUES (%s, %s, %s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            response = VALUES(response), result_count = VALUES(result_count),
+            fetched_at = VALUES(fetched_at), expires_at = VALUES(expires_at)
+    """, rows)
+    stats.add(stores=len(rows))
+
+
+def purge_expired(cur, now=None):
+    cur.execute("DELETE FROM jsearch_cache WHERE expires_at <= %s", (now or datetime.now(),))
+    return cur.rowcount
+
+
+def shared_stats(cur, now=None):
+    """Cache-wide numbers across all workers, plus the most reused queries."""
+    now = now or datetime.now()
+    cur.execute("""
+        SELECT COUNT(*) AS entries, COALESCE(SUM(expires_at > %s), 0) AS live_entries,
+               COALESCE(SUM(hit_count), 0) AS total_hits
+        FROM jsearch_cache
+    """, (now,))
+    summary = cur.fetchone() or {}
+    cur.execute("""
+        SELECT query_text, hit_count, result_count, fetched_at FROM jsearch_cache
+        ORDER BY hit_count DESC LIMIT 10
+    """)
+    top_queries = cur.fetchall()
+    for row in top_queries:
+        if row.get('fetched_at'): row['fetched_at'] = row['fetched_at'].strftime('%Y-%m-%d %H:%M:%S')
+    return {
+        "entries": int(summary.get('entries') or 0),
+        "live_entries": int(summary.get('live_entries') or 0),
+        "total_hits": int(summary.get('total_hits') or 0),
+        "top_queries": top_queries,
+    }
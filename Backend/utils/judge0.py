@@ -0,0 +1,268 @@
+# backend/utils/judge0.py
+import os
+import time
+import threading
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+import requests
+from utils import http_client
+
+# --- Endpoint Configuration ---
+# JUDGE0_BASE_URL points at the public CE instance by default; set it to a self-hosted
+# Judge0 container (e.g. http://localhost:2358) to avoid public rate limits.
+JUDGE0_API_URL = os.getenv("JUDGE0_BASE_URL", "https://ce.judge0.com").rstrip("/")
+JUDGE0_AUTH_TOKEN = os.getenv("JUDGE0_AUTH_TOKEN") # Sent as X-Auth-Token when the instance requires it
+
+# --- Batch Configuration ---
+BATCH_MAX_WAIT = 25        # Give up on unfinished submissions after this many seconds
+BATCH_MAX_SIZE = 20        # Judge0's default max_submissions_batch_size
+
+# --- Polling Backoff ---
+# Short programs finish in well under a second, so poll quickly at first and back off
+# for slow ones instead of hammering the instance at a fixed rate.
+POLL_INITIAL_DELAY = 0.2
+POLL_BACKOFF_FACTOR = 1.5
+POLL_MAX_DELAY = 2.0
+
+# --- Execution Queue ---
+MAX_ACTIVE_EXECUTIONS = int(os.getenv("JUDGE0_MAX_CONCURRENCY", "8")) # Per worker, across all users
+MAX_ACTIVE_PER_USER = 2
+MAX_WAITING = 50           # Requests queued beyond this are rejected instead of piling up
+QUEUE_WAIT_TIMEOUT = 15    # Seconds a request may wait for a slot
+
+# Judge0 status ids: 1 = In Queue, 2 = Processing, everything above is a final state
+STATUS_ACCEPTED = 3
+PENDING_STATUS_IDS = (1, 2)
+
+RESULT_FIELDS = "token,stdout,stderr,compile_output,message,status,time,memory"
+
+
+class QueueFullError(Exception):
+    """Raised when too many executions are already waiting for a slot."""
+
+
+class QueueTimeoutError(Exception):
+    """Raised when an execution waited longer than QUEUE_WAIT_TIMEOUT for a slot."""
+
+
+def _headers():
+    headers = {"Content-Type": "application/json"}
+    if JUDGE0_AUTH_TOKEN:
+        headers["X-Auth-Token"] = JUDGE0_AUTH_TOKEN
+    return headers
+
+
+def _chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _payload(submission):
+    return {
+        "language_id": submission["language_id"],
+        "source_code": submission["source_code"],
+        "stdin": submission.get("stdin", "") or ""
+    }
+
+
+def is_finished(result):
+    return isinstance(result, dict) and (result.get("status") or {}).get("id") not in PENDING_STATUS_IDS
+
+
+# --- Submissions ---
+def submit(language_id, source_code, stdin=""):
+    """Creates one submission without waiting for it (wait=false) and returns its token."""
+    response = http_client.post(
+        "judge0", f"{JUDGE0_API_URL}/submissions?base64_encoded=false&wait=false",
+        json=_payload({"language_id": language_id, "source_code": source_code, "stdin": stdin}),
+        headers=_headers(), timeout=10
+    )
+    response.raise_for_status()
+    token = response.json().get("token")
+    if not token:
+        raise ValueError(f"Judge0 returned no token: {response.text[:200]}")
+    return token
+
+
+def submit_batch(submissions):
+    """
+    Creates submissions with one /submissions/batch call per BATCH_MAX_SIZE.
+    Returns a list of tokens in the same order (None where Judge0 rejected an item).
+    """
+    tokens = [None] * len(submissions)
+    for chunk_start, chunk in zip(range(0, len(submissions), BATCH_MAX_SIZE), _chunks(submissions, BATCH_MAX_SIZE)):
+        try:
+            response = http_client.post(
+                "judge0", f"{JUDGE0_API_URL}/submissions/batch?base64_encoded=false",
+                json={"submissions": [_payload(s) for s in chunk]}, headers=_headers(), timeout=15
+            )
+            response.raise_for_status()
+            created = response.json()
+        except (requests.exceptions.RequestException, ValueError) as e:
+            print(f"❌ Error creating Judge0 batch submission: {e}")
+            continue
+
+        for offset, item in enumerate(created if isinstance(created, list) else []):
+            token = item.get("token") if isinstance(item, dict) else None
+            if token:
+                tokens[chunk_start + offset] = token
+            else:
+                print(f"⚠️ Judge0 rejected batch item {chunk_start + offset}: {item}")
+    return tokens
+
+
+def fetch_results(tokens):
+    """One non-blocking status check for many tokens. Returns {token: result} (finished or not)."""
+    results = {}
+    for token_chunk in _chunks(list(tokens), BATCH_MAX_SIZE):
+        try:
+            response = http_client.get(
+                "judge0", f"{JUDGE0_API_URL}/submissions/batch",
+                params={"tokens": ",".join(token_chunk), "base64_encoded": "false", "fields": RESULT_FIELDS},
+                headers=_headers(), timeout=10
+            )
+            response.raise_for_status()
+            polled = response.json().get("submissions", [])
+        except (requests.exceptions.RequestException, ValueError) as e:
+            print(f"⚠️ Error polling Judge0 batch: {e}")
+            continue
+        for result in polled:
+            if isinstance(result, dict) and result.get("token"):
+                results[result["token"]] = result
+    return results
+
+
+def poll(tokens, max_wait=BATCH_MAX_WAIT):
+    """
+    Polls all tokens together with exponential backoff until they finish or max_wait elapses.
+    Returns {token: result} for the finished ones only.
+    """
+    pending = set(t for t in tokens if t)
+    finished = {}
+    delay = POLL_INITIAL_DELAY
+    deadline = time.monotonic() + max_wait
+    while pending:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        time.sleep(min(delay, remaining))
+        delay = min(delay * POLL_BACKOFF_FACTOR, POLL_MAX_DELAY)
+        for token, result in fetch_results(pending).items():
+            if token in pending and is_finished(result):
+                finished[token] = result
+                pending.discard(token)
+    return finished
+
+
+def run_batch(submissions, max_wait=BATCH_MAX_WAIT):
+    """
+    Sends all submissions to Judge0 in batch calls and polls every outstanding token
+    together until they finish or max_wait elapses.
+
+    submissions: list of {"language_id", "source_code", "stdin"} dicts.
+    Returns a list of result dicts in the same order; an entry is None if that
+    submission could not be created or did not finish in time.
+    """
+    if not submissions:
+        return []
+    tokens = submit_batch(submissions)
+    finished = poll(tokens, max_wait)
+    unfinished = sum(1 for t in tokens if t and t not in finished)
+    if unfinished:
+        print(f"⚠️ {unfinished} Judge0 submission(s) did not finish within {max_wait}s.")
+    return [finished.get(t) if t else None for t in tokens]
+
+
+# --- Fair Execution Queue ---
+class ExecutionQueue:
+    """
+    Bounds concurrent Judge0 executions per worker. Each user holds at most per_user slots,
+    and freed slots go to waiting users round-robin, so one user clicking Run repeatedly
+    cannot starve everyone else.
+    """
+
+    def __init__(self, max_active=MAX_ACTIVE_EXECUTIONS, per_user=MAX_ACTIVE_PER_USER,
+                 max_waiting=MAX_WAITING, wait_timeout=QUEUE_WAIT_TIMEOUT):
+        self.max_active = max_active
+        self.per_user = per_user
+        self.max_waiting = max_waiting
+        self.wait_timeout = wait_timeout
+        self._cond = threading.Condition()
+        self._active = 0
+        self._active_by_user = {}
+        self._waiting = OrderedDict() # user_id -> deque of tickets; order is the round-robin turn
+        self._waiting_count = 0
+        self._granted = set()
+        self.rejected = 0
+        self.timed_out = 0
+
+    def _dispatch(self):
+        granted = False
+        while self._active < self.max_active:
+            user_id = next((u for u in self._waiting if self._active_by_user.get(u, 0) < self.per_user), None)
+            if user_id is None:
+                break
+            tickets = self._waiting.pop(user_id)
+            self._granted.add(tickets.popleft())
+            self._waiting_count -= 1
+            self._active += 1
+            self._active_by_user[user_id] = self._active_by_user.get(user_id, 0) + 1
+            if tickets:
+                self._waiting[user_id] = tickets # Back of the line for this user's next request
+            granted = True
+        if granted:
+            self._cond.notify_all()
+
+    def _withdraw(self, user_id, ticket):
+        tickets = self._waiting.get(user_id)
+        if tickets and ticket in tickets:
+            tickets.remove(ticket)
+            self._waiting_count -= 1
+            if not tickets:
+                del self._waiting[user_id]
+
+    @contextmanager
+    def slot(self, user_id):
+        """Waits for an execution slot for user_id; raises QueueFullError / QueueTimeoutError."""
+        ticket = object()
+        with self._cond:
+            if self._waiting_count >= self.max_waiting:
+                self.rejected += 1
+                raise QueueFullError("Too many code executions are queued.")
+            self._waiting.setdefault(user_id, deque()).append(ticket)
+            self._waiting_count += 1
+            self._dispatch()
+            deadline = time.monotonic() + self.wait_timeout
+            while ticket not in self._granted:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._withdraw(user_id, ticket)
+                    self.timed_out += 1
+                    raise QueueTimeoutError("Timed out waiting for a code execution slot.")
+                self._cond.wait(remaining)
+            self._granted.discard(ticket)
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._active -= 1
+                self._active_by_user[user_id] -= 1
+                if not self._active_by_user[user_id]:
+                    del self._active_by_user[user_id]
+                self._dispatch()
+
+    def stats(self):
+        with self._cond:
+            return {"active": self._active, "waiting": self._waiting_count, "max_active": self.max_active,
+                    "per_user": self.per_user, "rejected": self.rejected, "timed_out": self.timed_out}
+
+
+execution_queue = ExecutionQueue()
+
+
+def normalize_output(text):
+    """Normalizes program output for comparison (line endings and trailing whitespace)."""
+    if not isinstance(text, str):
+        return ""
+    lines = [line.rstrip() for line in text.replace("\r\n", "\n").strip().split("\n")]
+    return "\n".join(lines)
@@ -1,9 +1,11 @@
 # backend/utils/language_map.py
 import requests
 import re
+from utils import http_client
+from utils.judge0 import JUDGE0_API_URL
 
 JUDGE0_LANGUAGE_MAP = {}
-JUDGE0_LANGUAGES_ENDPOINT = "https://ce.judge0.com/languages"
+JUDGE0_LANGUAGES_ENDPOINT = f"{JUDGE0_API_URL}/languages"
 
 def fetch_and_build_map():
     """
@@ -15,7 +17,7 @@ def fetch_and_build_map():
     
     try:
         print("Fetching Judge0 language list...")
-        response = requests.get(JUDGE0_LANGUAGES_ENDPOINT, timeout=10)
+        response = http_client.get("judge0", JUDGE0_LANGUAGES_ENDPOINT, timeout=10)
         response.raise_for_status()
         languages = response.json()
         
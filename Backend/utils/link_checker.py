@@ -0,0 +1,198 @@
+# backend/utils/link_checker.py
+import threading
+import time
+import concurrent.futures
+from urllib.parse import urlparse
+import requests
+from utils import http_client
+
+# --- Configuration ---
+CHECK_TIMEOUT = 10
+USER_AGENT = "AI Career Guider Link Checker/1.0"
+DEFAULT_MAX_WORKERS = 16
+PER_HOST_CONCURRENCY = 2      # Max in-flight requests to one host
+PER_HOST_MIN_INTERVAL = 0.5   # Min seconds between request starts to one host (replaces the global sleep)
+# Servers that answer HEAD with these codes often serve GET fine, so retry with a ranged GET
+HEAD_FALLBACK_STATUSES = {400, 403, 405, 501}
+
+
+class HostThrottle:
+    """Per-host concurrency and rate limiting shared by all checker threads."""
+
+    def __init__(self, max_concurrency=PER_HOST_CONCURRENCY, min_interval=PER_HOST_MIN_INTERVAL):
+        self.max_concurrency = max_concurrency
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._semaphores = {}
+        self._next_start = {}
+
+    def _semaphore_for(self, host):
+        with self._lock:
+            if host not in self._semaphores:
+                self._semaphores[host] = threading.BoundedSemaphore(self.max_concurrency)
+            return self._semaphores[host]
+
+    def _wait_turn(self, host):
+        # Reserve the next start slot for this host, then sleep outside the lock
+        with self._lock:
+            now = time.monotonic()
+            start_at = max(now, self._next_start.get(host, 0))
+            self._next_start[host] = start_at + self.min_interval
+        delay = start_at - now
+        if delay > 0:
+            time.sleep(delay)
+
+    def run(self, host, func, *args, **kwargs):
+        semaphore = self._semaphore_for(host)
+        with semaphore:
+            self._wait_turn(host)
+            return func(*args, **kwargs)
+
+
+class HostLatencyStats:
+    """Thread-safe per-host request counters and latencies for run reports."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._hosts = {}
+
+    def record(self, host, seconds, ok):
+        with self._lock:
+            entry = self._hosts.setdefault(host, {"requests": 0, "failures": 0, "total_ms": 0.0, "max_ms": 0.0})
+            ms = seconds * 1000
+            entry["requests"] += 1
+            entry["failures"] += 0 if ok else 1
+            entry["total_ms"] += ms
+            entry["max_ms"] = max(entry["max_ms"], ms)
+
+    def summary(self):
+        with self._lock:
+            return {
+                host: {
+                    "requests": e["requests"], "failures": e["failures"],
+                    "avg_ms": round(e["total_ms"] / e["requests"], 1), "max_ms": round(e["max_ms"], 1)
+                }
+                for host, e in self._hosts.items()
+            }
+
+
+def _fetch(url, headers):
+    """HEAD first; fall back to a ranged GET for servers that reject HEAD.
+       Goes through the shared 'links' upstream (pooled, no retries, circuit breaker or cookies,
+       so one Session is safe across all checker threads)."""
+    headers = {'User-Agent': USER_AGENT, **headers}
+    response = http_client.request("links", "HEAD", url, timeout=CHECK_TIMEOUT, allow_redirects=True, headers=headers)
+    response.close()
+    if response.status_code not in HEAD_FALLBACK_STATUSES:
+        return response
+    # Only ask for the first byte so we don't download the whole page
+    response = http_client.request("links", "GET", url, timeout=CHECK_TIMEOUT, allow_redirects=True,
+                                   headers={**headers, 'Range': 'bytes=0-0'}, stream=True)
+    response.close()
+    return response
+
+
+def check_url_detailed(url, throttle=None, log=print, etag=None, last_modified=None, stats=None):
+    """
+    Checks URL validity, sending If-None-Match / If-Modified-Since when validators are known
+    (a 304 counts as valid). Returns (is_valid, status_code_or_error, etag, last_modified).
+    """
+    host = urlparse(url).netloc.lower()
+
+    def _timed_fetch(url, headers):
+        # Timed inside the throttle so per-host latency excludes time spent waiting for a slot
+        started = time.monotonic()
+        try:
+            response = _fetch(url, headers)
+        except Exception:
+            if stats: stats.record(host, time.monotonic() - started, False)
+            raise
+        if stats: stats.record(host, time.monotonic() - started, 200 <= response.status_code < 400)
+        return response
+
+    headers = {}
+    if etag: headers['If-None-Match'] = etag
+    if last_modified: headers['If-Modified-Since'] = last_modified
+    try:
+        if throttle:
+            response = throttle.run(host, _timed_fetch, url, headers)
+        else:
+            response = _timed_fetch(url, headers)
+        status_code = response.status_code
+        status = str(status_code) # Ensure status is string
+        # A 304 carries no new validators, so keep the ones we sent
+        new_etag = response.headers.get('ETag') or etag
+        new_last_modified = response.headers.get('Last-Modified') or last_modified
+        if 200 <= status_code < 400:
+            return True, status, new_etag, new_last_modified
+        log(f"    INVALID Status: {status} for URL: {url}")
+        return False, status, None, None
+    except requests.exceptions.Timeout:
+        log(f"    TIMEOUT Error for URL: {url}")
+        return False, "Timeout", None, None
+    except requests.exceptions.RequestException as e:
+        error_str = f"Request Error ({type(e).__name__})"
+        log(f"    {error_str} for URL: {url} - {e}")
+        return False, error_str, None, None
+    except Exception as e:
+        error_str = f"Other Error ({type(e).__name__})"
+        log(f"    UNEXPECTED Error checking URL {url}: {e}")
+        return False, error_str, None, None
+
+
+def check_url(url, throttle=None, log=print):
+    """Checks URL validity. Returns (is_valid: bool, status_code_or_error: str)"""
+    is_valid, status, _, _ = check_url_detailed(url, throttle=throttle, log=log)
+    return is_valid, status
+
+
+def check_urls(urls, max_workers=DEFAULT_MAX_WORKERS, sequential=False, throttle=None, log=print, validators=None,
+               stats=None, deadline=None, progress=None):
+    """
+    Checks many URLs and returns {url: (is_valid, status, etag, last_modified)}.
+    validators: optional {url: (etag, last_modified)} used for conditional requests.
+    stats: optional HostLatencyStats that collects per-host latency.
+    deadline: optional overall budget in seconds; URLs not finished in time are left out of the
+    result (in-flight requests finish in the background without being waited for).
+    progress: optional callable run in the calling thread after every finished URL (e.g. to
+    renew a lease during a long check phase).
+    Both modes use the same check_url_detailed and per-host throttle, so they produce the
+    same results; the concurrent mode just overlaps requests to different hosts.
+    """
+    throttle = throttle or HostThrottle()
+    validators = validators or {}
+    progress = progress or (lambda: None)
+    results = {}
+    started = time.monotonic()
+    if sequential or max_workers <= 1:
+        for i, url in enumerate(urls):
+            if deadline is not None and time.monotonic() - started >= deadline:
+                log(f"  Deadline of {deadline}s reached; {len(urls) - i} link(s) left unchecked.")
+                break
+            log(f"  Checking link {i+1}/{len(urls)}: {url}")
+            etag, last_modified = validators.get(url, (None, None))
+            results[url] = check_url_detailed(url, throttle, log, etag, last_modified, stats)
+            progress()
+        return results
+
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        future_to_url = {
+            executor.submit(check_url_detailed, url, throttle, log, *validators.get(url, (None, None)), stats): url
+            for url in urls
+        }
+        try:
+            for done_count, future in enumerate(concurrent.futures.as_completed(future_to_url, timeout=deadline), start=1):
+                url = future_to_url[future]
+                try:
+                    results[url] = future.result()
+                except Exception as e:
+                    results[url] = (False, f"Other Error ({type(e).__name__})", None, None)
+                if done_count % 50 == 0 or done_count == len(urls):
+                    log(f"  Checked {done_count}/{len(urls)} links...")
+                progress()
+        except concurrent.futures.TimeoutError:
+            log(f"  Deadline of {deadline}s reached; {len(urls) - len(results)} link(s) left unchecked.")
+    finally:
+        executor.shutdown(wait=deadline is None, cancel_futures=True)
+    return results
@@ -0,0 +1,411 @@
+# backend/utils/local_runner.py
+import os
+import re
+import sys
+import json
+import shutil
+import signal
+import tempfile
+import threading
+import subprocess
+
+try:
+    import resource
+except ImportError:
+    resource = None # Not available on Windows; the local runner then reports every language as unsupported
+
+# --- Local Code Execution ---
+# Runs practice code as a child process on this machine instead of a round trip to Judge0.
+# Each run gets a fresh working directory (on tmpfs when available), rlimits for CPU time,
+# address space and file size, a wall-clock timeout and capped stdout/stderr.
+# rlimits are not isolation: a child running as the backend's user can read its files (.env,
+# SECRET_KEY) and use its network. The runner therefore refuses to run anything unless either
+#   LOCAL_RUNNER_UID / LOCAL_RUNNER_GID name a dedicated unprivileged account that children drop
+#   to (the backend must start as root; give that account no read access to the app directory
+#   and block its network, e.g. iptables -A OUTPUT -m owner --uid-owner <uid> -j REJECT), or
+#   LOCAL_RUNNER_UNSAFE_DEV=1 is set on a single-user development machine.
+CPU_TIME_LIMIT = 5           # Seconds of CPU per run
+WALL_TIME_LIMIT = 10         # Seconds, covers sleeping / blocked programs
+MEMORY_LIMIT_MB = 256
+MAX_OUTPUT_BYTES = 64 * 1024 # Per stream; the run is killed once exceeded
+MAX_FILE_BYTES = 1024 * 1024 # Files the program itself writes into its working directory
+COMPILE_TIME_LIMIT = 20
+COMPILE_FILE_BYTES = 64 * 1024 * 1024
+WARM_PROCESSES = int(os.getenv("LOCAL_RUNNER_WARM_PROCESSES", "2")) # Idle interpreters kept per language
+WORK_ROOT = os.getenv("LOCAL_RUNNER_TMPDIR") or ("/dev/shm" if os.access("/dev/shm", os.W_OK) else None)
+RUNNER_UID = int(os.getenv("LOCAL_RUNNER_UID")) if os.getenv("LOCAL_RUNNER_UID") else None
+RUNNER_GID = int(os.getenv("LOCAL_RUNNER_GID")) if os.getenv("LOCAL_RUNNER_GID") else RUNNER_UID
+UNSAFE_DEV = os.getenv("LOCAL_RUNNER_UNSAFE_DEV") == "1"
+
+# Judge0 status ids, so results look the same whichever backend ran them
+STATUS_DESCRIPTIONS = {
+    3: "Accepted", 5: "Time Limit Exceeded", 6: "Compilation Error", 7: "Runtime Error (SIGSEGV)",
+    8: "Runtime Error (SIGXFSZ)", 9: "Runtime Error (SIGFPE)", 10: "Runtime Error (SIGABRT)",
+    11: "Runtime Error (NZEC)", 12: "Runtime Error (Other)", 13: "Internal Error",
+}
+SIGNAL_STATUS = {signal.SIGSEGV: 7, signal.SIGFPE: 9, signal.SIGABRT: 10}
+if hasattr(signal, "SIGXFSZ"):
+    SIGNAL_STATUS[signal.SIGXFSZ] = 8
+
+# Interpreters are started ahead of time and block reading a job description from the fd given
+# as their last argument, so a run skips interpreter start-up. Each process runs one job only.
+PYTHON_BOOTSTRAP = """
+import os, sys, json, traceback
+with os.fdopen(int(sys.argv[1]), 'rb') as control:
+    job = json.loads(control.read() or b'null')
+if not job: sys.exit(0)
+os.chdir(job['cwd'])
+sys.path.insert(0, job['cwd'])
+sys.argv = [job['main']]
+with open(job['main'], encoding='utf-8') as f:
+    source = f.read()
+del control, f
+try:
+    exec(compile(source, job['main'], 'exec'), {'__name__': '__main__', '__builtins__': __builtins__})
+except SystemExit:
+    raise
+except BaseException as e:
+    traceback.print_exception(type(e), e, e.__traceback__.tb_next)
+    sys.exit(1)
+"""
+NODE_BOOTSTRAP = (
+    "const fs = require('fs'), path = require('path');"
+    "const job = JSON.parse(fs.readFileSync(Number(process.argv[1]), 'utf8') || 'null');"
+    "if (job) { process.chdir(job.cwd); process.argv = [process.argv[0], path.join(job.cwd, job.main)];"
+    " require(path.join(job.cwd, job.main)); }"
+)
+
+# warm:    interpreter argv (the control fd is appended); the source file is run by the bootstrap
+# compile: compiler argv, run in the working directory; then run: the program's argv
+# limit_address_space: JVM and V8 reserve far more virtual memory than they use, so they are
+#                      bounded by their own heap flags instead of RLIMIT_AS
+LANGUAGES = {
+    "python": {"file": "main.py", "warm": [sys.executable, "-I", "-c", PYTHON_BOOTSTRAP],
+               "limit_address_space": True},
+    "javascript": {"file": "main.js", "warm": ["node", f"--max-old-space-size={MEMORY_LIMIT_MB}", "-e", NODE_BOOTSTRAP],
+                   "limit_address_space": False},
+    "c": {"file": "main.c", "compile": ["gcc", "-O2", "-o", "main", "main.c", "-lm"], "run": ["./main"],
+          "limit_address_space": True},
+    "cpp": {"file": "main.cpp", "compile": ["g++", "-O2", "-std=c++17", "-o", "main", "main.cpp"], "run": ["./main"],
+            "limit_address_space": True},
+    "java": {"file": "Main.java", "compile": ["javac", "-J-Xmx512m", "Main.java"],
+             "run": ["java", f"-Xmx{MEMORY_LIMIT_MB}m", "-Xss64m", "-cp", ".", "Main"],
+             "limit_address_space": False},
+}
+LANGUAGE_ALIASES = {"python3": "python", "py": "python", "js": "javascript", "node.js": "javascript", "node": "javascript",
+                    "c++": "cpp"}
+
+_available = {}
+_isolation = None
+
+
+def isolation():
+    """How children are isolated: "uid", "unsafe-dev", or None when the runner must not be used."""
+    global _isolation
+    if _isolation is None:
+        if RUNNER_UID is not None:
+            if RUNNER_UID == 0 or RUNNER_GID == 0:
+                print("❌ LOCAL_RUNNER_UID/GID must not be root. Local code execution is disabled.")
+                _isolation = ""
+            elif not hasattr(os, "geteuid") or os.geteuid() != 0:
+                print("❌ LOCAL_RUNNER_UID is set but the backend is not running as root, so it cannot "
+                      "drop to it. Local code execution is disabled.")
+                _isolation = ""
+            else:
+                _isolation = "uid"
+        elif UNSAFE_DEV:
+            print("⚠️ LOCAL_RUNNER_UNSAFE_DEV=1: submitted code runs as the backend's own user with its "
+                  "file and network access. Never set this on a shared or public deployment.")
+            _isolation = "unsafe-dev"
+        else:
+            print("❌ Local code execution needs LOCAL_RUNNER_UID (dedicated unprivileged account) or "
+                  "LOCAL_RUNNER_UNSAFE_DEV=1 (development only). Using Judge0 instead.")
+            _isolation = ""
+    return _isolation or None
+
+
+def normalize_language(language):
+    key = (language or "").strip().lower()
+    return LANGUAGE_ALIASES.get(key, key)
+
+
+def supports(language):
+    """True if this machine can run the language locally (isolation configured, Linux rlimits, toolchain on PATH)."""
+    language = normalize_language(language)
+    if language not in _available:
+        spec = LANGUAGES.get(language)
+        ok = bool(spec) and resource is not None and sys.platform.startswith("linux") and isolation() is not None
+        if ok:
+            tools = [spec["warm"][0]] if "warm" in spec else [spec["compile"][0], spec["run"][0]]
+            ok = all(os.path.isabs(t) and os.path.exists(t) or shutil.which(t) for t in tools if not t.startswith("./"))
+        _available[language] = ok
+    return _available[language]
+
+
+# --- Limits ---
+def _limits(cpu_seconds, file_bytes, address_space):
+    limits = [
+        (resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds + 1)), # SIGXCPU at the soft limit, SIGKILL at the hard one
+        (resource.RLIMIT_FSIZE, (file_bytes, file_bytes)),
+        (resource.RLIMIT_CORE, (0, 0)),
+    ]
+    if address_space:
+        memory = MEMORY_LIMIT_MB * 1024 * 1024
+        limits.append((resource.RLIMIT_AS, (memory, memory)))
+    return limits
+
+
+def _set_limits_in_child(limits):
+    def preexec():
+        for limit, value in limits:
+            resource.setrlimit(limit, value)
+    return preexec
+
+
+def _sandbox_env(home):
+    return {"PATH": os.environ.get("PATH", "/usr/local/bin:/usr/bin:/bin"), "HOME": home, "LANG": "C.UTF-8"}
+
+
+def _child_user():
+    """Popen arguments that drop the child to the runner account (none in unsafe dev mode)."""
+    if isolation() != "uid":
+        return {}
+    return {"user": RUNNER_UID, "group": RUNNER_GID, "extra_groups": []}
+
+
+def _give_to_runner(*paths):
+    if isolation() == "uid":
+        for path in paths:
+            os.chown(path, RUNNER_UID, RUNNER_GID)
+
+
+# --- Pre-started Interpreters ---
+class _WarmPool:
+    """A few idle interpreter processes per language, refilled in the background after each take()."""
+
+    def __init__(self, language, size):
+        self.language = language
+        self.size = size
+        self._idle = [] # (proc, control write fd)
+        self._lock = threading.Lock()
+        self._refilling = False
+        self._pid = os.getpid()
+
+    def _spawn(self):
+        spec = LANGUAGES[self.language]
+        read_fd, write_fd = os.pipe()
+        try:
+            proc = subprocess.Popen(
+                spec["warm"] + [str(read_fd)],
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                pass_fds=(read_fd,), cwd=WORK_ROOT or tempfile.gettempdir(),
+                env=_sandbox_env(WORK_ROOT or tempfile.gettempdir()), start_new_session=True, **_child_user(),
+                # Set in the child: prlimit() on a process of another uid needs CAP_SYS_RESOURCE
+                preexec_fn=_set_limits_in_child(_limits(CPU_TIME_LIMIT, MAX_FILE_BYTES, spec["limit_address_space"]))
+            )
+        except OSError:
+            os.close(write_fd)
+            raise
+        finally:
+            os.close(read_fd)
+        return proc, write_fd
+
+    def take(self):
+        with self._lock:
+            if self._pid != os.getpid(): # Forked worker: the idle processes belong to the parent
+                self._idle, self._pid = [], os.getpid()
+            while self._idle:
+                proc, write_fd = self._idle.pop()
+                if proc.poll() is None:
+                    break
+                os.close(write_fd)
+            else:
+                proc = None
+            if self.size > 0 and not self._refilling:
+                self._refilling = True
+                threading.Thread(target=self._refill, name=f"WarmPool-{self.language}", daemon=True).start()
+        return (proc, write_fd) if proc else self._spawn()
+
+    def _refill(self):
+        try:
+            while True:
+                with self._lock:
+                    if len(self._idle) >= self.size:
+                        return
+                spawned = self._spawn()
+                with self._lock:
+                    self._idle.append(spawned)
+        except OSError as e:
+            print(f"⚠️ Could not pre-start a {self.language} interpreter: {e}")
+        finally:
+            with self._lock:
+                self._refilling = False
+
+    def stats(self):
+        with self._lock:
+            return {"language": self.language, "idle": len(self._idle), "size": self.size}
+
+
+_pools = {language: _WarmPool(language, WARM_PROCESSES) for language, spec in LANGUAGES.items() if "warm" in spec}
+
+
+# --- Execution ---
+def _read_capped(stream, chunks, exceeded, proc):
+    total = 0
+    while True:
+        data = stream.read(4096)
+        if not data:
+            break
+        if total < MAX_OUTPUT_BYTES:
+            chunks.append(data[:MAX_OUTPUT_BYTES - total])
+        total += len(data)
+        if total > MAX_OUTPUT_BYTES and not exceeded:
+            exceeded.append(True)
+            _kill_group(proc)
+    stream.close()
+
+
+def _write_stdin(stream, data):
+    try:
+        if data: stream.write(data)
+    except (BrokenPipeError, OSError):
+        pass # The program exited without reading all of its input
+    finally:
+        try: stream.close()
+        except OSError: pass
+
+
+def _kill_group(proc):
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def _wait(proc, stdin_data, wall_limit):
+    """Feeds stdin, collects capped output and waits with wait4() so CPU time and peak memory are known."""
+    stdout, stderr, exceeded = [], [], []
+    readers = [threading.Thread(target=_read_capped, args=(proc.stdout, stdout, exceeded, proc), daemon=True),
+               threading.Thread(target=_read_capped, args=(proc.stderr, stderr, exceeded, proc), daemon=True),
+               threading.Thread(target=_write_stdin, args=(proc.stdin, stdin_data), daemon=True)]
+    for t in readers: t.start()
+
+    outcome = {}
+    def waiter():
+        _, outcome["status"], outcome["rusage"] = os.wait4(proc.pid, 0)
+    wait_thread = threading.Thread(target=waiter, daemon=True)
+    wait_thread.start()
+    wait_thread.join(wall_limit)
+    timed_out = wait_thread.is_alive()
+    if timed_out:
+        _kill_group(proc)
+        wait_thread.join()
+    _kill_group(proc) # Anything the program left running in its session
+    for t in readers: t.join(2)
+
+    status = outcome["status"]
+    proc.returncode = os.waitstatus_to_exitcode(status) # Already reaped; keeps Popen from waiting again
+    rusage = outcome["rusage"]
+    return {
+        "stdout": b"".join(stdout).decode("utf-8", "replace"),
+        "stderr": b"".join(stderr).decode("utf-8", "replace"),
+        "exit_code": os.WEXITSTATUS(status) if os.WIFEXITED(status) else None,
+        "signal": os.WTERMSIG(status) if os.WIFSIGNALED(status) else None,
+        "cpu_time": rusage.ru_utime + rusage.ru_stime,
+        "memory": rusage.ru_maxrss, # KB on Linux, same unit as Judge0
+        "timed_out": timed_out,
+        "output_exceeded": bool(exceeded),
+    }
+
+
+def _result(status_id, run=None, compile_output=None, message=None):
+    run = run or {}
+    return {
+        "token": None,
+        "stdout": run.get("stdout") or None,
+        "stderr": run.get("stderr") or None,
+        "compile_output": compile_output or None,
+        "message": message,
+        "status": {"id": status_id, "description": STATUS_DESCRIPTIONS[status_id]},
+        "time": f"{run['cpu_time']:.3f}" if "cpu_time" in run else None,
+        "memory": run.get("memory"),
+    }
+
+
+def _classify(run):
+    hit_cpu_limit = run["signal"] == signal.SIGXCPU or (run["signal"] == signal.SIGKILL and run["cpu_time"] >= CPU_TIME_LIMIT)
+    if run["timed_out"] or hit_cpu_limit:
+        return _result(5, run)
+    if run["output_exceeded"]:
+        return _result(12, run, message=f"Output limit of {MAX_OUTPUT_BYTES // 1024} KB exceeded")
+    if run["signal"]:
+        return _result(SIGNAL_STATUS.get(run["signal"], 12), run, message=f"Killed by signal {run['signal']}")
+    if run["exit_code"]:
+        return _result(11, run, message=f"Exited with error status {run['exit_code']}")
+    return _result(3, run)
+
+
+def _java_class(source_code):
+    match = re.search(r"public\s+(?:final\s+)?class\s+([A-Za-z_]\w*)", source_code)
+    return match.group(1) if match else "Main"
+
+
+def run(language, source_code, stdin=""):
+    """
+    Runs one submission locally and returns a Judge0-shaped result dict
+    (stdout, stderr, compile_output, message, status {id, description}, time, memory).
+    Raises OSError if the runner itself could not start (or is not isolated), so callers can fall back to Judge0.
+    """
+    if isolation() is None:
+        raise OSError("local runner is not isolated (set LOCAL_RUNNER_UID or LOCAL_RUNNER_UNSAFE_DEV=1)")
+    language = normalize_language(language)
+    spec = LANGUAGES[language]
+    stdin_data = (stdin or "").encode("utf-8")
+    workdir = tempfile.mkdtemp(prefix="run-", dir=WORK_ROOT)
+    try:
+        filename, run_argv, compile_argv = spec["file"], spec.get("run"), spec.get("compile")
+        if language == "java": # javac insists the file is named after the public class
+            class_name = _java_class(source_code)
+            filename = f"{class_name}.java"
+            compile_argv = compile_argv[:-1] + [filename]
+            run_argv = run_argv[:-1] + [class_name]
+        with open(os.path.join(workdir, filename), "w", encoding="utf-8") as f:
+            f.write(source_code)
+        _give_to_runner(workdir, os.path.join(workdir, filename))
+
+        limits = _limits(CPU_TIME_LIMIT, MAX_FILE_BYTES, spec["limit_address_space"])
+        if "warm" in spec:
+            proc, control_fd = _pools[language].take()
+            try: # Limits were set when the interpreter started; it has used next to no CPU since
+                os.write(control_fd, json.dumps({"cwd": workdir, "main": filename}).encode("utf-8"))
+            except OSError:
+                _kill_group(proc)
+                raise
+            finally:
+                os.close(control_fd)
+            return _classify(_wait(proc, stdin_data, WALL_TIME_LIMIT))
+
+        compiler = subprocess.Popen(
+            compile_argv, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE, cwd=workdir,
+            env=_sandbox_env(workdir), start_new_session=True, **_child_user(),
+            preexec_fn=_set_limits_in_child(_limits(COMPILE_TIME_LIMIT, COMPILE_FILE_BYTES, False))
+        )
+        compiled = _wait(compiler, b"", COMPILE_TIME_LIMIT * 2)
+        if compiled["timed_out"] or compiled["exit_code"] != 0:
+            output = (compiled["stderr"] + compiled["stdout"]).strip() or "Compilation timed out."
+            return _result(6, compile_output=output)
+
+        proc = subprocess.Popen(
+            run_argv, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE, cwd=workdir,
+            env=_sandbox_env(workdir), start_new_session=True, preexec_fn=_set_limits_in_child(limits),
+            **_child_user()
+        )
+        return _classify(_wait(proc, stdin_data, WALL_TIME_LIMIT))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def stats():
+    return {"work_root": WORK_ROOT or tempfile.gettempdir(), "isolation": isolation(),
+            "languages": {language: supports(language) for language in LANGUAGES},
+            "warm_pools": [pool.stats() for pool in _pools.values()]}
@@ -0,0 +1,121 @@
+# backend/utils/practice_grader.py
+from utils import code_runner, judge0
+
+# --- Test-case Grading for Practice Submissions ---
+# Questions generated with TEST_FORMAT have examples / hidden_tests whose "input" is the exact
+# stdin and "output" the exact expected stdout, so correctness can be decided by running the code.
+TEST_FORMAT = "stdio"
+MAX_TESTS = 10
+MAX_SHOWN_OUTPUT = 500 # Characters of actual output echoed back per visible test
+STATUS_COMPILATION_ERROR = 6
+
+
+def collect_tests(stored_question):
+    """
+    Returns [{"name", "stdin", "expected", "hidden"}] for the server-side copy of a stdio-format question.
+    Tests never come from the client's copy (a forged one could grade itself "Correct"), so without
+    a stored copy this returns [] and the submission is graded by the AI instead.
+    """
+    if not stored_question or stored_question.get("test_format") != TEST_FORMAT:
+        return [] # Replaced / unknown question, or older free-form examples that cannot be run as-is
+
+    tests = []
+    for hidden, key in ((False, "examples"), (True, "hidden_tests")):
+        for i, case in enumerate(stored_question.get(key) or []):
+            if not isinstance(case, dict) or case.get("output") is None:
+                continue
+            tests.append({
+                "name": f"{'Hidden test' if hidden else 'Example'} {i + 1}",
+                "stdin": str(case.get("input") or ""),
+                "expected": str(case["output"]),
+                "hidden": hidden,
+            })
+    return tests[:MAX_TESTS]
+
+
+def grade(language, language_id, source_code, tests, user_id):
+    """
+    Runs the code against every test in one batch and scores it locally.
+    Returns None when the judge could not run any test (callers then fall back to AI grading).
+    """
+    if not tests:
+        return None
+    submissions = [{"language": language, "language_id": language_id, "source_code": source_code, "stdin": t["stdin"]}
+                   for t in tests]
+    with judge0.execution_queue.slot(user_id):
+        results = code_runner.run_batch(submissions)
+    if not any(results):
+        return None
+
+    test_results = []
+    compile_output = None
+    for test, result in zip(tests, results):
+        status = (result or {}).get("status") or {}
+        if status.get("id") == STATUS_COMPILATION_ERROR:
+            compile_output = result.get("compile_output")
+        actual = judge0.normalize_output((result or {}).get("stdout"))
+        entry = {
+            "name": test["name"],
+            "hidden": test["hidden"],
+            "passed": bool(result) and status.get("id") == judge0.STATUS_ACCEPTED
+                      and actual == judge0.normalize_output(test["expected"]),
+            "status": status.get("description") or "Not Run",
+        }
+        if not test["hidden"]:
+            entry.update({"input": test["stdin"], "expected": test["expected"], "actual": actual[:MAX_SHOWN_OUTPUT]})
+        test_results.append(entry)
+
+    passed = sum(1 for r in test_results if r["passed"])
+    if compile_output is not None:
+        overall_status = "Compilation Error"
+    elif passed == len(tests):
+        overall_status = "Correct"
+    elif passed:
+        overall_status = "Partially Correct"
+    else:
+        overall_status = "Incorrect"
+    return {
+        "overall_status": overall_status,
+        "passed": passed,
+        "total": len(tests),
+        "all_passed": passed == len(tests),
+        "correctness": round(10 * passed / len(tests)),
+        "compile_output": compile_output,
+        "test_results": test_results,
+    }
+
+
+def summarize_for_prompt(grading):
+    """Short plain-text test report for the feedback prompt (hidden test data is left out)."""
+    lines = [f"{grading['passed']}/{grading['total']} tests passed."]
+    if grading["compile_output"]:
+        lines.append(f"Compiler output: {grading['compile_output'][:MAX_SHOWN_OUTPUT]}")
+    for r in grading["test_results"]:
+        if r["passed"]:
+            continue
+        if r["hidden"]:
+            lines.append(f"- {r['name']}: failed ({r['status']})")
+        else:
+            lines.append(f"- {r['name']}: failed ({r['status']}); input {r['input']!r}, "
+                         f"expected {r['expected']!r}, got {r['actual']!r}")
+    return "\n".join(lines)
+
+
+def analysis_from_tests(grading, summary_feedback=None, scores=None):
+    """The submit response: test-decided status and correctness, plus AI scores/feedback when available."""
+    scores = scores or {}
+    return {
+        "overall_status": grading["overall_status"],
+        "summary_feedback": summary_feedback or f"{grading['passed']} of {grading['total']} tests passed.",
+        "scores": {
+            "correctness": grading["correctness"],
+            "efficiency": scores.get("efficiency"),
+            "readability": scores.get("readability"),
+            "robustness": scores.get("robustness"),
+        },
+        "grading": "tests",
+        "ai_feedback": bool(scores),
+        "tests_passed": grading["passed"],
+        "tests_total": grading["total"],
+        "test_results": grading["test_results"],
+    }
@@ -0,0 +1,111 @@
+# backend/utils/profile_snapshot.py
+import json
+from datetime import datetime
+
+# --- Materialized Profile ---
+# One row per user with the merged manual + resume-extracted skills and the profile domains,
+# rebuilt in the same transaction as every write to user_details.skills/domain or extract_skills.
+# profile_version only moves when the merged content changes, so it works as a cache key.
+PROFILE_SNAPSHOT_DDL = """
+    CREATE TABLE IF NOT EXISTS user_profile_snapshot (
+        user_id INT NOT NULL PRIMARY KEY,
+        skills TEXT NOT NULL,
+        domains TEXT NOT NULL,
+        profile_version INT NOT NULL DEFAULT 1,
+        updated_at DATETIME NOT NULL
+    )
+"""
+
+_table_ready = False
+
+
+def ensure_snapshot_table(cur):
+    global _table_ready
+    if not _table_ready:
+        cur.execute(PROFILE_SNAPSHOT_DDL)
+        _table_ready = True
+
+
+def parse_json_list(value):
+    """A JSON list column as a Python list (handles bytes, str and already-decoded lists)."""
+    if isinstance(value, (bytes, bytearray)): value = value.decode('utf-8')
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except json.JSONDecodeError:
+            return []
+    return value if isinstance(value, list) else []
+
+
+def merge_skills(*skill_lists):
+    """Deduplicated case-insensitively keeping the first-seen spelling ("SQL", "Node.js"), sorted."""
+    unique = {}
+    for skills in skill_lists:
+        for skill in skills:
+            skill = str(skill).strip() if skill is not None else ""
+            if skill:
+                unique.setdefault(skill.lower(), skill)
+    return sorted(unique.values(), key=str.lower)
+
+
+def _merge_domains(domains):
+    unique = {}
+    for domain in domains:
+        if isinstance(domain, str) and domain.strip():
+            unique.setdefault(domain.strip().lower(), domain.strip())
+    return list(unique.values())
+
+
+def refresh_snapshot(cur, user_id, now=None):
+    """
+    Rebuilds the user's snapshot from user_details and extract_skills. Call it on the
+    writer's cursor before its commit so the snapshot can't drift from the source rows,
+    and call ensure_snapshot_table before the writer's own changes (DDL commits implicitly).
+    Returns the snapshot dict.
+    """
+    ensure_snapshot_table(cur)
+    cur.execute("SELECT skills, domain FROM user_details WHERE user_id = %s", (user_id,))
+    details_rows = cur.fetchall()
+    details = details_rows[0] if details_rows else {}
+    cur.execute("SELECT skills FROM extract_skills WHERE user_id = %s", (user_id,))
+    extracted_rows = cur.fetchall()
+    extracted = extracted_rows[0] if extracted_rows else {}
+
+    skills = merge_skills(parse_json_list(details.get('skills')), parse_json_list(extracted.get('skills')))
+    domains = _merge_domains(parse_json_list(details.get('domain')))
+    skills_json, domains_json = json.dumps(skills), json.dumps(domains)
+    # The version is compared before skills/domains are overwritten (assignments run left to right).
+    # BINARY: the columns' collation is case-insensitive, and a case-only edit ("Sql" -> "SQL") is a change
+    cur.execute("""
+        INSERT INTO user_profile_snapshot (user_id, skills, domains, profile_version, updated_at)
+        VALUES (%s, %s, %s, 1, %s)
+        ON DUPLICATE KEY UPDATE
+            profile_version = IF(BINARY skills = BINARY VALUES(skills) AND BINARY domains = BINARY VALUES(domains),
+                                 profile_version, profile_version + 1),
+            updated_at = IF(BINARY skills = BINARY VALUES(skills) AND BINARY domains = BINARY VALUES(domains),
+                            updated_at, VALUES(updated_at)),
+            skills = VALUES(skills), domains = VALUES(domains)
+    """, (user_id, skills_json, domains_json, now or datetime.now()))
+    cur.execute("SELECT profile_version FROM user_profile_snapshot WHERE user_id = %s", (user_id,))
+    version_row = cur.fetchone()
+    return {"skills": skills, "domains": domains, "profile_version": version_row['profile_version']}
+
+
+def get_snapshot(cur, user_id, conn=None):
+    """
+    {"skills": [...], "domains": [...], "profile_version": n} with one primary-key lookup.
+    Users without a snapshot yet (profiles saved before it existed) get one built on the
+    spot, committed right away when `conn` is given.
+    """
+    ensure_snapshot_table(cur)
+    cur.execute("SELECT skills, domains, profile_version FROM user_profile_snapshot WHERE user_id = %s", (user_id,))
+    row = cur.fetchone()
+    if not row:
+        snapshot = refresh_snapshot(cur, user_id)
+        if conn: conn.commit()
+        return snapshot
+    return {
+        "skills": parse_json_list(row['skills']),
+        "domains": parse_json_list(row['domains']),
+        "profile_version": row['profile_version'],
+    }
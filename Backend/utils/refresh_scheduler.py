@@ -0,0 +1,210 @@
+# backend/utils/refresh_scheduler.py
+import os
+import threading
+import time
+import concurrent.futures
+from datetime import datetime, date, timedelta
+from db_config import get_db_connection
+
+# --- Background Refresh of Per-User Caches ---
+# Workers record user activity (login, dashboard reads) in refresh_schedule. Every worker runs a
+# scheduler thread that claims due rows with a conditional UPDATE, so each refresh runs once
+# across the cluster, and calls the job's refresh function with bounded concurrency.
+SCHEDULE_DDL = """
+    CREATE TABLE IF NOT EXISTS refresh_schedule (
+        job VARCHAR(32) NOT NULL,
+        user_id INT NOT NULL,
+        last_active_at DATETIME NOT NULL,
+        next_refresh_at DATETIME NOT NULL,
+        last_refreshed_at DATETIME,
+        PRIMARY KEY (job, user_id),
+        INDEX idx_refresh_schedule_due (job, next_refresh_at)
+    )
+"""
+USAGE_DDL = """
+    CREATE TABLE IF NOT EXISTS upstream_quota_usage (
+        upstream VARCHAR(32) NOT NULL,
+        usage_day DATE NOT NULL,
+        calls INT NOT NULL DEFAULT 0,
+        PRIMARY KEY (upstream, usage_day)
+    )
+"""
+ACTIVITY_WRITE_INTERVAL = timedelta(minutes=5) # Per-process throttle for activity upserts
+MAX_TRACKED_USERS = 10000
+RETRY_AFTER_FAILURE = timedelta(minutes=10)
+SCHEDULER_ENABLED = os.getenv("BACKGROUND_REFRESH_ENABLED", "1") != "0"
+
+_tables_ready = False
+
+
+def _ensure_tables(cur):
+    global _tables_ready
+    if not _tables_ready:
+        cur.execute(SCHEDULE_DDL)
+        cur.execute(USAGE_DDL)
+        _tables_ready = True
+
+
+def _execute(sql, params, fetch=False):
+    conn = get_db_connection()
+    if not conn:
+        return None
+    cur = conn.cursor(dictionary=True)
+    try:
+        _ensure_tables(cur)
+        cur.execute(sql, params)
+        if fetch:
+            return cur.fetchall()
+        conn.commit()
+        return cur.rowcount
+    finally:
+        cur.close()
+        conn.close()
+
+
+# --- Upstream Quota Accounting ---
+def record_usage(upstream, calls=1):
+    """Counts calls against today's shared quota for an upstream (best effort)."""
+    try:
+        _execute("""
+            INSERT INTO upstream_quota_usage (upstream, usage_day, calls) VALUES (%s, %s, %s)
+            ON DUPLICATE KEY UPDATE calls = calls + VALUES(calls)
+        """, (upstream, date.today(), calls))
+    except Exception as e:
+        print(f"⚠️ Could not record quota usage for '{upstream}': {e}")
+
+
+def usage_today(upstream):
+    """Calls made today across all workers, or None if unknown."""
+    try:
+        rows = _execute("SELECT calls FROM upstream_quota_usage WHERE upstream = %s AND usage_day = %s",
+                        (upstream, date.today()), fetch=True)
+    except Exception as e:
+        print(f"⚠️ Could not read quota usage for '{upstream}': {e}")
+        return None
+    if rows is None:
+        return None
+    return rows[0]['calls'] if rows else 0
+
+
+class RefreshScheduler:
+    """
+    Keeps a per-user cache warm for recently active users.
+    refresh_fn(user_id) rebuilds the cache and returns the datetime of the next refresh,
+    or None to retry after RETRY_AFTER_FAILURE. first_refresh_after delays the first refresh
+    of a newly recorded user, whose cache is usually filled by the request that recorded them.
+    """
+
+    def __init__(self, job, refresh_fn, active_window, interval=60, concurrency=2, batch_size=20,
+                 claim_for=timedelta(minutes=5), first_refresh_after=timedelta(0)):
+        self.job = job
+        self.refresh_fn = refresh_fn
+        self.active_window = active_window
+        self.interval = interval
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.claim_for = claim_for
+        self.first_refresh_after = first_refresh_after
+        self._last_recorded = {}
+        self._lock = threading.Lock()
+        self._pid = None
+        self._thread = None
+        self.refreshed = 0
+        self.failed = 0
+
+    # --- Activity ---
+    def record_activity(self, user_id, first_refresh_after=None):
+        """
+        Marks a user as active (throttled per process). A new user is due after first_refresh_after
+        (the scheduler's default unless given); a returning user whose last refresh time has passed
+        becomes due again by being active.
+        """
+        if first_refresh_after is None: first_refresh_after = self.first_refresh_after
+        self._ensure_running()
+        now = datetime.now()
+        with self._lock:
+            last = self._last_recorded.get(user_id)
+            if last and now - last < ACTIVITY_WRITE_INTERVAL:
+                return
+            if len(self._last_recorded) > MAX_TRACKED_USERS: self._last_recorded.clear()
+            self._last_recorded[user_id] = now
+        try:
+            _execute("""
+                INSERT INTO refresh_schedule (job, user_id, last_active_at, next_refresh_at) VALUES (%s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE last_active_at = VALUES(last_active_at)
+            """, (self.job, user_id, now, now + first_refresh_after))
+        except Exception as e:
+            print(f"⚠️ Could not record activity for user {user_id} ({self.job}): {e}")
+
+    def schedule(self, user_id, next_refresh_at):
+        """Sets when a user's cache should next be refreshed (call it whenever the cache is filled)."""
+        try:
+            _execute("""
+                UPDATE refresh_schedule SET next_refresh_at = %s, last_refreshed_at = %s
+                WHERE job = %s AND user_id = %s
+            """, (next_refresh_at, datetime.now(), self.job, user_id))
+        except Exception as e:
+            print(f"⚠️ Could not schedule {self.job} refresh for user {user_id}: {e}")
+
+    # --- Scheduler Thread ---
+    def _ensure_running(self):
+        if not SCHEDULER_ENABLED:
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread and self._thread.is_alive():
+                return
+            self._pid = os.getpid() # A forked worker starts its own thread
+            self._thread = threading.Thread(target=self._run, name=f"RefreshScheduler-{self.job}", daemon=True)
+            self._thread.start()
+            print(f"🔁 Started background {self.job} refresh (every {self.interval}s, {self.concurrency} at a time).")
+
+    def _run(self):
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.concurrency,
+                                                   thread_name_prefix=f"Refresh-{self.job}") as executor:
+            while True:
+                time.sleep(self.interval)
+                try:
+                    user_ids = self._claim_due()
+                    if user_ids:
+                        list(executor.map(self._refresh_one, user_ids))
+                except Exception as e:
+                    print(f"⚠️ Background {self.job} refresh tick failed: {e}")
+
+    def _claim_due(self):
+        """Due rows of recently active users, claimed so no other worker refreshes them meanwhile."""
+        now = datetime.now()
+        rows = _execute("""
+            SELECT user_id FROM refresh_schedule
+            WHERE job = %s AND next_refresh_at <= %s AND last_active_at >= %s
+            ORDER BY next_refresh_at LIMIT %s
+        """, (self.job, now, now - self.active_window, self.batch_size), fetch=True) or []
+        claimed = []
+        for row in rows:
+            if _execute("""
+                UPDATE refresh_schedule SET next_refresh_at = %s
+                WHERE job = %s AND user_id = %s AND next_refresh_at <= %s
+            """, (now + self.claim_for, self.job, row['user_id'], now)):
+                claimed.append(row['user_id'])
+        return claimed
+
+    def _refresh_one(self, user_id):
+        try:
+            next_refresh_at = self.refresh_fn(user_id)
+        except Exception as e:
+            print(f"⚠️ Background {self.job} refresh failed for user {user_id}: {e}")
+            next_refresh_at = None
+        with self._lock:
+            if next_refresh_at: self.refreshed += 1
+            else: self.failed += 1
+        if next_refresh_at:
+            self.schedule(user_id, next_refresh_at)
+        else:
+            try:
+                _execute("UPDATE refresh_schedule SET next_refresh_at = %s WHERE job = %s AND user_id = %s",
+                         (datetime.now() + RETRY_AFTER_FAILURE, self.job, user_id))
+            except Exception as e:
+                print(f"⚠️ Could not reschedule {self.job} refresh for user {user_id}: {e}")
+
+    def stats(self):
+        return {"job": self.job, "refreshed": self.refreshed, "failed": self.failed,
+                "running": bool(self._thread and self._thread.is_alive() and self._pid == os.getpid())}
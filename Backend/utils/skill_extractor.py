@@ -2,6 +2,7 @@ import os
 import json
 import re
 from db_config import get_db_connection
+from utils import profile_snapshot
 from api_config import gemini_model
 import traceback
 
@@ -77,11 +78,13 @@ def trigger_skill_extraction(user_id):
             return
 
         # Step 4: Store the extracted skills in the database
+        profile_snapshot.ensure_snapshot_table(cur)
         cur.execute("DELETE FROM extract_skills WHERE user_id = %s", (user_id,))
         cur.execute(
             "INSERT INTO extract_skills (user_id, skills) VALUES (%s, %s)",
             (user_id, json.dumps(skills_list))
         )
+        profile_snapshot.refresh_snapshot(cur, user_id)
         conn.commit()
         print(f"✅ Successfully extracted and stored {len(skills_list)} skills for user_id: {user_id}.")
 
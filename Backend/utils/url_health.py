@@ -0,0 +1,108 @@
+# backend/utils/url_health.py
+import hashlib
+from datetime import datetime, timedelta
+
+# --- Recheck TTLs ---
+HEALTHY_RECHECK = timedelta(days=7)      # Stable, healthy URLs are rechecked rarely
+FLAPPING_RECHECK = timedelta(days=1)     # Healthy now, but the status changed recently
+FLAPPING_WINDOW = timedelta(days=3)      # "Recently" for the rule above
+FAILING_RECHECK_BASE = timedelta(hours=1) # Failing URLs back off: 1h, 2h, 4h ... up to FAILING_RECHECK_MAX
+FAILING_RECHECK_MAX = timedelta(days=1)
+LOOKUP_CHUNK_SIZE = 500
+
+URL_HEALTH_DDL = """
+    CREATE TABLE IF NOT EXISTS url_health (
+        url_hash CHAR(64) NOT NULL PRIMARY KEY,
+        url TEXT NOT NULL,
+        is_valid BOOLEAN NOT NULL,
+        last_status VARCHAR(64),
+        last_checked_at DATETIME NOT NULL,
+        next_check_at DATETIME NOT NULL,
+        last_changed_at DATETIME,
+        etag VARCHAR(255),
+        last_modified VARCHAR(64),
+        consecutive_failures INT NOT NULL DEFAULT 0,
+        INDEX idx_url_health_next_check (next_check_at)
+    )
+"""
+
+
+def url_hash(url):
+    return hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+
+_table_ready = False
+
+
+def ensure_url_health_table(cur):
+    """Creates url_health once per process (DDL commits implicitly, so keep it off the hot path)."""
+    global _table_ready
+    if not _table_ready:
+        cur.execute(URL_HEALTH_DDL)
+        _table_ready = True
+
+
+def load_url_health(cur, urls):
+    """Returns {url: url_health row (dict)} for the URLs that have been checked before."""
+    health = {}
+    urls = list(urls)
+    for i in range(0, len(urls), LOOKUP_CHUNK_SIZE):
+        hash_to_url = {url_hash(u): u for u in urls[i:i + LOOKUP_CHUNK_SIZE]}
+        placeholders = ", ".join(["%s"] * len(hash_to_url))
+        cur.execute(f"""
+            SELECT url_hash, is_valid, last_status, last_checked_at, next_check_at,
+                   last_changed_at, etag, last_modified, consecutive_failures
+            FROM url_health WHERE url_hash IN ({placeholders})
+        """, tuple(hash_to_url.keys()))
+        for row in cur.fetchall():
+            health[hash_to_url[row['url_hash']]] = row
+    return health
+
+
+def is_due(row, now=None):
+    """A URL is due if it was never checked or its next_check_at has passed."""
+    if not row:
+        return True
+    return row['next_check_at'] <= (now or datetime.now())
+
+
+def next_check_at(is_valid, consecutive_failures, last_changed_at, now):
+    if not is_valid:
+        backoff = FAILING_RECHECK_BASE * (2 ** max(0, consecutive_failures - 1))
+        return now + min(backoff, FAILING_RECHECK_MAX)
+    if last_changed_at and now - last_changed_at < FLAPPING_WINDOW:
+        return now + FLAPPING_RECHECK
+    return now + HEALTHY_RECHECK
+
+
+def record_results(cur, results, previous, now=None):
+    """
+    Upserts fresh check results.
+    results: {url: (is_valid, status, etag, last_modified)}; previous: rows from load_url_health.
+    """
+    now = now or datetime.now()
+    rows = []
+    for url, (is_valid, status, etag, last_modified) in results.items():
+        prev = previous.get(url)
+        failures = 0 if is_valid else (prev['consecutive_failures'] + 1 if prev else 1)
+        # Only a flip against an earlier record counts as a change: a first check isn't "flapping"
+        changed = prev is not None and bool(prev['is_valid']) != bool(is_valid)
+        last_changed_at = now if changed else (prev['last_changed_at'] if prev else None)
+        rows.append((
+            url_hash(url), url, is_valid, status, now,
+            next_check_at(is_valid, failures, last_changed_at, now),
+            last_changed_at, etag, last_modified, failures
+        ))
+    if not rows:
+        return
+    cur.executemany("""
+        INSERT INTO url_health
+            (url_hash, url, is_valid, last_status, last_checked_at, next_check_at,
+             last_changed_at, etag, last_modified, consecutive_failures)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            is_valid = VALUES(is_valid), last_status = VALUES(last_status),
+            last_checked_at = VALUES(last_checked_at), next_check_at = VALUES(next_check_at),
+            last_changed_at = VALUES(last_changed_at), etag = VALUES(etag),
+            last_modified = VALUES(last_modified), consecutive_failures = VALUES(consecutive_failures)
+    """, rows)
@@ -141,6 +141,9 @@ export default function JobHistory() {
     const [coverLetterText, setCoverLetterText] = useState("");
     const [isGeneratingLetter, setIsGeneratingLetter] = useState(false);
     const [selectedJobForLetter, setSelectedJobForLetter] = useState(null);
+    // History items arrive without their jobs; each one is hydrated on first expand
+    const [expandedHistoryIds, setExpandedHistoryIds] = useState(() => new Set());
+    const [historyJobs, setHistoryJobs] = useState({});
 
     useEffect(() => {
         if (error) {
@@ -183,6 +186,20 @@ export default function JobHistory() {
     // eslint-disable-next-line react-hooks/exhaustive-deps
     }, [apiFetch, setError, activeTab]); 
 
+    const toggleHistoryItem = async (historyId) => {
+        const isExpanded = expandedHistoryIds.has(historyId);
+        setExpandedHistoryIds(prev => {
+            const next = new Set(prev);
+            if (isExpanded) next.delete(historyId); else next.add(historyId);
+            return next;
+        });
+        if (isExpanded || historyJobs[historyId]) return;
+
+        setHistoryJobs(prev => ({ ...prev, [historyId]: 'loading' }));
+        const data = await apiFetch(`/api/user/job-history/${historyId}/jobs`);
+        setHistoryJobs(prev => ({ ...prev, [historyId]: data && Array.isArray(data.jobs) ? data.jobs : [] }));
+    };
+
     const handleUnsave = async (jobId) => {
         if (isUnsaving) return; 
         
@@ -257,21 +274,36 @@ export default function JobHistory() {
                                     <span className="history-locations">
                                         <strong>Locations:</strong> {Array.isArray(item.locations) ? item.locations.join(', ') : 'N/A'}
                                     </span>
-                                </div>
-                                <div className="history-job-grid">
-                                    {Array.isArray(item.recommendations) && item.recommendations.map((job) => (
-                                        <a key={job.job_id} href={job.job_url} target="_blank" rel="noopener noreferrer" className="history-job-card-link-main">
-                                            <div className="history-job-card">
-                                                <h4 className="history-job-title">{job.job_title}</h4>
-                                                <p className="history-job-company">{job.company_name}</p>
-                                                <p className="history-job-location">{job.location}</p>
-                                            </div>
-                                        </a>
-                                    ))}
-                                    {(!Array.isArray(item.recommendations) || item.recommendations.length === 0) && (
-                                         <p className="no-jobs-found-history">No jobs were found for this search.</p>
+                                    {item.job_count !== 0 && (
+                                        <button className="generate-letter-btn" onClick={() => toggleHistoryItem(item.id)}>
+                                            {expandedHistoryIds.has(item.id)
+                                                ? 'Hide jobs'
+                                                : (item.job_count != null ? `Show ${item.job_count} jobs` : 'Show jobs')}
+                                        </button>
                                     )}
                                 </div>
+                                {item.job_count === 0 && (
+                                    <div className="history-job-grid">
+                                        <p className="no-jobs-found-history">No jobs were found for this search.</p>
+                                    </div>
+                                )}
+                                {expandedHistoryIds.has(item.id) && (
+                                    <div className="history-job-grid">
+                                        {historyJobs[item.id] === 'loading' && <Loader2 size={24} className="spinner-icon animate-spin" />}
+                                        {Array.isArray(historyJobs[item.id]) && historyJobs[item.id].map((job) => (
+                                            <a key={job.job_id} href={job.job_url} target="_blank" rel="noopener noreferrer" className="history-job-card-link-main">
+                                                <div className="history-job-card">
+                                                    <h4 className="history-job-title">{job.job_title}</h4>
+                                                    <p className="history-job-company">{job.company_name}</p>
+                                                    <p className="history-job-location">{job.location}</p>
+                                                </div>
+                                            </a>
+                                        ))}
+                                        {Array.isArray(historyJobs[item.id]) && historyJobs[item.id].length === 0 && (
+                                             <p className="no-jobs-found-history">No jobs were found for this search.</p>
+                                        )}
+                                    </div>
+                                )}
                             </div>
                         ))}
                     </div>
@@ -148,31 +148,81 @@ export default function JobRecommendations() {
         setError(null);
         setJobResults(null);
 
-        // --- *** Send base_queries (string) and locations (array) *** ---
-        const data = await apiFetch('/api/user/search-jobs', {
-            method: 'POST',
-            body: JSON.stringify({
-                base_queries: userBaseQueries, // Send the comma-separated string
-                locations: locationsArray
-            }),
-        });
+        // --- Stream results (NDJSON): jobs appear as each query finishes ---
+        let streamedJobs = [];
+        let summary = null;
+        let streamError = null;
+        try {
+            const res = await fetch('http://localhost:5000/api/user/search-jobs/stream', {
+                method: 'POST',
+                credentials: 'include',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({
+                    base_queries: userBaseQueries, // Send the comma-separated string
+                    locations: locationsArray
+                }),
+            });
+            if (res.status === 401) {
+                navigate('/');
+                return;
+            }
+            if (!res.ok || !res.body) {
+                const data = await res.json().catch(() => ({}));
+                throw new Error(data.error || `HTTP Error: ${res.status}`);
+            }
+
+            const reader = res.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+            while (true) {
+                const { value, done } = await reader.read();
+                if (done) break;
+                buffer += decoder.decode(value, { stream: true });
+                const lines = buffer.split('\n');
+                buffer = lines.pop(); // Keep the incomplete last line for the next chunk
+                for (const line of lines) {
+                    if (!line.trim()) continue;
+                    const event = JSON.parse(line);
+                    if (event.type === 'jobs' && event.jobs.length > 0) {
+                        streamedJobs = [...streamedJobs, ...event.jobs];
+                        setJobResults(streamedJobs);
+                    } else if (event.type === 'summary') {
+                        summary = event;
+                    } else if (event.type === 'error') {
+                        throw new Error(event.error);
+                    }
+                }
+            }
+        } catch (err) {
+            streamError = err.message;
+            console.error("Job search stream error:", err);
+            setError(err.message);
+        } finally {
+            setIsSearchingJobs(false);
+        }
 
-        setIsSearchingJobs(false);
-        if (data && data.jobs) {
-            setJobResults(data.jobs);
-            if (data.jobs.length === 0) {
+        if (summary) {
+            // Final order and reasons come from the server-side skill-match ranking
+            if (Array.isArray(summary.ranking) && summary.ranking.length > 0) {
+                const jobsById = Object.fromEntries(streamedJobs.map(job => [job.job_id, job]));
+                streamedJobs = summary.ranking
+                    .filter(rank => jobsById[rank.job_id])
+                    .map(rank => ({ ...jobsById[rank.job_id], match_score: rank.match_score, recommendation_reason: rank.recommendation_reason }));
+            }
+            setJobResults(streamedJobs);
+            if (streamedJobs.length === 0) {
                 toast.success(`Search complete. No jobs found matching your criteria in the specified locations.`);
             } else {
-                 toast.success(`Found ${data.jobs.length} unique job(s)!`);
+                 toast.success(`Found ${streamedJobs.length} unique job(s)!`);
             }
             const historyData = await apiFetch('/api/user/job-history/latest');
              if (historyData && historyData.latest_recommendation) {
                  setLatestRecommendation(historyData.latest_recommendation);
              }
-        } else if (!error) {
-            console.error("Job search returned no data or invalid format.");
+        } else if (!streamError) {
+            console.error("Job search stream ended without a summary.");
             if (setError) setError("No job results found or API returned invalid format.");
-            setJobResults([]);
+            setJobResults(streamedJobs);
         }
     };
 
@@ -1,6 +1,6 @@
 import React, { useState, useEffect, useRef } from 'react';
 import { useLocation, useNavigate } from 'react-router-dom';
-import { Play, Terminal, AlertCircle, Loader2, ArrowLeft, Send, Sparkles, X  } from 'lucide-react';
+import { Play, Terminal, AlertCircle, Loader2, ArrowLeft, Send, Sparkles, X, CheckCircle, XCircle } from 'lucide-react';
 import toast from 'react-hot-toast';
 import { Radar } from 'react-chartjs-2';
 import {
@@ -27,21 +27,47 @@ import useParticleBackground from '../hooks/UseParticleBackground';
 // Register Chart.js components
 ChartJS.register(RadialLinearScale, PointElement, LineElement, Filler, Tooltip, Legend);
 
+const RUN_POLL_MAX_ATTEMPTS = 20; // ~45s of polling for runs the backend hands back as a token
+
+// --- TestResultsList Component ---
+// Per-test verdicts from the judge; hidden tests only show pass/fail
+const TestResultsList = ({ analysis }) => {
+  if (!analysis?.test_results?.length) return null;
+  return (
+      <div className="analysis-block test-results">
+          <h4>Tests: {analysis.tests_passed}/{analysis.tests_total} passed</h4>
+          {analysis.test_results.map((test, index) => (
+              <div key={index} className={`test-result ${test.passed ? 'test-passed' : 'test-failed'}`}>
+                  <p>{test.passed ? <CheckCircle size={14} /> : <XCircle size={14} />} <strong>{test.name}</strong> — {test.passed ? 'Passed' : test.status}</p>
+                  {!test.hidden && !test.passed && (
+                      <pre><strong>Input:</strong> {test.input || '(none)'}{'\n'}<strong>Expected:</strong> {test.expected}{'\n'}<strong>Got:</strong> {test.actual || '(no output)'}</pre>
+                  )}
+              </div>
+          ))}
+      </div>
+  );
+};
+
 // --- AiAnalysisDisplay Component ---
 const AiAnalysisDisplay = ({ analysis, onExplainClick }) => {
   
   // --- *** FIX 2: More robust check for scores object *** ---
   // This prevents the page from crashing if AI fails to return scores
-  if (!analysis || typeof analysis.scores !== 'object' || analysis.scores === null) {
+  // (or when the submission was graded by tests alone, without AI scores)
+  if (!analysis || typeof analysis.scores !== 'object' || analysis.scores === null || analysis.ai_feedback === false) {
       // Show the feedback, just not the chart
       return (
           <div className="ai-analysis-section">
-              <h3>AI Code Analysis: <span className={`analysis-status-badge status-issue`}>{analysis?.overall_status || 'Analysis Incomplete'}</span></h3>
-              <div className="analysis-chart-container">
-                  <p style={{ color: '#a0a0b0', textAlign: 'center', paddingTop: '4rem' }}>
-                      AI could not generate scores, but provided summary feedback.
-                  </p>
-              </div>
+              <h3>Code Analysis: <span className={`analysis-status-badge ${analysis?.overall_status === 'Correct' ? 'status-correct' : 'status-issue'}`}>{analysis?.overall_status || 'Analysis Incomplete'}</span></h3>
+              {analysis?.test_results?.length ? (
+                  <TestResultsList analysis={analysis} />
+              ) : (
+                  <div className="analysis-chart-container">
+                      <p style={{ color: '#a0a0b0', textAlign: 'center', paddingTop: '4rem' }}>
+                          AI could not generate scores, but provided summary feedback.
+                      </p>
+                  </div>
+              )}
               <div className="analysis-block summary">
                   <div className="summary-header">
                       <h4>Summary:</h4>
@@ -113,6 +139,7 @@ const AiAnalysisDisplay = ({ analysis, onExplainClick }) => {
       <div className="ai-analysis-section">
           <h3>AI Code Analysis: <span className={`analysis-status-badge ${statusClass}`}>{analysis.overall_status || 'N/A'}</span></h3>
           <div className="analysis-chart-container"> <Radar data={chartData} options={chartOptions} /> </div>
+          <TestResultsList analysis={analysis} />
           <div className="analysis-block summary">
               <div className="summary-header">
                   <h4>Summary:</h4>
@@ -204,6 +231,7 @@ export default function PracticeQuestionsPage() {
     const [analysis, setAnalysis] = useState(null);
     const [isExecuting, setIsExecuting] = useState(false);
     const [isSubmitting, setIsSubmitting] = useState(false);
+    const [skipAiFeedback, setSkipAiFeedback] = useState(false);
     const [isExplainModalOpen, setIsExplainModalOpen] = useState(false);
     const [explanationText, setExplanationText] = useState("");
     const [isExplaining, setIsExplaining] = useState(false);
@@ -259,7 +287,7 @@ export default function PracticeQuestionsPage() {
          
          // --- *** FIX: Send sourceCode directly *** ---
          console.log(`Running code - Language: ${language}, Stdin: (empty)`);
-         const data = await apiFetch('/api/user/practice/run', { 
+         let data = await apiFetch('/api/user/practice/run', { 
              method: 'POST', 
              body: JSON.stringify({ 
                  language: language, 
@@ -268,6 +296,18 @@ export default function PracticeQuestionsPage() {
              }) 
          });
          // -----------------------------------------
+
+         // Long runs come back as a token: poll with backoff until the judge finishes
+         let delay = 500;
+         for (let attempt = 0; data && data.pending && attempt < RUN_POLL_MAX_ATTEMPTS; attempt++) {
+             await new Promise(resolve => setTimeout(resolve, delay));
+             delay = Math.min(delay * 1.5, 3000);
+             data = await apiFetch(`/api/user/practice/run/${data.token}`);
+         }
+         if (data && data.pending) {
+             toast.error("Code is still running. Please try again.");
+             data = null;
+         }
          
          setIsExecuting(false);
          if (data) { 
@@ -292,7 +332,8 @@ export default function PracticeQuestionsPage() {
                  source_code: sourceCode, // Send sourceCode only
                  question: question,
                  difficulty: difficulty, 
-                 skill: skill 
+                 skill: skill,
+                 skip_ai_feedback: skipAiFeedback
              }) 
          });
          // ----------------------------------------
@@ -300,7 +341,7 @@ export default function PracticeQuestionsPage() {
          setIsSubmitting(false);
          if (data) { 
              setAnalysis(data); 
-             toast.success("AI analysis complete!"); 
+             toast.success(data.ai_feedback === false ? "Tests complete!" : "AI analysis complete!"); 
          }
     };
 
@@ -468,6 +509,10 @@ export default function PracticeQuestionsPage() {
                                   {isSubmitting ? (<><Loader2 size={18} className="spinner-icon animate-spin" /> Submitting...</>) : (<><Send size={18} /> Submit for Analysis</>)}
                              </button>
                         </div>
+                        <label className="skip-ai-feedback-toggle">
+                            <input type="checkbox" checked={skipAiFeedback} onChange={e => setSkipAiFeedback(e.target.checked)} disabled={isSubmitting} />
+                            Skip AI feedback when all tests pass
+                        </label>
 
                         {/* Output Display */}
                         {output && !analysis && (